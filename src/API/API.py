@@ -6,15 +6,39 @@ Created on 27.11.2019
 @author: Alvaro Ortiz Troncoso, Museum fuer Naturkunde Berlin
 """
 
-from flask import Flask, request, render_template, url_for, jsonify, Response, send_file
+from flask import Flask, request, render_template, url_for, Response, send_file, g, abort
+import flask
+import atexit
+import collections
+import hmac
+import io
+import multiprocessing
+import os
 from flask_cors import CORS
 import configparser
 import simplejson
 import logging
+import time
+import threading
+import redis
+import Metrics
 from Query import *
 from celery import Celery
-from Plotter import Plotter
+from celery.utils import uuid
+from celery.exceptions import TimeoutError
+from Plotter import SIZES, DPIS, MASTER_DPI
+from Plot_cache import plot_url, plot_version, content_hashes, get_plotter
+from Plot_spec import Plot_spec
 from SPL_converter import SPL_converter
+from Request_profiler import Request_profiler
+from Search_index import Search_index
+from Taxonomy_tree import Taxonomy_tree
+from Audiogram_metrics import Audiogram_metrics, FILTERS as METRIC_FILTERS
+from Threshold_matrix import Threshold_matrix, interpolate, log_grid, DEFAULT_GRID
+from Similarity_index import Similarity_index, UNITS as SIMILARITY_UNITS
+import Aggregate_audiogram
+import numpy as np
+import Migrate
 
 
 configPath = "/src/API/.env"
@@ -33,6 +57,90 @@ fapp.config['CELERY_BROKER_URL'] = 'redis://aad_redis:6379/0'
 fapp.config['CELERY_RESULT_BACKEND'] = 'redis://aad_redis:6379/0'
 client = Celery(fapp.name, broker=fapp.config['CELERY_BROKER_URL'])
 client.conf.update(fapp.config)
+# Redis also holds the locks of running plot tasks
+redis_client = redis.Redis.from_url(fapp.config['CELERY_BROKER_URL'])
+
+# data kept in memory, rebuilt when the data version changes, see _get_in_memory
+_data_version_memo = {'version': None, 'time': None}
+_in_memory = {}
+_memory_lock = threading.Lock()
+# held by the request reading the data version, see _data_version
+_data_version_lock = threading.Lock()
+# one lock per name of in-memory data, held while it is built
+_build_locks = {}
+# interpolated thresholds of audiograms, see /api/v1/matrix
+_threshold_matrix = Threshold_matrix()
+# aggregate audiograms by data version, taxon and bootstrap samples, see /api/v1/aggregate
+_aggregates = collections.OrderedDict()
+_bootstrap_pool = None
+
+
+def jsonify(*args, **kwargs):
+    """flask.jsonify, timed as the 'serialise' phase of profiled requests."""
+    with Metrics.timed('serialise'):
+        return flask.jsonify(*args, **kwargs)
+
+
+@fapp.before_request
+def _start_request():
+    g.request_start = time.perf_counter()
+    Metrics.http_requests_in_flight.inc()
+    # profiling on demand, by admins only
+    if (request.headers.get('X-Profile') or request.args.get('profile')) and _is_admin():
+        keep = _get_config().getint('DEFAULT', 'PROFILE_KEEP', fallback=50)
+        g.profiler = Request_profiler(_profile_dir(), keep).start()
+
+
+@fapp.after_request
+def _record_request(response):
+    """Record count, latency and response size of the request by route, see Metrics."""
+    # the route pattern, not the path, so that ids do not create new series
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    Metrics.http_requests.inc(route=route, method=request.method, status=response.status_code)
+    if 'request_start' in g:
+        Metrics.http_request_duration.observe(time.perf_counter() - g.request_start, route=route)
+    # streamed responses have no length
+    if response.content_length is not None:
+        Metrics.http_response_size.observe(response.content_length, route=route)
+    if 'profiler' in g:
+        response.headers['Server-Timing'] = g.profiler.stop()
+        profile_id = g.profiler.save()
+        if profile_id is not None:
+            response.headers['X-Profile'] = url_for('profile', profile_id=profile_id)
+    return response
+
+
+@fapp.teardown_request
+def _end_request(exception=None):
+    Metrics.http_requests_in_flight.dec()
+    # the request failed before its response was made
+    if 'profiler' in g:
+        g.profiler.stop()
+
+
+def _redis_pool_stats():
+    """
+    Connections of the Redis connection pool, by state.
+
+    redis-py has no public API for this, the private attributes of ConnectionPool are read
+    (as in redis 3.3 of requirements.txt). States the installed version does not have are left out.
+    """
+    pool = redis_client.connection_pool
+    created = getattr(pool, '_created_connections', None)
+    available = getattr(pool, '_available_connections', None)
+    in_use = getattr(pool, '_in_use_connections', None)
+    stats = []
+    if created is not None:
+        stats.append(({'state': 'created'}, created))
+    if available is not None:
+        stats.append(({'state': 'available'}, len(available)))
+    if in_use is not None:
+        stats.append(({'state': 'in_use'}, len(in_use)))
+    return stats
+
+
+Metrics.Gauge('aad_redis_pool_connections', "Connections of the Redis connection pool by state.",
+              collect=_redis_pool_stats)
 
 
 @fapp.route("/", methods=['GET'])
@@ -40,6 +148,145 @@ def home():
     return("Audiogrambase API")
 
 
+@fapp.route("/metrics", methods=['GET'])
+def metrics():
+    """
+    Returns the metrics of the API process, in the Prometheus text format.
+
+    Parameters
+    ----------
+    none
+
+    Returns
+    ----------
+    Per route: request count, latency histogram, response size histogram.
+    Per Query class: execution time histogram, row count histogram, error count.
+    Database connections opened and connect time, Redis connection pool,
+    plot cache hits and misses, plot tasks started and joined, requests in flight.
+
+    Example
+    ---------
+    http://localhost:9082/metrics
+    """
+    return Response(Metrics.expose(), content_type=Metrics.CONTENT_TYPE)
+
+
+@fapp.route("/ready", methods=['GET'])
+def ready():
+    """
+    Readiness check: the API can reach the database and Redis.
+
+    Parameters
+    ----------
+    none
+
+    Returns
+    ----------
+    Status 200 if all dependencies answer, otherwise status 503.
+    A json object with the status of each dependency:
+    # database : string ok | error message
+    # redis : string ok | error message
+
+    Example
+    ---------
+    http://localhost:9082/ready
+    """
+    checks = {}
+    try:
+        Ping_query(_get_config()).run()
+        checks['database'] = 'ok'
+    except Exception as e:
+        checks['database'] = str(e)
+    try:
+        redis_client.ping()
+        checks['redis'] = 'ok'
+    except Exception as e:
+        checks['redis'] = str(e)
+    status = 200 if all(c == 'ok' for c in checks.values()) else 503
+    return jsonify(checks), status
+
+
+@fapp.route("/api/v1/admin/slow_queries", methods=['GET', 'DELETE'])
+def slow_queries():
+    """
+    Returns the last slow queries of the API process, newest first.
+
+    A query is slow if it takes longer than SLOW_QUERY_SECONDS (default 1).
+    Set SLOW_QUERY_EXPLAIN = yes to record the EXPLAIN plan of each statement,
+    SLOW_QUERY_LOG_SIZE is the number of queries kept (default 100).
+    DELETE empties the log.
+
+    Parameters
+    ----------
+    X-Admin-Token header : string, required the ADMIN_TOKEN of the configuration, never in the URL,
+       so that it does not end up in access logs
+    limit : int, optional maximum number of queries returned, at least 1
+
+    Returns
+    ----------
+    A list in json format, for each slow query:
+    # time : string ISO date and time
+    # query : string name of the Query class
+    # duration : float execution time in seconds
+    # rows : int number of rows returned
+    # statements : list of the SQL statements executed, with bound parameters, each with
+    sql, duration, rows and explain (if enabled)
+
+    Raises
+    ----------
+    403 if the token is wrong, or no ADMIN_TOKEN is configured, 400 if limit is not a positive integer
+
+    Example
+    ---------
+    curl -H "X-Admin-Token: ..." "http://localhost:9082/api/v1/admin/slow_queries?limit=10"
+    """
+    _check_admin()
+    if request.method == 'DELETE':
+        Slow_query_log.clear()
+        return jsonify([])
+    return jsonify(Slow_query_log.entries(_check_limit(None)))
+
+
+@fapp.route("/api/v1/admin/profiles/<profile_id>", methods=['GET'])
+def profile(profile_id):
+    """
+    Returns the profile of a profiled request.
+
+    Any request is profiled when it has the X-Profile header (or the profile=1 parameter)
+    and the ADMIN_TOKEN in the X-Admin-Token header (see slow_queries). Its response then has
+    # Server-Timing header : time spent connecting to the database, executing queries,
+    converting results (jsonize), serialising the response and enqueuing Celery tasks
+    # X-Profile header : URL of this endpoint for the cProfile profile of the request
+    Profiles are saved in PROFILE_DIR (default /tmp/aad_profiles), the last PROFILE_KEEP (default 50) are kept.
+
+    Parameters
+    ----------
+    X-Admin-Token header : string, required the ADMIN_TOKEN of the configuration
+    format : string, optional text (default), functions sorted by cumulative time | prof, the pstats file
+    limit : int, optional number of functions in the text report (default 50)
+
+    Raises
+    ----------
+    403 if the token is wrong, 404 if there is no such profile, 400 if limit is not a positive integer
+
+    Example
+    ---------
+    curl -H "X-Profile: 1" -H "X-Admin-Token: ..." -i "http://localhost:9082/api/v1/browse?taxon=9641"
+    """
+    _check_admin()
+    path = Request_profiler.path(_profile_dir(), profile_id)
+    if path is None or not os.path.exists(path):
+        abort(404)
+    if request.args.get('format') == 'prof':
+        return send_file(path, mimetype="application/octet-stream", as_attachment=True,
+                         attachment_filename=profile_id + ".prof")
+    return Response(Request_profiler.report(path, _check_limit(50)), mimetype="text/plain")
+
+
+def _profile_dir():
+    return _get_config().get('DEFAULT', 'PROFILE_DIR', fallback='/tmp/aad_profiles')
+
+
 # @fapp.route("/api/v1/test", methods=['GET'])
 # def test():
 #    return render_template('test.html')
@@ -73,7 +320,7 @@ def download():
     if 'id' not in request.args:
         raise Exception("No id was given.")
     id = int(request.args['id'])
-    data_points = Download_query(api_config).run(id)
+    data_points = Download_query(_get_config()).run(id)
     csv = json2csv(data_points)
     response = Response(csv, mimetype="text/csv")
     response.headers["Content-Disposition"] = "attachment;filename=Audiogram_{0}.csv".format(
@@ -89,7 +336,7 @@ def download_multiple():
     ids = request.args['ids'].split(",")
     csv = ""
     for id in ids:
-        data_points = Download_query(api_config).run(id)
+        data_points = Download_query(_get_config()).run(id)
         csv += json2csv(data_points)
     response = Response(csv, mimetype="text/csv")
     filename = '_'.join(ids)
@@ -142,7 +389,7 @@ def is_compatible():
         raise Exception("No ids were given.")
     ids = request.args['ids'].split(",")
     # logging.warning(ids)
-    units = SPLUnits_query(api_config).run(ids)
+    units = SPLUnits_query(_get_config()).run(ids)
     compat = SPL_converter().check(units)
     return jsonify(compat)
 
@@ -156,7 +403,7 @@ def is_converted():
     if 'ids' not in request.args:
         raise Exception("No id given.")
     id = request.args['ids']
-    units = SPLUnits_query(api_config).run([id])
+    units = SPLUnits_query(_get_config()).run([id])
     compat = SPL_converter().is_converted(units)
     return jsonify(compat)
 
@@ -187,7 +434,7 @@ def summary():
     https://animalaudiograms.museumfuernaturkunde.berlin/api/v1/summary
     Returns a json string describing the current contents of the database
     """
-    summary = Summary_query(api_config).run()
+    summary = Summary_query(_get_config()).run()
     return jsonify(summary)
 
 
@@ -209,6 +456,13 @@ def list():
     # measurement_method : name of the experimental method used to obtain the audiogram
     # species_name : scientific name of the animal species examined
     # vernacular_name-english : english name of the animal species examined
+    # min_frequency_in_khz, max_frequency_in_khz : lowest and highest tested frequency
+    # best_frequency_in_khz : frequency of the lowest threshold
+    # lowest_threshold_in_decibel : lowest threshold, in dB re 1 μPa (water) or re 20 μPa (air)
+    # hearing_range_low_in_khz, hearing_range_high_in_khz : frequency range where the threshold is at most
+       20 dB above the lowest threshold, limited to the tested frequencies
+    Metrics are null for audiograms without data points. Metrics from the thresholds are null for audiograms
+    whose SPL units are not converted, e.g. without SPL reference.
 
     Raises
     ----------
@@ -224,7 +478,8 @@ def list():
         raise Exception("No ids were given.")
     ids = request.args['ids'].split(",")
     # logging.warning(ids)
-    audiograms = List_query(api_config).run(ids)
+    audiograms = List_query(_get_config()).run(ids)
+    _add_metrics(audiograms)
     return jsonify(audiograms)
 
 
@@ -271,6 +526,14 @@ def browse():
     # form : comma-separated list of string form of the sound click | pipe trains | prolonged |SAM (sinusoidal amplitude modulation)
     # constants : string method of constants yes | no
     # measurement_type: string 'auditory threshold' (default), 'critical ratio', 'critical bandwidth' etc.
+    # facets : comma-separated list of filter names to count the audiograms of, species | method | publication |
+       facility | medium | sex | liberty | lifestage | sedated | position | tone | staircase | form | constants |
+       measurement_type
+    # covers : float frequency in kHz, audiograms tested from below to above this frequency
+    # min_frequency_from, min_frequency_to, max_frequency_from, max_frequency_to, best_frequency_from,
+       best_frequency_to, hearing_range_low_from, hearing_range_low_to, hearing_range_high_from,
+       hearing_range_high_to : float frequency in kHz, range of the audiogram metric (see Returns)
+    # lowest_threshold_from, lowest_threshold_to : float threshold in dB, range of the lowest threshold
 
     Returns
     ----------
@@ -280,6 +543,19 @@ def browse():
     # measurement_method : name of the experimental method used to obtain the audiogram
     # species_name : scientific name of the animal species examined
     # vernacular_name-english : english name of the animal species examined
+    # min_frequency_in_khz, max_frequency_in_khz : lowest and highest tested frequency
+    # best_frequency_in_khz : frequency of the lowest threshold
+    # lowest_threshold_in_decibel : lowest threshold, in dB re 1 μPa (water) or re 20 μPa (air)
+    # hearing_range_low_in_khz, hearing_range_high_in_khz : frequency range where the threshold is at most
+       20 dB above the lowest threshold, limited to the tested frequencies
+    Metrics are null for audiograms without data points. Metrics from the thresholds are null for audiograms
+    whose SPL units are not converted, e.g. without SPL reference.
+
+    With facets, an object with the list above as results, and facets: for each facet requested,
+    the number of audiograms matching the filters per value of the facet, most frequent first:
+    # value : value of the filter, e.g. the id of the facility
+    # label : name of the value for ids, e.g. the name of the facility, null otherwise
+    # count : number of audiograms
 
     Raises
     ----------
@@ -302,6 +578,13 @@ def browse():
     https://animalaudiograms.museumfuernaturkunde.berlin/api/v1/browse?order_by=measurement_method&from=2018
     Returns a json string with a short description of all audiograms in the database
     obtained since 2018 (included) and ordered by measurement_method.
+
+    With facets: counts for the filter dropdowns
+    https://animalaudiograms.museumfuernaturkunde.berlin/api/v1/browse?medium=water&facets=method,sex,facility
+    Returns the audiograms measured in water, with the number of them per method, sex and facility.
+
+    With metrics: audiograms covering 100 kHz, most sensitive above 20 kHz
+    https://animalaudiograms.museumfuernaturkunde.berlin/api/v1/browse?covers=100&best_frequency_from=20
     """
     param = {
         'order_by': _getArg('order_by'),
@@ -332,8 +615,63 @@ def browse():
         'constants': _getArg('constants'),
         'measurement_type': _getArg('measurement_type')
     }
-    audiograms = Browse_query(api_config).run(param)
-    return jsonify(audiograms)
+    facets = _getArg('facets')
+    if facets is not None and facets != '':
+        param['facets'] = facets.split(',')
+        if not set(param['facets']) <= set(Browse_facets_query.FACETS):
+            abort(400)
+    # filters on the audiogram metrics select the experiments in memory
+    ranges = _metric_ranges()
+    matching = None
+    if len(ranges) > 0:
+        matching = _get_metrics().select(ranges).tolist()
+        param['ids'] = ",".join(str(id) for id in matching)
+    audiograms = [] if matching == [] else Browse_query(_get_config()).run(param)
+    _add_metrics(audiograms)
+    if 'facets' not in param:
+        return jsonify(audiograms)
+    counts = {name: [] for name in param['facets']}
+    if len(audiograms) > 0:
+        for count in Browse_facets_query(_get_config()).run(param):
+            counts[count.pop('facet')].append(count)
+    return jsonify({'results': audiograms, 'facets': counts})
+
+
+def _metric_ranges():
+    """
+    Range filters on the audiogram metrics in the request.
+
+    @return: dict, by metric: tuple (lowest value or None, highest value or None), see Audiogram_metrics.select
+    """
+    bounds = {}
+    for name, metric in METRIC_FILTERS.items():
+        for i, suffix in enumerate(('_from', '_to')):
+            value = _getArg(name + suffix)
+            if value is not None and value != '':
+                bounds.setdefault(metric, [None, None])[i] = float(value)
+    covers = _getArg('covers')
+    if covers is not None and covers != '':
+        # tested frequencies from below to above the frequency
+        low = bounds.setdefault('min_frequency_in_khz', [None, None])
+        low[1] = float(covers) if low[1] is None else min(low[1], float(covers))
+        high = bounds.setdefault('max_frequency_in_khz', [None, None])
+        high[0] = float(covers) if high[0] is None else max(high[0], float(covers))
+    return {metric: tuple(bound) for metric, bound in bounds.items()}
+
+
+def _get_metrics():
+    """Return the metrics of all audiograms, see _get_in_memory."""
+    return _get_in_memory('metrics', lambda version: Audiogram_metrics(
+        All_data_query(_get_config()).run_columns(), version))
+
+
+def _add_metrics(audiograms):
+    """Add the metrics to audiogram descriptions, see Audiogram_metrics.get."""
+    if len(audiograms) == 0:
+        return
+    metrics = _get_metrics()
+    for audiogram in audiograms:
+        audiogram.update(metrics.get(audiogram['id']))
 
 
 @fapp.route("/api/v1/audiogram", methods=['GET'])
@@ -368,10 +706,261 @@ def get_audiogram_by_experiment_id():
     if 'id' not in request.args:
         raise Exception("No id was given.")
     id = int(request.args['id'])
-    data_points = Data_points_query_convert(api_config).run(id)
+    data_points = Data_points_query_convert(_get_config()).run(id)
     return jsonify(data_points)
 
 
+@fapp.route("/api/v1/matrix", methods=['GET'])
+def get_threshold_matrix():
+    """
+    Returns the thresholds of several audiograms on a common, log-spaced frequency grid.
+
+    Thresholds are converted to modern units (see /api/v1/data), and interpolated linearly
+    on a log frequency scale. Thresholds at frequencies outside the tested frequencies of
+    an audiogram are missing.
+
+    Parameters
+    ----------
+    ids : comma-separated list of int, required
+       ids of audiograms
+    grid : lowest frequency in kHz, highest frequency in kHz, number of frequencies (default: 0.1,200,64)
+    format : json (default) | npz (NumPy arrays ids, grid and thresholds, missing thresholds are NaN)
+
+    Returns
+    ----------
+    A string in json format:
+    # ids : list of int ids of the audiograms, in the order of the rows
+    # grid : list of float frequencies in kHz, in the order of the columns
+    # thresholds : list of rows, one per audiogram, of thresholds in dB, null if missing
+
+    Example
+    ---------
+    http://localhost:9082/api/v1/matrix?ids=1,3,221&grid=0.1,200,32
+    Returns the thresholds of audiograms 1, 3 and 221 at 32 frequencies from 0.1 to 200 kHz.
+    """
+    if 'ids' not in request.args:
+        raise Exception("No ids were given.")
+    ids = [int(id) for id in request.args['ids'].split(",")]
+    try:
+        low, high, points = request.args['grid'].split(",") if _getArg('grid') else DEFAULT_GRID
+        grid = log_grid(float(low), float(high), int(points))
+    except ValueError:
+        abort(400)
+    thresholds = _threshold_matrix.matrix(ids, grid, content_hashes(_get_config(), ids),
+                                          lambda missing: Data_multiple_query(_get_config()).run_columns(missing))
+    if request.args.get('format') == 'npz':
+        out = io.BytesIO()
+        np.savez_compressed(out, ids=np.array(ids), grid=grid, thresholds=thresholds.astype(np.float32))
+        response = Response(out.getvalue(), mimetype="application/octet-stream")
+        response.headers["Content-Disposition"] = "attachment;filename=Thresholds.npz"
+        return response
+    return jsonify({
+        'ids': ids,
+        'grid': [float("%.4g" % f) for f in grid.tolist()],
+        'thresholds': [[None if t != t else t for t in row] for row in thresholds.round(1).tolist()]
+    })
+
+
+@fapp.route("/api/v1/similar", methods=['GET', 'POST'])
+def get_similar():
+    """
+    Returns the audiograms with the most similar thresholds to an audiogram, or to a measured curve.
+
+    Thresholds are converted to modern units (see /api/v1/data) and interpolated on a log frequency grid
+    from 0.1 to 200 kHz (see /api/v1/matrix). The distance of two audiograms is the root mean square difference
+    of their thresholds, at the grid frequencies tested in both (at least 5).
+    Only audiograms in the same units are compared: in water, thresholds are in dB re 1 μPa,
+    in air in dB re 20 μPa. Audiograms whose units are not converted, e.g. without SPL reference,
+    are not compared.
+
+    Parameters
+    ----------
+    id : int, database identifier of the audiogram to compare to, with GET
+    k : int number of audiograms (default 10, max 100)
+    medium : string air | water, the medium of the curve, required with POST
+    clade : int ott_id of a taxon, only audiograms of its species are returned (default: all taxa)
+
+    With POST, a curve in json format:
+    # frequencies : list of float frequencies in kHz
+    # thresholds : list of float thresholds in dB, in the units of the medium
+
+    Returns
+    ----------
+    Status 400 if the units of the audiogram are not converted.
+    A list in json format, the most similar audiogram first:
+    # id : database id of the audiogram
+    # distance_in_decibel : root mean square difference of the thresholds
+    # frequencies_compared : number of grid frequencies tested in both
+    with the short description of the audiogram (see /api/v1/list)
+
+    Example
+    ---------
+    http://localhost:9082/api/v1/similar?id=221&k=5&clade=698424
+    Returns the 5 audiograms of cetaceans most similar to audiogram 221.
+    """
+    k = int(request.args.get('k', 10))
+    if not 0 < k <= 100:
+        abort(400)
+    index = _get_similarity_index()
+    exclude = None
+    if request.method == 'POST':
+        unit = SIMILARITY_UNITS.get(_getArg('medium'))
+        curve = request.get_json(silent=True)
+        if unit is None or not isinstance(curve, dict) \
+                or len(curve.get('frequencies') or []) != len(curve.get('thresholds') or []):
+            abort(400)
+        columns = {
+            'audiogram_experiment_id': np.zeros(len(curve['frequencies']), dtype=np.int64),
+            'testtone_frequency_in_khz': np.array(curve['frequencies'], dtype=float),
+            'sound_pressure_level_in_decibel': np.array(curve['thresholds'], dtype=float)
+        }
+        found, matrix = interpolate(columns, index.grid)
+        if len(found) == 0:
+            abort(400)
+        vector = matrix[0]
+    else:
+        exclude = _check_id()
+        if exclude not in index:
+            abort(404)
+        vector = index.vector(exclude)
+        unit = int(index.unit[index.index[exclude]])
+        if unit == 0:
+            abort(400)
+    taxa = None
+    if _getArg('clade'):
+        tree = _get_taxonomy_tree()
+        taxa = tree.subtree_ids(_check_taxon(tree, 'clade'))
+    nearest = index.nearest(vector, k, index.select(unit, taxa), exclude)
+    if len(nearest) == 0:
+        return jsonify([])
+    descriptions = {a['id']: a for a in List_query(_get_config()).run([id for id, distance, n in nearest])}
+    return jsonify([dict(descriptions.get(id, {'id': id}), distance_in_decibel=round(distance, 1),
+                         frequencies_compared=n) for id, distance, n in nearest])
+
+
+def _get_similarity_index():
+    """
+    Return the similarity index, see _get_in_memory.
+
+    When the data version changes, only the audiograms with changed data points are read again.
+    """
+    def build(version):
+        # the latest index, read under the build lock
+        previous = _in_memory.get('similarity')
+
+        def load(ids):
+            if previous is None:
+                # first build: all data points in one query
+                return All_data_query(_get_config()).run_columns()
+            return Data_multiple_query(_get_config()).run_columns(ids)
+        hashes = {h['audiogram_experiment_id']: h['content_hash']
+                  for h in All_content_hashes_query(_get_config()).run()}
+        return Similarity_index(hashes, Experiment_taxa_query(_get_config()).run(), load, version, previous)
+    return _get_in_memory('similarity', build)
+
+
+@fapp.route("/api/v1/aggregate", methods=['GET'])
+def get_aggregate():
+    """
+    Returns the consensus audiogram of a species or clade: median and percentiles of the thresholds
+    of all its audiograms, at each frequency.
+
+    Thresholds are converted to modern units (see /api/v1/data) and interpolated on a log frequency grid
+    from 0.1 to 200 kHz (see /api/v1/matrix). Audiograms are aggregated separately by units and
+    measurement type: in water, thresholds are in dB re 1 μPa, in air in dB re 20 μPa.
+    Audiograms whose units are not converted, e.g. without SPL reference, are left out.
+
+    Parameters
+    ----------
+    taxon : int, required ott_id of a species or clade
+    bootstrap : int number of bootstrap resamples for the confidence interval of the median
+       (default 0: no interval, max 10000)
+
+    Returns
+    ----------
+    A list in json format, one aggregate per medium and measurement type:
+    # medium : string air | water, the units of the thresholds
+    # measurement_type : string e.g. auditory threshold
+    # ids : list of int ids of the audiograms
+    # frequencies_in_khz : list of float frequencies of the grid
+    # audiograms : list of int number of audiograms tested at each frequency
+    # median : list of float median threshold in dB at each frequency, null if not tested
+    # percentile_10, percentile_25, percentile_75, percentile_90 : list of float percentiles of the thresholds
+    # median_ci_low, median_ci_high : list of float 95% bootstrap confidence interval of the median,
+       with bootstrap only
+
+    Example
+    ---------
+    http://localhost:9082/api/v1/aggregate?taxon=698424&bootstrap=1000
+    Returns the consensus audiogram of cetaceans, with a confidence interval from 1000 resamples.
+    """
+    samples = int(request.args.get('bootstrap', 0))
+    if not 0 <= samples <= 10000:
+        abort(400)
+    tree = _get_taxonomy_tree()
+    ott_id = _check_taxon(tree, 'taxon')
+    index = _get_similarity_index()
+    key = (index.version, ott_id, samples)
+    with _memory_lock:
+        if key in _aggregates:
+            _aggregates.move_to_end(key)
+            return jsonify(_aggregates[key])
+    selected = index.select(taxa=tree.subtree_ids(ott_id))
+    media = {unit: medium for medium, unit in SIMILARITY_UNITS.items()}
+    groups = sorted({(media[u], t) for u, t in zip(index.unit[selected].tolist(), index.measurement_type[selected])},
+                    key=lambda group: tuple("" if g is None else g for g in group))
+    resp = []
+    for medium, measurement_type in groups:
+        rows = selected & (index.unit == SIMILARITY_UNITS[medium]) & (index.measurement_type == measurement_type)
+        thresholds = index.thresholds[rows]
+        values = Aggregate_audiogram.aggregate(thresholds)
+        if samples > 0:
+            values['median_ci_low'], values['median_ci_high'] = Aggregate_audiogram.bootstrap(
+                thresholds, samples, pool=_get_bootstrap_pool(), processes=_bootstrap_processes())
+        aggregate = {
+            'medium': medium,
+            'measurement_type': measurement_type,
+            'ids': index.ids[rows].tolist(),
+            'frequencies_in_khz': [float("%.4g" % f) for f in index.grid.tolist()]
+        }
+        for name, value in values.items():
+            aggregate[name] = [None if v != v else v for v in value.round(1).tolist()]
+        resp.append(aggregate)
+    size = _get_config().getint('DEFAULT', 'AGGREGATE_CACHE_SIZE', fallback=1000)
+    with _memory_lock:
+        _aggregates[key] = resp
+        while len(_aggregates) > size:
+            _aggregates.popitem(last=False)
+    return jsonify(resp)
+
+
+def _bootstrap_processes():
+    """
+    Return the number of processes of the bootstrap.
+
+    BOOTSTRAP_PROCESSES in the configuration (default: number of CPUs), with 1 the bootstrap runs in the request.
+    """
+    return _get_config().getint('DEFAULT', 'BOOTSTRAP_PROCESSES', fallback=os.cpu_count() or 1)
+
+
+def _get_bootstrap_pool():
+    """
+    Return the process pool of the bootstrap, started on first use, None with one process.
+
+    The processes are started with spawn: forking would copy the request threads, the open Redis and
+    MySQL connections and the in-memory data into them. The pool is terminated at exit.
+    """
+    global _bootstrap_pool
+    processes = _bootstrap_processes()
+    if processes <= 1:
+        return None
+    with _memory_lock:
+        if _bootstrap_pool is None:
+            _bootstrap_pool = multiprocessing.get_context('spawn').Pool(processes)
+            atexit.register(_bootstrap_pool.terminate)
+        return _bootstrap_pool
+
+
 @fapp.route("/api/v1/plot", methods=['GET'])
 def get_plot():
     """
@@ -380,10 +969,15 @@ def get_plot():
     Parameters
     ----------
     id : int, required database identifier of an audiogram
+    size : string, optional full (default) | medium | small | thumbnail
+    dpi : int, optional image resolution 72 | 100 | 150 | 300 (default)
 
     Returns
     ----------
-    A json object describing the status of the plotting process
+    If the plot has already been drawn: status 200 and the progress report of a completed
+    plotting process (see plotstatus), including
+    # result : URL of plot image
+    Otherwise, status 202 and a json object describing the status of the plotting process
     # Location : URL status of the plotting process. 
     Opening this URL gives information whether the plotting process is completed,
     and if so, the URL of the plot image.
@@ -401,17 +995,9 @@ def get_plot():
     if 'id' not in request.args:
         raise Exception("No id was given.")
     id = int(request.args['id'])
-    # get the data points
-    data_points = Data_query(api_config).run(id)
-    # delegate execution
+    size, dpi = _plot_variant()
     logging.warning('PLOT')
-    task = plot.delay(simplejson.dumps(data_points), request.url)
-    # return the url where the status can be read
-    return(
-        jsonify({'Location': url_for('plotstatus', task_id=task.id)}),
-        202,
-        {'Location': url_for('plotstatus', task_id=task.id)}
-    )
+    return _request_plot(plot, 'plot', [id], size, dpi)
 
 
 @fapp.route("/api/v1/plotlayers", methods=['GET'])
@@ -422,10 +1008,15 @@ def get_plotlayers():
     Parameters
     ----------
     ids : comma-separated list of int, required database identifier of audiograms
+    size : string, optional full (default) | medium | small | thumbnail
+    dpi : int, optional image resolution 72 | 100 | 150 | 300 (default)
 
     Returns
     ----------
-    A json object describing the status of the plotting process
+    If the plot has already been drawn: status 200 and the progress report of a completed
+    plotting process (see plotstatus), including
+    # result : URL of plot image
+    Otherwise, status 202 and a json object describing the status of the plotting process
     # Location : URL status of the plotting process. 
     Opening this URL gives information whether the plotting process is completed,
     and if so, the URL of the plot image.
@@ -445,32 +1036,108 @@ def get_plotlayers():
     # sort ids as int when drawing layers, otherwise labels get assigned to wrong colors
     ids = [int(id) for id in ids]
     ids.sort()
+    size, dpi = _plot_variant()
+    return _request_plot(plotlayers, 'plotlayers', ids, size, dpi)
+
+
+@fapp.route("/api/v1/plotspec", methods=['GET'])
+def get_plotspec():
+    """
+    Returns a chart specification for plotting audiograms in the browser.
+    The plot is the same as the one returned by plot or plotlayers,
+    but is rendered client-side, no plotting process is started.
+
+    Parameters
+    ----------
+    ids : comma-separated list of int, required database identifier of audiograms
+
+    Returns
+    ----------
+    A Vega-Lite specification (https://vega.github.io/vega-lite/) in json format, including:
+    # data : the data points of all audiograms, converted to current units
+    # encoding : axes (log-scale frequency in kHz, threshold in dB), limits, colours and labels
+
+    Raises
+    ----------
+    Exception if no ids were given
+
+    Example
+    ---------
+    https://animalaudiograms.museumfuernaturkunde.berlin/api/v1/plotspec?ids=186,187
+    Returns a json string with the chart specification of the overlay of audiograms 186 and 187
+    """
+    if 'ids' not in request.args:
+        raise Exception("No ids were given.")
+    ids = request.args['ids'].split(",")
+    # sort ids as int when drawing layers, same colors as in plotlayers
+    ids = [int(id) for id in ids]
+    ids.sort()
     # get the data points
-    data_points_array = []
-    for id in ids:
-        data_points_array.append(Data_query(api_config).run(id))
+    data_points_array = _get_data_points_array(ids)
+    spec = Plot_spec().build(data_points_array)
+    return jsonify(spec)
+
+
+def _plot_variant():
+    """Return the size and dpi requested for a plot, checked against the presets."""
+    size = _getArg('size')
+    if size is not None and size not in SIZES:
+        raise Exception("Invalid size, use one of: " + ", ".join(SIZES))
+    dpi = _getArg('dpi')
+    if dpi is not None:
+        dpi = int(dpi)
+        if dpi not in DPIS:
+            raise Exception("Invalid dpi, use one of: " + ", ".join(str(d) for d in DPIS))
+    return size, dpi
+
+
+def _request_plot(task, kind, ids, size, dpi):
+    """
+    Return the plot if it is cached, otherwise start the plotting process.
+
+    When the plot is not cached, the request waits up to PLOT_WAIT_BUDGET seconds (default 0)
+    for the plotting process to complete, before returning the status location.
+
+    @param task: Celery task, plot or plotlayers
+    @param kind: 'plot' or 'plotlayers'
+    @param ids: sorted list of int, database identifiers of audiograms
+    @param size: name of the image size preset
+    @param dpi: image resolution
+    @return: Flask response, 200 with the image URL or 202 with the status location
+    """
+    url = plot_url(kind, ids)
+    version = plot_version(ids, content_hashes(_get_config(), ids))
+    img_file = get_plotter(_get_config()).cached(url, version, size, dpi)
+    if img_file is not None:
+        Metrics.plot_cache.inc(result='hit')
+        return jsonify(dict(_plot_completed(img_file), state='SUCCESS'))
+    Metrics.plot_cache.inc(result='miss')
+
+    # delegate execution, the data points are read by the background task
+    task_args = (ids[0] if kind == 'plot' else ids, url, size, dpi)
+    with Metrics.timed('enqueue'):
+        task_id = _enqueue_plot(task, _plot_identity(kind, ids, size, dpi), version, *task_args)
+
+    budget = _get_config().getfloat('DEFAULT', 'PLOT_WAIT_BUDGET', fallback=0)
+    if budget > 0:
+        result = task.AsyncResult(task_id)
+        try:
+            result.get(timeout=budget, propagate=False)
+        except TimeoutError:
+            pass
+        if result.successful():
+            return jsonify(dict(result.info, state=result.state))
 
-    # delegate execution
-    task = plotlayers.delay(simplejson.dumps(data_points_array), request.url)
     # return the url where the status can be read
     return(
-        jsonify({'Location': url_for('plotstatus', task_id=task.id)}),
+        jsonify({'Location': url_for('plotstatus', task_id=task_id)}),
         202,
-        {'Location': url_for('plotstatus', task_id=task.id)}
+        {'Location': url_for('plotstatus', task_id=task_id)}
     )
 
 
-@client.task(bind=True, name='plot')
-def plot(self, data_points, url):
-    """
-    Background task that runs a long function with progress reports.
-
-    @param data_points: data to be plotted
-    @param url: will be used for cache key. Only GET requests!
-    """
-    # plot the data points
-    plotter = Plotter()
-    img_file = plotter.plot(data_points, url)
+def _plot_completed(img_file):
+    """Progress report of a completed plotting process."""
     return {
         'current': 100,
         'total': 100,
@@ -479,23 +1146,158 @@ def plot(self, data_points, url):
     }
 
 
+def _plot_identity(kind, ids, size, dpi):
+    """
+    Canonical identity of a plot, the same for all requests drawing the same image.
+
+    @param kind: 'plot' or 'plotlayers'
+    @param ids: sorted list of int, database identifiers of audiograms
+    """
+    return "%s:%s:%s:%d" % (kind, ",".join(str(id) for id in ids), size or 'full', dpi or MASTER_DPI)
+
+
+def _enqueue_plot(task, identity, version, *args):
+    """
+    Start a plot task, unless the same plot is already being drawn.
+
+    A Redis key per plot identity holds the id of the pending or running task (single flight).
+    Requests for the same plot get this task id, instead of starting a duplicate task.
+    The task deletes the key when done, the key expires after PLOT_LOCK_TTL seconds
+    in case the worker dies.
+
+    Celery reports unknown task ids as PENDING, so a task is stored as PENDING in the result backend
+    when it is sent, and only tasks known to the result backend are joined: a task lost with a worker crash
+    or a broker flush is replaced at once.
+
+    @param task: Celery task, plot or plotlayers
+    @param identity: canonical identity of the plot, see _plot_identity
+    @param version: content hash of the data points, see Plot_cache.plot_version
+    @param args: arguments of the task
+    @return: id of the task drawing the plot
+    """
+    lock = "plot_task:" + identity
+    ttl = _get_config().getint('DEFAULT', 'PLOT_LOCK_TTL', fallback=300)
+    for attempt in range(3):
+        task_id = uuid()
+        if redis_client.set(lock, task_id, nx=True, ex=ttl):
+            task.backend.store_result(task_id, None, 'PENDING')
+            task.apply_async(args=args, kwargs={'lock': lock, 'version': version}, task_id=task_id)
+            Metrics.plot_tasks.inc(result='started')
+            return task_id
+        running = redis_client.get(lock)
+        if running is None:
+            # released in the meantime, try again
+            continue
+        running = running.decode('utf-8')
+        if _known_task_state(task, running) in ('PENDING', 'STARTED', 'RETRY'):
+            Metrics.plot_tasks.inc(result='joined')
+            return running
+        # the task is done, or unknown to the result backend, but did not release the lock:
+        # take the lock over, unless another request did already
+        _release_plot_lock(lock, running)
+    # give up deduplicating
+    Metrics.plot_tasks.inc(result='started')
+    return task.apply_async(args=args, kwargs={'version': version}).id
+
+
+def _known_task_state(task, task_id):
+    """State of a task in the result backend, None if the result backend does not know the task id."""
+    value = task.backend.get(task.backend.get_key_for_task(task_id))
+    if value is None:
+        return None
+    return task.backend.decode_result(value)['status']
+
+
+def _release_plot_lock(lock, task_id):
+    """Delete the plot lock, if it is still held by this task."""
+    if lock is None:
+        return
+    # compare and delete in one step
+    redis_client.eval(
+        "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end",
+        1, lock, task_id)
+
+
+def _get_data_points_array(ids):
+    """
+    Get the data points of several audiograms in one query.
+
+    @param ids: list of int, database identifiers of audiograms
+    @return: one list of data points per audiogram, in the order of ids
+    """
+    data_points = Data_multiple_query(_get_config()).run(ids)
+    data_points_array = {id: [] for id in ids}
+    for point in data_points:
+        data_points_array[point['audiogram_experiment_id']].append(point)
+    return [data_points_array[id] for id in ids]
+
+
+def _get_data_columns(ids):
+    """
+    Get the data points of several audiograms in one query, as column arrays for plotting.
+
+    @param ids: list of int, database identifiers of audiograms
+    @return: dict of NumPy arrays, see Query.run_columns
+    """
+    return Data_multiple_query(_get_config()).run_columns(ids)
+
+
+@client.task(bind=True, name='plot')
+def plot(self, id, url, size=None, dpi=None, lock=None, version=None):
+    """
+    Background task that runs a long function with progress reports.
+
+    @param id: database identifier of the audiogram to be plotted
+    @param url: will be used for cache key. Only GET requests!
+    @param size: name of the image size preset
+    @param dpi: image resolution
+    @param lock: Redis key to release when done, see _enqueue_plot
+    @param version: content hash of the data points, see Plot_cache.plot_version
+    """
+    try:
+        # get and plot the data points
+        data_points = _get_data_columns([id])
+        plotter = get_plotter(_get_config())
+        img_file = plotter.plot(data_points, url, size, dpi, version)
+    finally:
+        _release_plot_lock(lock, self.request.id)
+    return _plot_completed(img_file)
+
+
 @client.task(bind=True, name='plotlayers')
-def plotlayers(self, data_points_array, url):
+def plotlayers(self, ids, url, size=None, dpi=None, lock=None, version=None):
     """
     Background task that runs a long function with progress reports.
 
-    @param data_points: data to be plotted
+    @param ids: sorted list of database identifiers of the audiograms to be plotted
     @param url: will be used for cache key. Only GET requests!
+    @param size: name of the image size preset
+    @param dpi: image resolution
+    @param lock: Redis key to release when done, see _enqueue_plot
+    @param version: content hash of the data points, see Plot_cache.plot_version
     """
-    # plot the data points
-    plotter = Plotter()
-    img_file = plotter.plotlayers(data_points_array, url)
-    return {
-        'current': 100,
-        'total': 100,
-        'status': 'Task completed!',
-        'result': img_file
-    }
+    try:
+        # get and plot the data points
+        data_points_array = _get_data_columns(ids)
+        plotter = get_plotter(_get_config())
+        img_file = plotter.plotlayers(data_points_array, url, size, dpi, version)
+    finally:
+        _release_plot_lock(lock, self.request.id)
+    return _plot_completed(img_file)
+
+
+def _get_config():
+    """
+    Return the API configuration.
+
+    The Celery worker imports this module without running __main__,
+    so the configuration file is read on first use: read it only through this function.
+    """
+    global api_config
+    if api_config is None:
+        api_config = configparser.ConfigParser()
+        api_config.read(configPath)
+    return api_config
 
 
 @fapp.route('/status/<task_id>')
@@ -525,31 +1327,128 @@ def plotstatus(task_id):
     see get_plot
     """
     task = plot.AsyncResult(task_id)
-    if task.state == 'PENDING':
+    return jsonify(_task_status(task.state, task.info))
+
+
+@fapp.route('/status')
+def plotstatus_multiple():
+    """
+    Return progress reports on several plotting processes, with a single lookup.
+
+    Parameters
+    ----------
+    ids : comma-separated list of string, required task ids, as found in the status locations
+
+    Returns
+    ----------
+    A json object with a progress report for each task id, see plotstatus
+
+    Raises
+    ----------
+    Exception if no ids were given
+
+    Example
+    ---------
+    http://localhost:9082/status?ids=6e1ec9a6-50e3-4c1d-a1e5-4e0d5a1f6b2c,1c3f6b4e-9a3e-4a4e-8c1b-0f4b8e3a2d5f
+    Returns the progress reports of both plotting processes
+    """
+    if 'ids' not in request.args:
+        raise Exception("No ids were given.")
+    task_ids = request.args['ids'].split(",")
+    # read all results from the result backend at once
+    backend = plot.backend
+    values = backend.mget([backend.get_key_for_task(task_id) for task_id in task_ids])
+    response = {}
+    for task_id, value in zip(task_ids, values):
+        if value is None:
+            response[task_id] = _task_status('PENDING', None)
+        else:
+            meta = backend.decode_result(value)
+            response[task_id] = _task_status(meta['status'], meta['result'])
+    return jsonify(response)
+
+
+@fapp.route('/status/<task_id>/stream')
+def plotstatus_stream(task_id):
+    """
+    Push progress reports on the plotting process, as server-sent events.
+
+    The current progress report is sent at once. If the plotting process is not completed,
+    the connection is held open until it completes, or for PLOT_STREAM_TIMEOUT seconds
+    (default 60), and the final progress report is sent.
+    The client does not have to poll plotstatus in a loop.
+
+    Parameters
+    ----------
+    none
+
+    Returns
+    ----------
+    A stream of 'status' events (text/event-stream), the data of each event is
+    a progress report in json format, see plotstatus
+
+    Example
+    ---------
+    In the browser:
+    new EventSource("/status/<task_id>/stream").addEventListener("status", ...)
+    """
+    timeout = _get_config().getfloat('DEFAULT', 'PLOT_STREAM_TIMEOUT', fallback=60)
+
+    def events():
+        task = plot.AsyncResult(task_id)
+        yield _status_event(task)
+        if not task.ready():
+            try:
+                # the Redis result backend notifies waiting clients, no polling
+                task.get(timeout=timeout, propagate=False)
+            except TimeoutError:
+                pass
+            yield _status_event(task)
+
+    return Response(events(), mimetype="text/event-stream",
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+def _status_event(task):
+    """Progress report as a server-sent event."""
+    status = _task_status(task.state, task.info)
+    return "event: status\ndata: %s\n\n" % simplejson.dumps(status)
+
+
+def _task_status(state, info):
+    """
+    Progress report on a plotting process.
+
+    @param state: Celery task state
+    @param info: task result, or the exception raised if the task failed
+    @return: dict, see plotstatus
+    """
+    if state == 'PENDING':
         response = {
-            'state': task.state,
+            'state': state,
             'current': 0,
             'total': 1,
             'status': 'Pending...'
         }
-    elif task.state != 'FAILURE':
+    elif state != 'FAILURE':
+        info = info or {}
         response = {
-            'state': task.state,
-            'current': task.info.get('current', 0),
-            'total': task.info.get('total', 1),
-            'status': task.info.get('status', '')
+            'state': state,
+            'current': info.get('current', 0),
+            'total': info.get('total', 1),
+            'status': info.get('status', '')
         }
-        if 'result' in task.info:
-            response['result'] = task.info['result']
+        if 'result' in info:
+            response['result'] = info['result']
     else:
         # something went wrong in the background job
         response = {
-            'state': task.state,
+            'state': state,
             'current': 1,
             'total': 1,
-            'status': str(task.info),  # this is the exception raised
+            'status': str(info),  # this is the exception raised
         }
-    return jsonify(response)
+    return response
 
 
 @fapp.route("/api/v1/experiment", methods=['GET'])
@@ -600,7 +1499,7 @@ def get_experiment_by_id():
     if 'id' not in request.args:
         raise Exception("No id was given.")
     id = int(request.args['id'])
-    experiment = Experiment_query(api_config).run(id)
+    experiment = Experiment_query(_get_config()).run(id)
     if len(experiment) > 0:
         return jsonify(experiment[0])
     else:
@@ -637,7 +1536,7 @@ def get_caption_by_id():
     if 'id' not in request.args:
         raise Exception("No id was given.")
     id = int(request.args['id'])
-    caption = Caption_query(api_config).run(id)
+    caption = Caption_query(_get_config()).run(id)
     return jsonify(caption[0])
 
 
@@ -682,7 +1581,7 @@ def get_data_by_experiment_id():
     if 'id' not in request.args:
         raise Exception("No id was given.")
     id = int(request.args['id'])
-    data_points = Data_query(api_config).run(id)
+    data_points = Data_query(_get_config()).run(id)
     return jsonify(data_points)
 
 
@@ -725,7 +1624,7 @@ def get_animal_by_id():
     if 'id' not in request.args:
         raise Exception("No experiment id was given.")
     id = int(request.args['id'])
-    animal = Animal_query(api_config).run(id)
+    animal = Animal_query(_get_config()).run(id)
     return jsonify(animal)
 
 
@@ -750,7 +1649,7 @@ def get_species_by_experiment_id():
     Returns a json string with the information on the animal species (harbour porpoise in this case)
     """
     id = _check_id()
-    species = Species_query(api_config).run(id)
+    species = Species_query(_get_config()).run(id)
     return jsonify(species)
 
 
@@ -775,7 +1674,7 @@ def get_all_taxa():
     http://localhost:9082/api/v1/all_species
     Returns a list of species currently recorded in the database.
     """
-    species = All_taxa_query(api_config).run(id)
+    species = All_taxa_query(_get_config()).run(id)
     return jsonify(species)
 
 
@@ -800,7 +1699,7 @@ def get_all_taxa_vernacular():
     http://localhost:9082/api/v1/all_species_vernacular
     Returns a list of species currently recorded in the database.
     """
-    species = All_taxa_vernacular_query(api_config).run(id)
+    species = All_taxa_vernacular_query(_get_config()).run(id)
     return jsonify(species)
 
 
@@ -826,7 +1725,7 @@ def get_all_measurement_methods():
     http://localhost:9082/api/v1/all_methods
     Returns a list of measurement methods currently recorded in the database.
     """
-    methods = All_measurement_methods_query(api_config).run(id)
+    methods = All_measurement_methods_query(_get_config()).run(id)
     return jsonify(methods)
 
 
@@ -850,7 +1749,7 @@ def get_parent_measurement_methods():
     http://localhost:9082/api/v1/parent_measurement_methods
     Returns a list of generic measurement methods currently recorded in the database.
     """
-    methods = Parent_measurement_methods_query(api_config).run(id)
+    methods = Parent_measurement_methods_query(_get_config()).run(id)
     return jsonify(methods)
 
 
@@ -874,7 +1773,7 @@ def get_all_tone_methods():
     http://localhost:9082/api/v1/all_tone_methods
     Returns a list of tone methods currently recorded in the database.
     """
-    methods = All_tone_methods_query(api_config).run(id)
+    methods = All_tone_methods_query(_get_config()).run(id)
     return jsonify(methods)
 
 
@@ -898,7 +1797,7 @@ def get_all_publications():
     http://localhost:9082/api/v1/all_publications
     Returns a list of publications currently recorded in the database.
     """
-    publications = All_publications_query(api_config).run(id)
+    publications = All_publications_query(_get_config()).run(id)
     return jsonify(publications)
 
 
@@ -922,7 +1821,7 @@ def get_all_facilities():
     http://localhost:9082/api/v1/all_facilities
     Returns a list of facilities currently recorded in the database.
     """
-    facilities = All_facilities_query(api_config).run(id)
+    facilities = All_facilities_query(_get_config()).run(id)
     return jsonify(facilities)
 
 
@@ -948,7 +1847,7 @@ def get_all_birds():
     http://localhost:9082/api/v1/all_birds
     Returns a list of audiograms of birds.
     """
-    resp = Birds_query(api_config).run()
+    resp = Birds_query(_get_config()).run()
     return jsonify(resp)
 
 
@@ -974,7 +1873,7 @@ def get_all_reptiles():
     http://localhost:9082/api/v1/all_reptiles
     Returns a list of audiograms of reptiles.
     """
-    resp = Reptiles_query(api_config).run()
+    resp = Reptiles_query(_get_config()).run()
     return jsonify(resp)
 
 
@@ -1000,7 +1899,7 @@ def get_all_fishes():
     http://localhost:9082/api/v1/all_fishes
     Returns a list of audiograms of fishes.
     """
-    resp = Fishes_query(api_config).run()
+    resp = Fishes_query(_get_config()).run()
     return jsonify(resp)
 
 
@@ -1026,7 +1925,7 @@ def get_all_mammals():
     http://localhost:9082/api/v1/all_mammals
     Returns a list of audiograms of mammals.
     """
-    resp = Mammals_query(api_config).run()
+    resp = Mammals_query(_get_config()).run()
     return jsonify(resp)
 
 
@@ -1052,7 +1951,7 @@ def get_all_cetaceans():
     http://localhost:9082/api/v1/all_cetaceans
     Returns a list of audiograms of cetaceans.
     """
-    resp = Cetaceans_query(api_config).run()
+    resp = Cetaceans_query(_get_config()).run()
     return jsonify(resp)
 
 
@@ -1078,7 +1977,7 @@ def get_all_seals():
     http://localhost:9082/api/v1/all_seals
     Returns a list of audiograms of seals.
     """
-    resp = Seals_query(api_config).run()
+    resp = Seals_query(_get_config()).run()
     return jsonify(resp)
 
 
@@ -1108,7 +2007,7 @@ def get_publication_by_experiment_id():
 
     """
     id = _check_id()
-    publication = Publication_query(api_config).run(id)
+    publication = Publication_query(_get_config()).run(id)
     return jsonify(publication)
 
 
@@ -1138,8 +2037,200 @@ def get_taxonomy():
     http://localhost:9082/api/v1/taxonomy
     Returns the complete taxonomy stored in the database
     """
-    taxonomy = Taxonomy_query(api_config).run(id)
-    return jsonify(taxonomy)
+    return jsonify(_get_taxonomy_tree().nodes())
+
+
+@fapp.route("/api/v1/taxonomy/subtree", methods=['GET'])
+def get_taxonomy_subtree():
+    """
+    Returns a taxon and all taxa below it.
+
+    Parameters
+    ----------
+    root : int, required ott_id of the taxon
+    depth : int maximum number of levels below the taxon (default: all)
+
+    Returns
+    ----------
+    A list of tree nodes in json format, in nested set order (each node is followed by its subtree).
+    Each node has the attributes of /taxonomy, and:
+    # depth : int level below the root taxon, 0 for the root taxon
+
+    Example
+    ---------
+    http://localhost:9082/api/v1/taxonomy/subtree?root=244265&depth=1
+    Returns the class Mammalia and its orders.
+    """
+    tree = _get_taxonomy_tree()
+    root = _check_taxon(tree, 'root')
+    return jsonify(tree.subtree(root, _get_depth()))
+
+
+@fapp.route("/api/v1/taxonomy/ancestors", methods=['GET'])
+def get_taxonomy_ancestors():
+    """
+    Returns the taxa above a taxon, e.g. genus, family, order, class of a species.
+
+    Parameters
+    ----------
+    id : int, required ott_id of the taxon
+
+    Returns
+    ----------
+    A list of tree nodes in json format, from the root of the taxonomy down to the parent of the taxon.
+    Each node has the attributes of /taxonomy.
+
+    Example
+    ---------
+    http://localhost:9082/api/v1/taxonomy/ancestors?id=698406
+    Returns the taxa above the harbour porpoise.
+    """
+    tree = _get_taxonomy_tree()
+    return jsonify(tree.ancestors(_check_taxon(tree, 'id')))
+
+
+@fapp.route("/api/v1/taxonomy/tree", methods=['GET'])
+def get_taxonomy_tree():
+    """
+    Returns the taxonomy as a tree.
+
+    Parameters
+    ----------
+    root : int ott_id of the taxon at the root of the tree (default: the whole taxonomy)
+    depth : int maximum number of levels below the root (default: all)
+
+    Returns
+    ----------
+    A tree node in json format, with the attributes of /taxonomy and:
+    # children : list of the tree nodes below this node
+    Without root, a list of the trees of the taxonomy.
+
+    Example
+    ---------
+    http://localhost:9082/api/v1/taxonomy/tree?root=244265&depth=2
+    Returns the class Mammalia, its orders and their families.
+    """
+    tree = _get_taxonomy_tree()
+    depth = _get_depth()
+    if 'root' not in request.args:
+        return jsonify([tree.tree(root, depth) for root in tree.roots()])
+    return jsonify(tree.tree(_check_taxon(tree, 'root'), depth))
+
+
+def _get_taxonomy_tree():
+    """Return the taxonomy, loaded on first use and reloaded when the data version changes."""
+    return _get_in_memory('taxonomy', lambda version: Taxonomy_tree(Taxonomy_query(_get_config()).run(), version))
+
+
+def _check_taxon(tree, name):
+    """Return the ott_id in a request parameter, abort with 404 if the taxonomy does not have it."""
+    if name not in request.args:
+        raise Exception("No %s was given." % name)
+    ott_id = int(request.args[name])
+    if ott_id not in tree:
+        abort(404)
+    return ott_id
+
+
+def _get_depth():
+    """Return the depth parameter of the request, None if not given."""
+    depth = _getArg('depth')
+    return None if depth is None or depth == '' else int(depth)
+
+
+@fapp.route("/api/v1/search", methods=['GET'])
+def search():
+    """
+    Search taxa, English names of species, publications and facilities by name, e.g. for autocomplete.
+
+    Matching ignores case and accents. Names with a word starting with the query are returned first,
+    then names similar to the query, to find misspelt names.
+
+    Parameters
+    ----------
+    q : string, required text typed by the user
+    limit : int maximum number of results (default 20, max 100), status 400 if not a positive integer
+    kind : comma-separated list of kinds to search, taxon | vernacular | publication | facility (default: all)
+
+    Returns
+    ----------
+    A list in json format, best matches first:
+    # kind : string taxon | vernacular | publication | facility
+    # id : int ott_id of the taxon, or database identifier of the publication or facility
+    # text : string matching name
+    # detail : string rank of a taxon, latin name of a vernacular name, null otherwise
+    # match : string prefix | fuzzy
+    # score : float similarity to the query, 1 for prefix matches
+
+    Example
+    ---------
+    http://localhost:9082/api/v1/search?q=dolph&kind=vernacular,taxon
+    Returns taxa with a word starting with "dolph", e.g. bottlenose dolphin.
+    """
+    limit = _check_limit(20, 100)
+    kind = _getArg('kind')
+    kinds = set(kind.split(',')) if kind else None
+    return jsonify(_get_search_index().search(request.args.get('q', ''), limit, kinds))
+
+
+def _data_version():
+    """
+    Version of the data, see Data_version_query.
+
+    Read at most every DATA_VERSION_TTL seconds (default 60), so changes in the database
+    are seen by the in-memory data after that delay. The query reads whole tables: one request
+    runs it, outside _memory_lock, and concurrent requests keep the previous version meanwhile.
+    Only the first read is waited for.
+    """
+    ttl = _get_config().getfloat('DEFAULT', 'DATA_VERSION_TTL', fallback=60)
+    with _memory_lock:
+        version, read = _data_version_memo['version'], _data_version_memo['time']
+    if read is not None and time.monotonic() - read <= ttl:
+        return version
+    if not _data_version_lock.acquire(blocking=read is None):
+        # read by another request
+        return version
+    try:
+        with _memory_lock:
+            # read by another request while this one waited
+            if _data_version_memo['time'] != read:
+                return _data_version_memo['version']
+        now = time.monotonic()
+        version = Data_version_query(_get_config()).run()[0]['version']
+        with _memory_lock:
+            _data_version_memo['version'] = version
+            _data_version_memo['time'] = now
+        return version
+    finally:
+        _data_version_lock.release()
+
+
+def _get_in_memory(name, build):
+    """
+    Return data kept in memory, built on first use and rebuilt when the data version changes.
+
+    One request builds the data, concurrent requests for the same data wait for it instead of building it too.
+
+    @param build: function of the data version, returns the data, with the version in its version attribute
+    """
+    version = _data_version()
+    data = _in_memory.get(name)
+    if data is not None and data.version == version:
+        return data
+    with _memory_lock:
+        lock = _build_locks.setdefault(name, threading.Lock())
+    with lock:
+        # built by another request while this one waited
+        data = _in_memory.get(name)
+        if data is None or data.version != version:
+            data = build(version)
+            _in_memory[name] = data
+    return data
+
+
+def _get_search_index():
+    """Return the search index, see _get_in_memory."""
+    return _get_in_memory('search', lambda version: Search_index(Search_entries_query(_get_config()).run(), version))
 
 
 def _check_id():
@@ -1148,11 +2239,41 @@ def _check_id():
     return int(request.args['id'])
 
 
+def _check_limit(default, maximum=None):
+    """
+    Return the limit parameter, at most maximum, or the default without limit parameter.
+
+    Abort with 400, unless the limit is a positive integer.
+    """
+    if 'limit' not in request.args:
+        return default
+    limit = request.args.get('limit', type=int)
+    if limit is None or limit < 1:
+        abort(400)
+    return limit if maximum is None else min(limit, maximum)
+
+
+def _check_admin():
+    """Abort with 403, unless the request has the ADMIN_TOKEN of the configuration."""
+    if not _is_admin():
+        abort(403)
+
+
+def _is_admin():
+    """
+    True if the request has the ADMIN_TOKEN of the configuration in the X-Admin-Token header.
+
+    Never in a parameter: URLs are written to access logs, and replayed by the load test.
+    """
+    expected = _get_config().get('DEFAULT', 'ADMIN_TOKEN', fallback='')
+    token = request.headers.get('X-Admin-Token') or ''
+    return expected != '' and hmac.compare_digest(token.encode('utf-8'), expected.encode('utf-8'))
+
+
 if __name__ == '__main__':
     try:
-        # Read the configuration file
-        api_config = configparser.ConfigParser()
-        api_config.read(configPath)
+        # warn about indexes the queries rely on, see Migrate.py
+        Migrate.check(_get_config())
         fapp.run(host='0.0.0.0')
     except Exception as e:
         fapp.logger.info(e)
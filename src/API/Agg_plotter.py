@@ -0,0 +1,117 @@
+"""
+Lightweight alternative to Plotter, drawing directly with the matplotlib Agg API.
+
+Audiograms are small (usually 10-40 points) and always drawn on the same
+log-x / linear-y frame, so the figure, axes, scales and theme are built once per
+process and reused as a template. Only the data lines change between plots.
+
+Created on 18.10.2026
+@author: agent for Museum fuer Naturkunde Berlin
+"""
+import threading
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.ticker import FuncFormatter
+from Plotter import Plotter, PALETTE, X_LABEL, X_LIMITS, X_LIMITS_LAYERS, Y_LIMITS, MASTER_SIZE, MASTER_DPI, y_label, layer_label
+
+
+class Agg_plotter(Plotter):
+    """Renders the same audiogram styles as Plotter, without pandas and plotnine."""
+
+    _templates = {}
+    """Pre-built figures, one for single audiograms and one for overlays."""
+    _lock = threading.Lock()
+    """Figures are shared, only one plot can be drawn at a time."""
+
+    def _draw_single(self, data_points, path):
+        """
+        Draw a single audiogram and save it.
+
+        @param data_points: dict of column arrays, as returned by Query.Data_query.run_columns
+        @param path: OS path of the image file
+        """
+        freq, spl = self._to_arrays(data_points)
+        y_title = y_label(data_points['spl_reference_display_label'][0])
+        with Agg_plotter._lock:
+            fig, ax = self._get_template('single')
+            ax.set_xlim(*X_LIMITS)
+            ax.set_ylabel(y_title)
+            ax.set_title(self.title)
+            ax.plot(freq, spl, color='black', linewidth=1.0,
+                    marker='o', markersize=4, markerfacecolor='black')
+            self._save(fig, ax, path)
+
+    def _draw_layers(self, data_points_array, path):
+        """
+        Draw audiogram overlays and save them.
+
+        @param data_points_array: dict of column arrays, as returned by Query.Data_multiple_query.run_columns
+        @param path: OS path of the image file
+        """
+        layer = self._layers(data_points_array)
+        freq, spl = self._to_arrays(data_points_array)
+        # same order as freq and spl
+        layer = layer[np.argsort(data_points_array['testtone_frequency_in_khz'], kind='stable')]
+        y_title = y_label(data_points_array['spl_reference_display_label'][0])
+        with Agg_plotter._lock:
+            fig, ax = self._get_template('layers')
+            ax.set_xlim(*X_LIMITS_LAYERS)
+            ax.set_ylabel(y_title)
+            ax.set_title(self.title)
+            for i in range(layer.max() + 1 if len(layer) else 0):
+                in_layer = layer == i
+                color = PALETTE[i % len(PALETTE)]
+                ax.plot(freq[in_layer], spl[in_layer], color=color, linewidth=1.0,
+                        marker='o', markersize=4, markerfacecolor=color,
+                        label=layer_label(i))
+            ax.legend(title='label', loc='center left', bbox_to_anchor=(1.02, 0.5),
+                      frameon=False)
+            self._save(fig, ax, path)
+
+    def _to_arrays(self, data_points):
+        """
+        Return the frequency and threshold arrays of data points.
+
+        Points are sorted by frequency, so that lines are drawn from left to right,
+        as plotnine's geom_line does.
+        """
+        freq = np.asarray(data_points['testtone_frequency_in_khz'], dtype=float)
+        spl = np.asarray(data_points['sound_pressure_level_in_decibel'], dtype=float)
+        order = np.argsort(freq, kind='stable')
+        return freq[order], spl[order]
+
+    def _get_template(self, kind):
+        """Return the pre-built figure and axes for 'single' or 'layers' plots."""
+        if kind not in Agg_plotter._templates:
+            fig = Figure(figsize=(MASTER_SIZE, MASTER_SIZE), dpi=MASTER_DPI)
+            FigureCanvasAgg(fig)
+            ax = fig.add_subplot(111)
+            # leave room for the legend on the right
+            fig.subplots_adjust(left=0.15, bottom=0.12, top=0.92,
+                                right=0.82 if kind == 'layers' else 0.95)
+            # the same frame as plotnine's theme_bw
+            ax.set_xscale('log')
+            ax.xaxis.set_major_formatter(FuncFormatter(lambda v, pos: "%g" % v))
+            ax.set_ylim(*Y_LIMITS)
+            ax.set_xlabel(X_LABEL)
+            ax.set_facecolor('white')
+            ax.grid(True, which='major', color='#ebebeb', linewidth=0.8)
+            ax.grid(True, which='minor', color='#f5f5f5', linewidth=0.5)
+            ax.set_axisbelow(True)
+            for spine in ax.spines.values():
+                spine.set_color('#333333')
+            ax.tick_params(which='both', colors='#4d4d4d', labelsize=8)
+            Agg_plotter._templates[kind] = (fig, ax)
+        return Agg_plotter._templates[kind]
+
+    def _save(self, fig, ax, path):
+        """Save the figure, then remove the data so the template can be reused."""
+        try:
+            fig.savefig(path, dpi=MASTER_DPI, facecolor='white')
+        finally:
+            for line in list(ax.lines):
+                line.remove()
+            legend = ax.get_legend()
+            if legend is not None:
+                legend.remove()
@@ -0,0 +1,114 @@
+"""
+Consensus audiogram of a group of audiograms, e.g. of all audiograms of a species or clade.
+
+At each frequency of the common log frequency grid (see Similarity_index), the median and percentiles
+of the thresholds of the audiograms tested at that frequency. Optionally, a bootstrap confidence interval
+of the median: the audiograms are resampled with replacement, the median of each resample is computed,
+and the interval is given by the percentiles of these medians.
+
+Quantiles are computed with one sort of the whole matrix, instead of np.nanpercentile's loop per frequency.
+Bootstrap resamples are drawn in batches of bounded memory, each with its own seed: the result does not
+depend on whether the batches run in a process pool or in the calling process. With a pool, the batches
+are split in one chunk per process and the thresholds are passed once, in shared memory.
+
+Created on 19.10.2026
+@author: agent for Museum fuer Naturkunde Berlin
+"""
+from multiprocessing import shared_memory
+import numpy as np
+
+
+PERCENTILES = (10, 25, 75, 90)
+"""Percentile bands around the median."""
+CONFIDENCE = 95
+"""Confidence level of the bootstrap interval, in %."""
+CHUNK_VALUES = 1000000
+"""Maximum number of thresholds resampled by one batch of the bootstrap, limits the memory of a batch."""
+SEED = 0
+"""Seed of the bootstrap, the same request always gets the same interval."""
+
+
+def quantiles(values, q, axis=0):
+    """
+    Quantiles of values along an axis, ignoring NaN, with linear interpolation as np.nanpercentile.
+
+    @param q: sequence of quantiles between 0 and 1
+    @return: array with the quantiles along the first axis, NaN where all values are NaN
+    """
+    values = np.sort(values, axis=axis)
+    # NaN are sorted last
+    counts = np.sum(~np.isnan(values), axis=axis, keepdims=True)
+    resp = []
+    for p in q:
+        position = p * np.maximum(counts - 1, 0)
+        below = np.floor(position).astype(np.int64)
+        above = np.ceil(position).astype(np.int64)
+        low = np.take_along_axis(values, below, axis)
+        high = np.take_along_axis(values, above, axis)
+        value = np.where(counts == 0, np.nan, low + (high - low) * (position - below))
+        resp.append(np.squeeze(value, axis))
+    return np.stack(resp)
+
+
+def aggregate(thresholds, percentiles=PERCENTILES):
+    """
+    Median and percentiles of thresholds at each frequency.
+
+    @param thresholds: matrix of thresholds, one row per audiogram, one column per frequency, NaN if not tested
+    @return: dict of arrays, one value per frequency: audiograms (number tested), median, percentile_<p>
+    """
+    q = [0.5] + [p / 100 for p in percentiles]
+    values = quantiles(thresholds, q)
+    resp = {'audiograms': np.sum(~np.isnan(thresholds), axis=0), 'median': values[0]}
+    for p, value in zip(percentiles, values[1:]):
+        resp['percentile_%d' % p] = value
+    return resp
+
+
+def bootstrap(thresholds, samples, confidence=CONFIDENCE, seed=SEED, pool=None, processes=1):
+    """
+    Bootstrap confidence interval of the median at each frequency.
+
+    @param thresholds: matrix of thresholds, see aggregate
+    @param samples: number of resamples
+    @param pool: multiprocessing.Pool running the batches, default: run them in this process
+    @param processes: number of processes of the pool, one chunk of batches is sent to each
+    @return: tuple (array of lower bounds, array of upper bounds), one value per frequency
+    """
+    size = max(1, CHUNK_VALUES // max(1, thresholds.size))
+    sizes = [min(size, samples - start) for start in range(0, samples, size)]
+    batches = list(zip(sizes, np.random.SeedSequence(seed).spawn(len(sizes))))
+    if pool is not None and processes > 1 and len(batches) > 1:
+        thresholds = np.ascontiguousarray(thresholds, dtype=float)
+        memory = shared_memory.SharedMemory(create=True, size=max(1, thresholds.nbytes))
+        try:
+            np.ndarray(thresholds.shape, dtype=float, buffer=memory.buf)[:] = thresholds
+            bounds = np.linspace(0, len(batches), min(processes, len(batches)) + 1).astype(int).tolist()
+            chunks = [(memory.name, thresholds.shape, batches[start:end]) for start, end in zip(bounds, bounds[1:])]
+            medians = [m for chunk in pool.map(_bootstrap_chunk, chunks) for m in chunk]
+        finally:
+            memory.close()
+            memory.unlink()
+    else:
+        medians = [_bootstrap_medians(thresholds, n, s) for n, s in batches]
+    tail = (100 - confidence) / 200
+    low, high = quantiles(np.vstack(medians), (tail, 1 - tail))
+    return low, high
+
+
+def _bootstrap_chunk(chunk):
+    """Medians of the batches of a chunk, the thresholds read from shared memory. Runs in the process pool."""
+    name, shape, batches = chunk
+    memory = shared_memory.SharedMemory(name)
+    thresholds = np.ndarray(shape, dtype=float, buffer=memory.buf)
+    medians = [_bootstrap_medians(thresholds, n, seed) for n, seed in batches]
+    # the buffer is released before closing it
+    del thresholds
+    memory.close()
+    return medians
+
+
+def _bootstrap_medians(thresholds, samples, seed):
+    """Medians of resamples of the audiograms, one row per resample."""
+    rows = np.random.default_rng(seed).integers(0, len(thresholds), (samples, len(thresholds)))
+    return quantiles(thresholds[rows], (0.5,), axis=1)[0]
@@ -0,0 +1,159 @@
+"""
+Metrics derived from the data points of each audiogram, e.g. best frequency and lowest threshold.
+
+The metrics of all audiograms are computed at once with NumPy, from the converted data points
+(see Query.All_data_query), and kept in memory by the API until the data version changes.
+For range filters, the audiograms are also sorted by the value of each metric.
+
+Thresholds are in the converted units of Data_query: dB re 1 μPa in water, dB re 20 μPa in air.
+Audiograms with data points that are not all in the same converted unit (see SPL_converter.converted_units)
+only have the metrics of their tested frequencies, the metrics from the thresholds are missing.
+
+Created on 18.10.2026
+@author: agent for Museum fuer Naturkunde Berlin
+"""
+import numpy as np
+from SPL_converter import converted_units
+
+
+RANGE_DB = 20
+"""The hearing range is where the threshold is at most RANGE_DB above the lowest threshold."""
+
+METRICS = [
+    'min_frequency_in_khz',
+    'max_frequency_in_khz',
+    'best_frequency_in_khz',
+    'lowest_threshold_in_decibel',
+    'hearing_range_low_in_khz',
+    'hearing_range_high_in_khz'
+]
+"""Names of the metrics, in order."""
+
+THRESHOLD_METRICS = [
+    'best_frequency_in_khz',
+    'lowest_threshold_in_decibel',
+    'hearing_range_low_in_khz',
+    'hearing_range_high_in_khz'
+]
+"""Metrics computed from the thresholds, missing for audiograms whose units are not converted."""
+
+FILTERS = {
+    'min_frequency': 'min_frequency_in_khz',
+    'max_frequency': 'max_frequency_in_khz',
+    'best_frequency': 'best_frequency_in_khz',
+    'lowest_threshold': 'lowest_threshold_in_decibel',
+    'hearing_range_low': 'hearing_range_low_in_khz',
+    'hearing_range_high': 'hearing_range_high_in_khz'
+}
+"""Metrics by name of the range filter, used with the suffixes _from and _to, see API.browse."""
+
+
+def compute(columns):
+    """
+    Compute the metrics of all audiograms.
+
+    Data points without frequency or threshold are ignored.
+    The metrics in THRESHOLD_METRICS are NaN for audiograms whose units are not converted.
+    The hearing range limits are interpolated on a log frequency scale between the
+    measured points around the crossing of lowest threshold + RANGE_DB, or are the lowest
+    or highest measured frequency if the curve does not cross it.
+
+    @param columns: dict of NumPy arrays, see Query.run_columns of Data_query
+    @return: tuple (sorted array of audiogram ids, dict of metric arrays in the order of the ids)
+    """
+    exp = np.asarray(columns['audiogram_experiment_id'], dtype=np.int64)
+    freq = np.asarray(columns['testtone_frequency_in_khz'], dtype=float)
+    spl = np.asarray(columns['sound_pressure_level_in_decibel'], dtype=float)
+    ref = np.asarray(columns['sound_pressure_level_reference_id'])
+    valid = ~np.isnan(freq) & ~np.isnan(spl) & (freq > 0)
+    exp, freq, spl, ref = exp[valid], freq[valid], spl[valid], ref[valid]
+    if len(exp) == 0:
+        return np.array([], dtype=np.int64), {name: np.array([]) for name in METRICS}
+    units = converted_units({'audiogram_experiment_id': exp, 'sound_pressure_level_reference_id': ref})[1]
+
+    # points by audiogram, then frequency: each audiogram is a range starts[g]:ends[g]
+    order = np.lexsort((spl, freq, exp))
+    exp, freq, spl = exp[order], freq[order], spl[order]
+    ids, starts = np.unique(exp, return_index=True)
+    ends = np.append(starts[1:], len(exp))
+    group = np.repeat(np.arange(len(ids)), ends - starts)
+    positions = np.arange(len(exp))
+
+    lowest = np.minimum.reduceat(spl, starts)
+    # first point at the lowest threshold
+    best = np.minimum.reduceat(np.where(spl == lowest[group], positions, len(exp)), starts)
+
+    # first and last point under the range level, there is at least one: the lowest threshold
+    level = lowest + RANGE_DB
+    under = spl <= level[group]
+    first = np.minimum.reduceat(np.where(under, positions, len(exp)), starts)
+    last = np.maximum.reduceat(np.where(under, positions, -1), starts)
+    logf = np.log10(freq)
+    low = freq[first]
+    crossing = first > starts
+    low[crossing] = _crossing(logf, spl, first[crossing] - 1, first[crossing], level[crossing])
+    high = freq[last]
+    crossing = last < ends - 1
+    high[crossing] = _crossing(logf, spl, last[crossing], last[crossing] + 1, level[crossing])
+
+    values = {
+        'min_frequency_in_khz': freq[starts],
+        'max_frequency_in_khz': freq[ends - 1],
+        'best_frequency_in_khz': freq[best],
+        'lowest_threshold_in_decibel': lowest,
+        'hearing_range_low_in_khz': low,
+        'hearing_range_high_in_khz': high
+    }
+    for name in THRESHOLD_METRICS:
+        values[name][units == 0] = np.nan
+    return ids, values
+
+
+def _crossing(logf, spl, a, b, level):
+    """Frequency where the line between points a and b reaches level, on a log frequency scale."""
+    return 10 ** (logf[a] + (level - spl[a]) * (logf[b] - logf[a]) / (spl[b] - spl[a]))
+
+
+class Audiogram_metrics:
+
+    def __init__(self, columns, version=None):
+        """
+        @param columns: dict of NumPy arrays, the converted data points of all audiograms, see compute
+        @param version: data version the metrics were computed from
+        """
+        self.version = version
+        self.ids, self.values = compute(columns)
+        self.index = {id: i for i, id in enumerate(self.ids.tolist())}
+        """Position of each audiogram by id."""
+        self.sorted = {}
+        """Per metric: tuple (sorted values, positions of the audiograms), missing values last."""
+        for name in METRICS:
+            order = np.argsort(self.values[name], kind='stable')
+            self.sorted[name] = (self.values[name][order], order)
+
+    def get(self, id):
+        """Metrics of an audiogram, as a dict, values None if the audiogram has no data points or they are missing."""
+        i = self.index.get(id)
+        resp = {}
+        for name in METRICS:
+            value = None if i is None else float(self.values[name][i])
+            resp[name] = None if value is None or value != value else round(value, 3)
+        return resp
+
+    def select(self, ranges):
+        """
+        Find the audiograms with metrics in ranges.
+
+        @param ranges: dict, by metric: tuple (lowest value or None, highest value or None), bounds included
+        @return: sorted array of audiogram ids
+        """
+        positions = None
+        for name, (low, high) in ranges.items():
+            values, order = self.sorted[name]
+            start = 0 if low is None else np.searchsorted(values, low, side='left')
+            end = np.count_nonzero(~np.isnan(values)) if high is None else np.searchsorted(values, high, side='right')
+            found = order[start:end]
+            positions = found if positions is None else np.intersect1d(positions, found, assume_unique=True)
+        if positions is None:
+            return self.ids
+        return np.sort(self.ids[positions])
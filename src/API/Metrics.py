@@ -0,0 +1,209 @@
+"""
+Instrumentation of the API, exposed in the Prometheus text format.
+
+A minimal, thread-safe metrics registry: counters, gauges and histograms with labels.
+Metrics are kept in memory per process: /metrics shows the metrics of the API process,
+not those of the Celery workers.
+
+See https://prometheus.io/docs/instrumenting/exposition_formats/
+
+Created on 18.10.2026
+@author: agent for Museum fuer Naturkunde Berlin
+"""
+import contextlib
+import threading
+import time
+
+
+class Metric:
+    """Base class of metrics: a value per combination of label values."""
+
+    kind = None
+    """Prometheus metric type."""
+
+    def __init__(self, name, help, registry=None):
+        """@param registry: list the metric is added to, default: REGISTRY, exposed on /metrics"""
+        self.name = name
+        self.help = help
+        self._values = {}
+        self._lock = threading.Lock()
+        (REGISTRY if registry is None else registry).append(self)
+
+    def expose(self):
+        """Return the lines of the metric in text format."""
+        lines = ["# HELP %s %s" % (self.name, self.help), "# TYPE %s %s" % (self.name, self.kind)]
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            lines += self._samples(labels, value)
+        return lines
+
+    def _samples(self, labels, value):
+        return ["%s%s %s" % (self.name, _format_labels(labels), _format_value(value))]
+
+    def _key(self, labels):
+        return tuple(sorted(labels.items()))
+
+
+class Counter(Metric):
+    """Value that only goes up, e.g. number of requests."""
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    Value that goes up and down, e.g. requests in progress.
+
+    If collect is given, it is called on exposition and returns a list of (labels dict, value).
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, name, help, collect=None, registry=None):
+        super().__init__(name, help, registry)
+        self.collect = collect
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def expose(self):
+        if self.collect is not None:
+            for labels, value in self.collect():
+                self.set(value, **labels)
+        return super().expose()
+
+
+class Histogram(Metric):
+    """Distribution of observed values in buckets, e.g. request durations."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, buckets, registry=None):
+        super().__init__(name, help, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            if key not in self._values:
+                self._values[key] = [[0] * len(self.buckets), 0, 0]
+            counts, total, count = self._values[key]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key][1] = total + value
+            self._values[key][2] = count + 1
+
+    def _samples(self, labels, value):
+        counts, total, count = value
+        lines = []
+        for bound, c in zip(self.buckets, counts):
+            lines.append("%s_bucket%s %d" % (self.name, _format_labels(labels + (('le', _format_value(bound)),)), c))
+        lines.append("%s_bucket%s %d" % (self.name, _format_labels(labels + (('le', '+Inf'),)), count))
+        lines.append("%s_sum%s %s" % (self.name, _format_labels(labels), _format_value(total)))
+        lines.append("%s_count%s %d" % (self.name, _format_labels(labels), count))
+        return lines
+
+
+def _format_labels(labels):
+    if len(labels) == 0:
+        return ""
+    return "{%s}" % ",".join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                             for k, v in labels)
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def expose(registry=None):
+    """Return all metrics of a registry in the Prometheus text format, default: REGISTRY."""
+    lines = []
+    for metric in (REGISTRY if registry is None else registry):
+        lines += metric.expose()
+    return "\n".join(lines) + "\n"
+
+
+_timings = threading.local()
+"""Time per phase of the current request, when it is profiled, see Request_profiler."""
+
+
+def start_timings():
+    """Start collecting the time per phase in this thread."""
+    _timings.phases = {}
+
+
+def stop_timings():
+    """Stop collecting, return dict of seconds by phase."""
+    phases = getattr(_timings, 'phases', None)
+    _timings.phases = None
+    return phases or {}
+
+
+def add_timing(phase, seconds):
+    """Add time to a phase, if timings are collected in this thread."""
+    phases = getattr(_timings, 'phases', None)
+    if phases is not None:
+        phases[phase] = phases.get(phase, 0) + seconds
+
+
+@contextlib.contextmanager
+def timed(phase):
+    """Add the time of the block to a phase, see add_timing."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_timing(phase, time.perf_counter() - start)
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+"""Content type of the text format."""
+
+REGISTRY = []
+"""All metrics, in order of definition."""
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+"""Buckets of durations in seconds."""
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+"""Buckets of sizes in bytes."""
+ROW_BUCKETS = (1, 10, 100, 1000, 10000, 100000)
+"""Buckets of numbers of rows."""
+
+# HTTP, see API.py
+http_requests = Counter('aad_http_requests_total', "Requests by route, method and status code.")
+http_request_duration = Histogram('aad_http_request_duration_seconds', "Request latency by route.", DURATION_BUCKETS)
+http_response_size = Histogram('aad_http_response_size_bytes', "Response size by route.", SIZE_BUCKETS)
+http_requests_in_flight = Gauge('aad_http_requests_in_flight', "Requests being processed.")
+
+# database, see Query.py
+db_connections = Counter('aad_db_connections_total', "Database connections opened.")
+db_connect_duration = Histogram('aad_db_connect_duration_seconds', "Time to open a database connection.",
+                                DURATION_BUCKETS)
+db_query_duration = Histogram('aad_db_query_duration_seconds', "Query execution time by Query class.",
+                              DURATION_BUCKETS)
+db_query_rows = Histogram('aad_db_query_rows', "Rows returned by Query class.", ROW_BUCKETS)
+db_query_errors = Counter('aad_db_query_errors_total', "Failed queries by Query class.")
+db_slow_queries = Counter('aad_db_slow_queries_total', "Queries slower than SLOW_QUERY_SECONDS by Query class.")
+
+# plot cache and plot tasks, see API.py
+plot_cache = Counter('aad_plot_cache_requests_total', "Plot requests by cache result (hit or miss).")
+plot_tasks = Counter('aad_plot_tasks_total',
+                     "Plot tasks by outcome: started, or joined an identical task in flight.")
@@ -0,0 +1,169 @@
+"""
+Index migrations, and a check that they are applied.
+
+Migrations are the SQL files in ./migrations, applied in order of their version number
+(the file name prefix). Applied versions are recorded in the table schema_migrations.
+The indexes are derived from the where clauses and joins of the queries in Query.py,
+each file explains which queries it serves.
+
+Run in the API container:
+    cd /src/API
+    python Migrate.py            # apply pending migrations
+    python Migrate.py --check    # list missing indexes
+
+The API checks the indexes at startup and warns about missing ones, see missing_indexes.
+To measure their effect, run the database benchmarks before and after migrating,
+see unittests/performance/test_benchmarks.py.
+
+Created on 18.10.2026
+@author: agent for Museum fuer Naturkunde Berlin
+"""
+import argparse
+import configparser
+import logging
+import os
+import re
+import pymysql
+from Query import Index_query
+
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+"""Directory of the migration files."""
+
+CREATE_INDEX = re.compile(r'create\s+(?:unique\s+)?index\s+`?(\w+)`?\s+on\s+`?(\w+)`?\s*\(([^)]*)\)', re.IGNORECASE)
+"""Index name, table and columns of a create index statement."""
+
+DUPLICATE_KEY_NAME = 1061
+"""MySQL error code: the index already exists."""
+
+
+def migrations(directory=MIGRATIONS_DIR):
+    """
+    List the migration files.
+
+    @return: list of tuples (version, name, path), ordered by version
+    """
+    resp = []
+    for f in os.listdir(directory):
+        match = re.match(r'(\d+)_(\w+)\.sql$', f)
+        if match:
+            resp.append((int(match.group(1)), match.group(2), os.path.join(directory, f)))
+    return sorted(resp)
+
+
+def statements(path):
+    """Split a migration file into statements, without comments."""
+    with open(path) as f:
+        sql = "\n".join(line for line in f.read().split("\n") if not line.strip().startswith("--"))
+    return [s.strip() for s in sql.split(";") if s.strip()]
+
+
+def required_indexes(directory=MIGRATIONS_DIR):
+    """
+    Indexes created by the migrations.
+
+    @return: list of tuples (table, index name, tuple of columns)
+    """
+    resp = []
+    for version, name, path in migrations(directory):
+        for statement in statements(path):
+            match = CREATE_INDEX.search(statement)
+            if match:
+                columns = tuple(c.strip().strip('`').lower() for c in match.group(3).split(','))
+                resp.append((match.group(2).lower(), match.group(1), columns))
+    return resp
+
+
+def missing_indexes(config, directory=MIGRATIONS_DIR):
+    """
+    Check that the database has the indexes of the migrations.
+
+    An index is present if the table has an index with the same leading columns, whatever its name.
+
+    @param config: ConfigParser with the database settings
+    @return: list of tuples (table, index name, columns) of missing indexes
+    """
+    existing = {}
+    for row in Index_query(config).run():
+        key = (row['table_name'].lower(), row['index_name'])
+        existing.setdefault(key, []).append(row['column_name'].lower())
+    prefixes = {(table, tuple(columns)) for (table, index), columns in existing.items()}
+    missing = []
+    for table, index, columns in required_indexes(directory):
+        if not any(t == table and c[:len(columns)] == columns for t, c in prefixes):
+            missing.append((table, index, columns))
+    return missing
+
+
+def check(config):
+    """Log a warning for each missing index, used at startup. Errors are logged, not raised."""
+    try:
+        missing = missing_indexes(config)
+    except Exception as e:
+        logging.warning("Could not check the database indexes: %s" % e)
+        return
+    for table, index, columns in missing:
+        logging.warning("Missing index %s on %s (%s), run Migrate.py" % (index, table, ", ".join(columns)))
+
+
+def migrate(connection, directory=MIGRATIONS_DIR):
+    """
+    Apply the pending migrations.
+
+    Indexes that already exist are skipped, so that databases indexed by hand can be migrated.
+
+    @return: list of the versions applied
+    """
+    applied = []
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            create table if not exists schema_migrations (
+                version int not null primary key,
+                name varchar(255) not null,
+                applied_at timestamp not null default current_timestamp
+            )""")
+        cursor.execute("select version from schema_migrations")
+        done = {row[0] for row in cursor.fetchall()}
+        for version, name, path in migrations(directory):
+            if version in done:
+                continue
+            for statement in statements(path):
+                try:
+                    cursor.execute(statement)
+                except pymysql.err.MySQLError as e:
+                    # pymysql 0.9 raises InternalError for this error code, later versions OperationalError
+                    if e.args[0] != DUPLICATE_KEY_NAME:
+                        raise
+                    logging.warning("%s: %s" % (name, e.args[1]))
+            cursor.execute("insert into schema_migrations (version, name) values (%s, %s)", (version, name))
+            connection.commit()
+            applied.append(version)
+    return applied
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply the index migrations.")
+    parser.add_argument('--check', action='store_true', help="only list the missing indexes")
+    parser.add_argument('--config', default="/src/API/.env", help="path to the API configuration file")
+    args = parser.parse_args()
+
+    config = configparser.ConfigParser()
+    config.read(args.config)
+    if args.check:
+        for table, index, columns in missing_indexes(config):
+            print("missing %s on %s (%s)" % (index, table, ", ".join(columns)))
+        return
+    connection = pymysql.connect(
+        host=config.get('DEFAULT', 'DB_HOST'),
+        user=config.get('DEFAULT', 'DB_USERNAME'),
+        password=config.get('DEFAULT', 'DB_PASSWORD'),
+        database=config.get('DEFAULT', 'DB_DATABASE'))
+    try:
+        applied = migrate(connection)
+    finally:
+        connection.close()
+    print("applied %s" % (", ".join(str(v) for v in applied) if applied else "nothing, up to date"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Cache keys of plots, and the plotter of the configured rendering backend.
+
+Shared by the API and the pre-renderer (Prerender.py): both compute the same URL and content hash
+of a plot, so that the plots rendered by one are found in the plot cache by the other.
+
+Created on 19.10.2026
+@author: agent for Museum fuer Naturkunde Berlin
+"""
+from Query import Content_hash_query
+from Plotter import Plotter
+from Agg_plotter import Agg_plotter
+
+
+def plot_url(kind, ids):
+    """
+    URL of the plot request, without size and dpi.
+    All variants of a plot are derived from the same master image, cached under this URL.
+    The URL is relative, so that it does not depend on the host name used by the client.
+
+    @param kind: 'plot' or 'plotlayers'
+    @param ids: sorted list of int, database identifiers of audiograms
+    """
+    if kind == 'plot':
+        return "/api/v1/plot?id=%d" % ids[0]
+    return "/api/v1/plotlayers?ids=%s" % ",".join(str(id) for id in ids)
+
+
+def plot_version(ids, hashes):
+    """
+    Content hash of the data points of the audiograms, part of the plot cache key.
+
+    @param ids: sorted list of int, database identifiers of audiograms
+    @param hashes: dict of content hashes by id, see content_hashes
+    """
+    return ";".join("%d:%s" % (id, hashes.get(id, '')) for id in ids)
+
+
+def content_hashes(config, ids):
+    """Get the content hashes of the data points of audiograms, by audiogram id."""
+    hashes = {}
+    for h in Content_hash_query(config).run(ids):
+        hashes[h['audiogram_experiment_id']] = h['content_hash']
+    return hashes
+
+
+def get_plotter(config):
+    """
+    Return the plotter for the rendering backend set in the configuration.
+
+    PLOT_BACKEND = plotnine (default) | agg
+    """
+    backend = config.get('DEFAULT', 'PLOT_BACKEND', fallback='plotnine')
+    if backend == 'agg':
+        return Agg_plotter()
+    return Plotter()
@@ -0,0 +1,94 @@
+"""
+Declarative chart specification of audiogram plots, for rendering in the browser.
+
+The specification follows the Vega-Lite grammar (https://vega.github.io/vega-lite/)
+and matches the plots drawn by Plotter: same axes, scales, limits, palette and labels.
+Data points are converted to current SPL units and included inline.
+
+Created on 18.10.2026
+@author: agent for Museum fuer Naturkunde Berlin
+"""
+from Plotter import PALETTE, X_LABEL, X_LIMITS, X_LIMITS_LAYERS, Y_LIMITS, y_label, layer_label
+
+
+class Plot_spec:
+
+    schema = "https://vega.github.io/schema/vega-lite/v4.json"
+    """Vega-Lite version of the specification."""
+
+    def __init__(self):
+        # default labels
+        self.title = ""
+
+    def build(self, data_points_array):
+        """
+        Build the chart specification for one or more audiograms.
+
+        @param data_points_array: array of data to be plotted, one list of data points per layer,
+        as returned by Query.Data_query
+        @return: dict, Vega-Lite specification
+        """
+        layers = [points for points in data_points_array if len(points) > 0]
+        values = []
+        for i, points in enumerate(layers):
+            label = self._label(i)
+            for p in points:
+                values.append({
+                    'audiogram_experiment_id': p['audiogram_experiment_id'],
+                    'label': label,
+                    'testtone_frequency_in_khz': self._float(p['testtone_frequency_in_khz']),
+                    'sound_pressure_level_in_decibel': self._float(p['sound_pressure_level_in_decibel'])
+                })
+
+        unit = layers[0][0]['spl_reference_display_label'] if layers else None
+        # same x limits as Plotter.plot and Plotter.plotlayers
+        x_limits = X_LIMITS if len(layers) < 2 else X_LIMITS_LAYERS
+
+        encoding = {
+            'x': {
+                'field': 'testtone_frequency_in_khz',
+                'type': 'quantitative',
+                'title': X_LABEL,
+                'scale': {'type': 'log', 'domain': list(x_limits)}
+            },
+            'y': {
+                'field': 'sound_pressure_level_in_decibel',
+                'type': 'quantitative',
+                'title': y_label(unit),
+                'scale': {'type': 'linear', 'domain': list(Y_LIMITS)}
+            },
+            'order': {'field': 'testtone_frequency_in_khz', 'type': 'quantitative'},
+            'detail': {'field': 'label', 'type': 'nominal'}
+        }
+        if len(layers) < 2:
+            mark = {'type': 'line', 'point': {'filled': True, 'color': 'black'}, 'color': 'black', 'clip': True}
+        else:
+            mark = {'type': 'line', 'point': True, 'clip': True}
+            encoding['color'] = {
+                'field': 'label',
+                'type': 'nominal',
+                'scale': {
+                    'domain': [self._label(i) for i in range(len(layers))],
+                    'range': [PALETTE[i % len(PALETTE)] for i in range(len(layers))]
+                }
+            }
+
+        return {
+            '$schema': Plot_spec.schema,
+            'title': self.title,
+            'width': 400,
+            'height': 400,
+            'data': {'values': values},
+            'mark': mark,
+            'encoding': encoding
+        }
+
+    def _label(self, i):
+        """Layer label, same as in Plotter: A, B, C..."""
+        return layer_label(i)
+
+    def _float(self, value):
+        """Database values may be Decimal or NULL."""
+        if value is None:
+            return None
+        return float(value)
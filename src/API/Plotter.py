@@ -4,12 +4,71 @@ Wrapper around plotnine and pandas, for plotting ggplot-style graphics.
 Created on 27.11.2019
 @author: Alvaro Ortiz, Museum fuer Naturkunde Berlin
 """
+import numpy as np
 import pandas as pd
 from plotnine import *  # noqa: F403
 import json
 import os
 import hashlib
+import tempfile
 import logging
+from PIL import Image
+
+
+X_LABEL = "Frequency (kHz)"
+"""Label of the frequency axis."""
+X_LIMITS = (0.05, 200)
+"""Frequency axis limits in kHz, single audiograms."""
+X_LIMITS_LAYERS = (0.1, 200)
+"""Frequency axis limits in kHz, audiogram overlays."""
+Y_LIMITS = (-50, 160)
+"""Threshold axis limits in dB."""
+PALETTE = ("#000000", "#E69F00", "#56B4E9", "#009E73", "#F0E442", "#0072B2", "#D55E00", "#CC79A7")
+"""Colours of the audiogram layers (colour-blind safe palette with black)."""
+MASTER_SIZE = 5
+"""Width and height of the master image in inches."""
+MASTER_DPI = 300
+"""Resolution of the master image, all other variants are downscaled from it."""
+SIZES = {'full': 5, 'medium': 3, 'small': 2, 'thumbnail': 1}
+"""Image size presets, width and height in inches."""
+DPIS = (72, 100, 150, 300)
+"""Allowed image resolutions."""
+
+
+def y_label(unit):
+    """Label of the threshold axis for a SPL reference display label."""
+    if (unit):
+        return "Threshold (dB %s)" % (unit.replace("Î¼", "\u03BC"))
+    return "Threshold (dB unspecified unit)"
+
+
+def layer_label(i):
+    """Label of the i-th layer of an overlay: A, B, ..., Z, AA, AB, ..."""
+    label = ""
+    i += 1
+    while i > 0:
+        i, r = divmod(i - 1, 26)
+        label = chr(65 + r) + label
+    return label
+
+
+def columns_from_layers(data_points_array):
+    """
+    Convert a list of layers, each a list of data points (dicts), to column arrays.
+
+    The 'layer' column holds the number of the layer of each data point.
+    """
+    points = [p for layer in data_points_array for p in layer]
+    columns = {}
+    for key in (points[0].keys() if points else []):
+        values = [p.get(key) for p in points]
+        try:
+            columns[key] = np.array(values, dtype=float)
+        except (TypeError, ValueError):
+            columns[key] = np.array(values, dtype=object)
+    columns['layer'] = np.repeat(
+        np.arange(len(data_points_array)), [len(layer) for layer in data_points_array])
+    return columns
 
 
 class Plotter():
@@ -17,126 +76,227 @@ class Plotter():
         # default labels
         self.title = ""
 
-    def plot(self, data_points, url):
+    def plot(self, data_points, url, size=None, dpi=None, version=None):
         """
         Plot an audiogram and save it.
 
-        @param data_points: data to be plotted
+        @param data_points: data to be plotted, dict of column arrays, see Query.run_columns
         @param url: will be used for cache key. Only GET requests!
+        @param size: name of the image size, one of SIZES (default 'full')
+        @param dpi: image resolution, one of DPIS (default 300)
+        @param version: content hash of the data, see Query.Content_hash_query
         @return: path to image file
         """
 
-        # OS path
-        cache_key = self.cache_key(url)
-        filename = "audiogram_" + cache_key + ".png"
-        path = os.path.join("./static", filename)
-
-        # if file doesn't already exist, plot at save it
-        # if not os.path.exists(path):
-        if True:  # switch off caching
-            data_points_json = json.loads(str(data_points))
-            data_points_df = pd.DataFrame.from_dict(data_points_json)
-            x_label = "Frequency (kHz)"
-            unit = data_points_json[0]['spl_reference_display_label']
-            if (unit):
-                y_label = "Threshold (dB %s)" % (unit.replace("Î¼", "\u03BC"))
-            else:
-                y_label = "Threshold (dB unspecified unit)"
-            fig = (
-                ggplot(data_points_df)  # noqa: F405
-                + aes(  # noqa: F405 W503
-                    x='testtone_frequency_in_khz',
-                    y='sound_pressure_level_in_decibel')
-                + geom_line(color='black')  # noqa: F405 W503
-                + geom_point(color='black', fill='black')  # noqa: F405 W503
-                + labs(title=self.title, x=x_label, y=y_label)  # noqa: F405 E501 W503
-                + scale_x_log10(limits=(0.05, 200))  # noqa: F405 W503
-                + scale_y_continuous(limits=(-50, 160))  # noqa: F405 W503
-                + theme_bw()  # noqa: F405 W503
-            )
-
-            fig.save(
-                filename=path,
-                height=5, width=5, units="in", dpi=300
-            )
+        # the data is part of the cache key, so that a cached plot is never outdated
+        path = self._path(self.cache_key(url + self._version(data_points, version)))
+
+        # if file doesn't already exist, plot and save it
+        if not os.path.exists(path):
+            self._save_atomic(lambda tmp: self._draw_single(data_points, tmp), path)
 
         # URL of image src
-        return "/".join(["/static", filename])
+        return self._variant(path, size, dpi)
 
     def test_panda(self, data_points_array):
         return self._convert_points_array_to_panda(data_points_array)
 
-    def plotlayers(self, data_points_array, url):
+    def plotlayers(self, data_points_array, url, size=None, dpi=None, version=None):
         """
         Plot an audiogram and save it.
 
-        @param data_points: array of data to be plotted
+        @param data_points_array: data to be plotted, dict of column arrays, see Query.run_columns.
+        Each audiogram (audiogram_experiment_id) is a layer, layers are ordered by id.
         @param url: will be used for cache key. Only GET requests!
+        @param size: name of the image size, one of SIZES (default 'full')
+        @param dpi: image resolution, one of DPIS (default 300)
+        @param version: content hash of the data, see Query.Content_hash_query
         @return: path to image file
         """
-        # OS path
-        cache_key = self.cache_key(url)
-        filename = "audiogram_" + cache_key + ".png"
-        path = os.path.join("./static", filename)
+        # the data is part of the cache key, so that a cached plot is never outdated
+        path = self._path(self.cache_key(url + self._version(data_points_array, version)))
 
         # if file doesn't already exist, plot and save it
         if not os.path.exists(path):
-            data_points_df = self._convert_points_array_to_panda(
-                data_points_array)
-            x_label = "Frequency (kHz)"
-            unit = data_points_df['spl_reference_display_label'][0]
-            if (unit):
-                y_label = "Threshold (dB %s)" % (unit.replace("Î¼", "\u03BC"))
-            else:
-                y_label = "Threshold (dB unspecified unit)"
-
-            fig = (
-                # The palette with black:
-                ggplot(data_points_df)  # noqa: F405
-                + aes(  # noqa: F405 W503
-                    x='testtone_frequency_in_khz',
-                    y='sound_pressure_level_in_decibel',
-                    color='label')
-                + geom_line()  # noqa: F405 W503
-                + geom_point()  # noqa: F405 W503
-                + scale_colour_manual(values=(
-                    "#000000", "#E69F00", "#56B4E9", "#009E73", "#F0E442", "#0072B2", "#D55E00", "#CC79A7",
-                    "#000000", "#E69F00", "#56B4E9", "#009E73", "#F0E442", "#0072B2", "#D55E00", "#CC79A7",
-                    "#000000", "#E69F00", "#56B4E9", "#009E73", "#F0E442", "#0072B2", "#D55E00", "#CC79A7",
-                    "#000000", "#E69F00", "#56B4E9", "#009E73", "#F0E442", "#0072B2", "#D55E00", "#CC79A7",
-                    "#000000", "#E69F00", "#56B4E9", "#009E73", "#F0E442", "#0072B2", "#D55E00", "#CC79A7",
-                    "#000000", "#E69F00", "#56B4E9", "#009E73", "#F0E442", "#0072B2", "#D55E00", "#CC79A7",
-                    "#000000", "#E69F00", "#56B4E9", "#009E73", "#F0E442", "#0072B2", "#D55E00", "#CC79A7",
-                    "#000000", "#E69F00", "#56B4E9", "#009E73", "#F0E442", "#0072B2", "#D55E00", "#CC79A7",
-                    "#000000", "#E69F00", "#56B4E9", "#009E73", "#F0E442", "#0072B2", "#D55E00", "#CC79A7",
-                    "#000000", "#E69F00", "#56B4E9", "#009E73", "#F0E442", "#0072B2", "#D55E00", "#CC79A7"
-                ))
-                + theme_bw()  # noqa: F405 W503
-                + labs(title=self.title, x=x_label, y=y_label)  # noqa: F405 E501 W503
-                + scale_x_log10(limits=(0.1, 200))  # noqa: F405 W503
-                + scale_y_continuous(limits=(-50, 160))  # noqa: F405 W503
-            )
-
-            fig.save(
-                filename=path,
-                height=5, width=5, units="in", dpi=300
-            )
+            self._save_atomic(lambda tmp: self._draw_layers(data_points_array, tmp), path)
 
         # URL of image src
-        return "/".join(["/static", filename])
+        return self._variant(path, size, dpi)
+
+    def cached(self, url, version, size=None, dpi=None):
+        """
+        Return the URL of a plot, if it has already been drawn.
+
+        Missing variants of a cached master image are derived on the spot, which is fast.
+
+        @param url: cache key, as passed to plot or plotlayers
+        @param version: content hash of the data, as passed to plot or plotlayers
+        @param size: name of the image size, one of SIZES (default 'full')
+        @param dpi: image resolution, one of DPIS (default 300)
+        @return: URL of the image, or None if it has to be plotted
+        """
+        path = self._path(self.cache_key(url + version))
+        if not os.path.exists(path):
+            return None
+        return self._variant(path, size, dpi)
+
+    def _version(self, data, version):
+        """The content hash, or else the data itself, identifies the data in the cache key."""
+        if version is not None:
+            return version
+        return str({k: v.tolist() for k, v in sorted(data.items())})
+
+    def _path(self, cache_key, size=None, dpi=None):
+        """OS path of the master image, or of one of its variants."""
+        filename = "audiogram_" + cache_key
+        if not self._is_master(size, dpi):
+            filename += "_%s_%d" % (size or 'full', dpi or MASTER_DPI)
+        return os.path.join("./static", filename + ".png")
+
+    def _is_master(self, size, dpi):
+        return (size or 'full') == 'full' and (dpi or MASTER_DPI) == MASTER_DPI
+
+    def _variant(self, master_path, size=None, dpi=None):
+        """
+        Return the URL of an image variant, derived by downscaling the master image.
+
+        Variants are cached like the master image, under their own key.
+
+        @param master_path: OS path of the master image, rendered at full size and MASTER_DPI
+        @param size: name of the image size, one of SIZES
+        @param dpi: image resolution, one of DPIS
+        @return: URL of the image variant
+        """
+        if self._is_master(size, dpi):
+            path = master_path
+        else:
+            size = size or 'full'
+            dpi = dpi or MASTER_DPI
+            if size not in SIZES or dpi not in DPIS:
+                raise Exception("Invalid size or dpi: %s %s" % (size, dpi))
+            cache_key = os.path.basename(master_path)[len("audiogram_"):-len(".png")]
+            path = self._path(cache_key, size, dpi)
+            if not os.path.exists(path):
+                self._save_atomic(lambda tmp: self._downscale(master_path, tmp, SIZES[size], dpi), path)
+        return "/".join(["/static", os.path.basename(path)])
+
+    def _downscale(self, master_path, path, size, dpi):
+        """Resize the master image to size inches at dpi."""
+        with Image.open(master_path) as master:
+            scale = size * dpi / (MASTER_SIZE * MASTER_DPI)
+            width = max(1, int(round(master.width * scale)))
+            height = max(1, int(round(master.height * scale)))
+            master.resize((width, height), Image.LANCZOS).save(path, dpi=(dpi, dpi))
+
+    def _save_atomic(self, draw, path):
+        """
+        Draw to a temporary file, then move it in place.
+
+        Cached images are never seen half-written, even when plotted concurrently:
+        each write has its own temporary file, the last one moved in place wins.
+        @param draw: function saving the image to the path it is given
+        @param path: OS path of the image file
+        """
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path)[:-len(".png")] + ".",
+                                   suffix=".tmp.png")
+        os.close(fd)
+        try:
+            draw(tmp)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def _draw_single(self, data_points, path):
+        """
+        Draw a single audiogram with plotnine and save it.
+
+        @param data_points: dict of column arrays, as returned by Query.Data_query.run_columns
+        @param path: OS path of the image file
+        """
+        data_points_df = self._columns_to_panda(data_points)
+        y_title = y_label(data_points['spl_reference_display_label'][0])
+        fig = (
+            ggplot(data_points_df)  # noqa: F405
+            + aes(  # noqa: F405 W503
+                x='testtone_frequency_in_khz',
+                y='sound_pressure_level_in_decibel')
+            + geom_line(color='black')  # noqa: F405 W503
+            + geom_point(color='black', fill='black')  # noqa: F405 W503
+            + labs(title=self.title, x=X_LABEL, y=y_title)  # noqa: F405 E501 W503
+            + scale_x_log10(limits=X_LIMITS)  # noqa: F405 W503
+            + scale_y_continuous(limits=Y_LIMITS)  # noqa: F405 W503
+            + theme_bw()  # noqa: F405 W503
+        )
+
+        fig.save(
+            filename=path,
+            height=MASTER_SIZE, width=MASTER_SIZE, units="in", dpi=MASTER_DPI
+        )
+
+    def _draw_layers(self, data_points_array, path):
+        """
+        Draw audiogram overlays with plotnine and save them.
+
+        @param data_points_array: dict of column arrays, as returned by Query.Data_multiple_query.run_columns
+        @param path: OS path of the image file
+        """
+        data_points_df = self._columns_to_panda(data_points_array, layers=True)
+        y_title = y_label(data_points_df['spl_reference_display_label'][0])
+        colours = [PALETTE[i % len(PALETTE)] for i in range(len(data_points_df['label'].cat.categories))]
+
+        fig = (
+            # The palette with black:
+            ggplot(data_points_df)  # noqa: F405
+            + aes(  # noqa: F405 W503
+                x='testtone_frequency_in_khz',
+                y='sound_pressure_level_in_decibel',
+                color='label')
+            + geom_line()  # noqa: F405 W503
+            + geom_point()  # noqa: F405 W503
+            + scale_colour_manual(values=colours)  # noqa: F405 W503
+            + theme_bw()  # noqa: F405 W503
+            + labs(title=self.title, x=X_LABEL, y=y_title)  # noqa: F405 E501 W503
+            + scale_x_log10(limits=X_LIMITS_LAYERS)  # noqa: F405 W503
+            + scale_y_continuous(limits=Y_LIMITS)  # noqa: F405 W503
+        )
+
+        fig.save(
+            filename=path,
+            height=MASTER_SIZE, width=MASTER_SIZE, units="in", dpi=MASTER_DPI
+        )
 
     def _convert_points_array_to_panda(self, data_points_array):
+        """
+        Convert audiogram overlays in json format to a data frame.
+
+        @param data_points_array: json string, one list of data points per layer
+        """
         data_points_json = json.loads(str(data_points_array))
-        i = 65
-        df = []
-        for point in data_points_json:
-            for entry in point:
-                entry['label'] = chr(i)
-                df.append(entry)
-            i += 1
-        panda = pd.DataFrame.from_dict(df)
+        return self._columns_to_panda(columns_from_layers(data_points_json), layers=True)
+
+    def _columns_to_panda(self, columns, layers=False):
+        """
+        Build a data frame from column arrays.
+
+        @param columns: dict of column arrays, see Query.run_columns
+        @param layers: add a categorical 'label' column, one label per layer.
+        Layers are given by the 'layer' column, or else one layer per audiogram, in order of id.
+        """
+        panda = pd.DataFrame(columns)
+        if layers:
+            layer = self._layers(columns)
+            labels = [layer_label(i) for i in range(layer.max() + 1 if len(layer) else 0)]
+            panda['label'] = pd.Categorical.from_codes(layer, categories=labels)
         return panda
 
+    def _layers(self, columns):
+        """Number of the layer of each data point, see _columns_to_panda."""
+        if 'layer' in columns:
+            return columns['layer']
+        ids, layer = np.unique(columns['audiogram_experiment_id'], return_inverse=True)
+        return layer.reshape(-1)
+
     def cache_key(self, url):
         e_url = url.encode('utf-8')
         hash_url = hashlib.blake2b(e_url, digest_size=4)
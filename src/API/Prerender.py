@@ -0,0 +1,128 @@
+"""
+Pre-render the plots of all audiograms, so that visitors find them in the plot cache.
+
+Run after a data update, e.g. in the API container:
+    cd /src/API
+    python Prerender.py --processes 4
+    python Prerender.py --size thumbnail --dpi 100 --overlays overlays.txt
+
+Plots are cached by content hash of their data points (see Plot_cache.plot_version),
+plots that are up-to-date are skipped. An interrupted run is resumed by running it again.
+
+Created on 18.10.2026
+@author: agent for Museum fuer Naturkunde Berlin
+"""
+import argparse
+import configparser
+import logging
+import multiprocessing
+import time
+from Query import All_experiments_query, Data_multiple_query
+from Plotter import SIZES, DPIS
+from Plot_cache import plot_url, plot_version, content_hashes, get_plotter
+
+
+CONFIG_PATH = "/src/API/.env"
+"""Default path of the API configuration file."""
+_config = None
+"""API configuration, read in the main process and in each rendering process, see load_config."""
+
+
+def load_config(path):
+    """Read the API configuration file."""
+    global _config
+    _config = configparser.ConfigParser()
+    _config.read(path)
+
+
+def render(job):
+    """
+    Render a plot, unless it is already cached.
+
+    @param job: tuple (kind, ids, version, size, dpi), see jobs
+    @return: tuple (job, 'rendered' | 'skipped' | 'empty' | error message)
+    """
+    kind, ids, version, size, dpi = job
+    try:
+        url = plot_url(kind, ids)
+        plotter = get_plotter(_config)
+        if plotter.cached(url, version, size, dpi) is not None:
+            return job, 'skipped'
+        data_points = Data_multiple_query(_config).run_columns(ids)
+        if set(data_points['audiogram_experiment_id'].tolist()) != set(ids):
+            return job, 'empty'
+        if kind == 'plot':
+            plotter.plot(data_points, url, size, dpi, version)
+        else:
+            plotter.plotlayers(data_points, url, size, dpi, version)
+        return job, 'rendered'
+    except Exception as e:
+        return job, str(e)
+
+
+def jobs(overlays=None, size=None, dpi=None):
+    """
+    List the plots to render: one per audiogram, and the configured overlays.
+
+    @param overlays: list of lists of audiogram ids
+    @return: list of tuples (kind, ids, version, size, dpi)
+    """
+    ids = sorted(e['id'] for e in All_experiments_query(_config).run())
+    overlays = [sorted(o) for o in (overlays or [])]
+    all_ids = sorted(set(ids).union(*overlays))
+    if len(all_ids) == 0:
+        return []
+    # content hashes of all audiograms, in one query
+    hashes = content_hashes(_config, all_ids)
+    resp = [('plot', [id], plot_version([id], hashes), size, dpi) for id in ids]
+    resp += [('plotlayers', o, plot_version(o, hashes), size, dpi) for o in overlays]
+    return resp
+
+
+def read_overlays(path):
+    """Read overlays from a text file, one comma-separated list of audiogram ids per line."""
+    overlays = []
+    with open(path) as f:
+        for line in f:
+            line = line.split('#')[0].strip()
+            if line:
+                overlays.append([int(id) for id in line.split(',')])
+    return overlays
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-render the plots of all audiograms.")
+    parser.add_argument('--processes', type=int, default=multiprocessing.cpu_count(),
+                        help="number of rendering processes (default: number of CPUs)")
+    parser.add_argument('--overlays', help="file with overlays to render, one comma-separated list of ids per line")
+    parser.add_argument('--size', choices=sorted(SIZES), help="image size preset (default: full)")
+    parser.add_argument('--dpi', type=int, choices=DPIS, help="image resolution (default: 300)")
+    parser.add_argument('--config', default=CONFIG_PATH, help="path to the API configuration file")
+    args = parser.parse_args()
+
+    load_config(args.config)
+    overlays = read_overlays(args.overlays) if args.overlays else []
+    todo = jobs(overlays, args.size, args.dpi)
+    print("%d plots, %d processes" % (len(todo), args.processes))
+
+    counts = {'rendered': 0, 'skipped': 0, 'empty': 0, 'failed': 0}
+    start = time.perf_counter()
+    with multiprocessing.Pool(args.processes, load_config, (args.config,)) as pool:
+        for i, (job, result) in enumerate(pool.imap_unordered(render, todo), 1):
+            if result in counts:
+                counts[result] += 1
+            else:
+                counts['failed'] += 1
+                logging.warning("%s %s failed: %s" % (job[0], job[1], result))
+            if i % 100 == 0 or i == len(todo):
+                elapsed = time.perf_counter() - start
+                print("%d/%d done, %.1f plots/s (%s)" % (
+                    i, len(todo), i / elapsed,
+                    ", ".join("%s %d" % c for c in counts.items())))
+    elapsed = time.perf_counter() - start
+    print("%d plots rendered in %.1f s, %.2f rendered plots/s" % (
+        counts['rendered'], elapsed, counts['rendered'] / elapsed if elapsed > 0 else 0))
+
+
+if __name__ == "__main__":
+    main()
@@ -12,8 +12,62 @@ Created on 15.01.2020
 
 import abc
 import pymysql
+import pymysql.cursors
 import logging
+import threading
+import time
+import collections
+import datetime
+import numpy as np
+from decimal import Decimal
 from SPL_converter import SPL_converter
+import Metrics
+
+
+class Timed_cursor(pymysql.cursors.Cursor):
+    """Cursor that keeps the statements it executed, with bound parameters, duration and row count."""
+
+    def execute(self, query, args=None):
+        start = time.perf_counter()
+        result = super().execute(query, args)
+        # _executed is the SQL as sent to the server, with the parameters escaped and bound
+        self.connection.statements.append({
+            'sql': self._executed if isinstance(self._executed, str) else self._executed.decode('utf-8', 'replace'),
+            'duration': time.perf_counter() - start,
+            'rows': self.rowcount
+        })
+        return result
+
+
+class Slow_query_log:
+    """
+    The last slow queries, in a bounded ring buffer shared by all queries of the process.
+
+    See Query._timed_run, and the admin endpoint slow_queries in API.py.
+    """
+
+    _records = collections.deque(maxlen=100)
+    _lock = threading.Lock()
+
+    @classmethod
+    def record(cls, entry, size=100):
+        """Add an entry, dropping the oldest ones when there are more than size."""
+        with cls._lock:
+            if cls._records.maxlen != size:
+                cls._records = collections.deque(cls._records, maxlen=size)
+            cls._records.append(entry)
+
+    @classmethod
+    def entries(cls, limit=None):
+        """Return the entries, newest first."""
+        with cls._lock:
+            entries = list(reversed(cls._records))
+        return entries[:limit] if limit else entries
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._records.clear()
 
 
 class Query(abc.ABC):
@@ -27,22 +81,95 @@ class Query(abc.ABC):
         self.password = config.get('DEFAULT', 'DB_PASSWORD')
         self.username = config.get('DEFAULT', 'DB_USERNAME')
         self.database = config.get('DEFAULT', 'DB_DATABASE')
+        # slow query log: threshold in seconds, EXPLAIN of slow statements, number of entries kept
+        self.slow_query_seconds = config.getfloat('DEFAULT', 'SLOW_QUERY_SECONDS', fallback=1.0)
+        self.slow_query_explain = config.getboolean('DEFAULT', 'SLOW_QUERY_EXPLAIN', fallback=False)
+        self.slow_query_log_size = config.getint('DEFAULT', 'SLOW_QUERY_LOG_SIZE', fallback=100)
 
     def run(self, param=None):
         self.connection = self._get_connection()
-        results = self._run(param)
-        return(self._jsonize(results))
+        results = self._timed_run(param)
+        with Metrics.timed('jsonize'):
+            return(self.jsonize(results))
+
+    def run_columns(self, param=None):
+        """
+        Run the query and return the results by column, as NumPy arrays.
+
+        Used when handing data over to numerical code, e.g. Plotter:
+        no dict is built per row.
+        """
+        self.connection = self._get_connection()
+        results = self._timed_run(param)
+        with Metrics.timed('columnize'):
+            return(self.columnize(results))
 
     @abc.abstractmethod
     def _run(self, param=None):
         pass
 
-    def _get_connection(self):
-        """Open a database connection."""
-        return pymysql.connect(
-            self.host, self.username, self.password, self.database)
+    def _timed_run(self, param=None):
+        """Run the query, recording execution time and row count per Query class, see Metrics."""
+        name = type(self).__name__
+        start = time.perf_counter()
+        try:
+            results = self._run(param)
+        except Exception:
+            Metrics.db_query_errors.inc(query=name)
+            raise
+        duration = time.perf_counter() - start
+        Metrics.add_timing('db_execute', duration)
+        Metrics.db_query_duration.observe(duration, query=name)
+        Metrics.db_query_rows.observe(len(results['results']), query=name)
+        if duration > self.slow_query_seconds:
+            self._log_slow_query(name, duration, len(results['results']))
+        return results
+
+    def _log_slow_query(self, name, duration, rows):
+        """Record a slow query in the Slow_query_log, with its statements and optionally their EXPLAIN plan."""
+        statements = [dict(s) for s in getattr(self.connection, 'statements', [])]
+        if self.slow_query_explain:
+            for s in statements:
+                s['explain'] = self._explain(s['sql'])
+        Metrics.db_slow_queries.inc(query=name)
+        Slow_query_log.record({
+            'time': datetime.datetime.now().isoformat(timespec='seconds'),
+            'query': name,
+            'duration': duration,
+            'rows': rows,
+            'statements': statements
+        }, self.slow_query_log_size)
+
+    def _explain(self, sql):
+        """Return the EXPLAIN plan of a select statement as a list of dicts, or the error message."""
+        if not sql.lstrip().lower().startswith('select'):
+            return None
+        try:
+            connection = self._get_connection()
+            try:
+                with connection.cursor() as cursor:
+                    # not recorded as a statement of the query
+                    pymysql.cursors.Cursor.execute(cursor, "explain " + sql)
+                    headers = [x[0] for x in cursor.description]
+                    return [dict(zip(headers, row)) for row in cursor.fetchall()]
+            finally:
+                connection.close()
+        except Exception as e:
+            return str(e)
 
-    def _jsonize(self, results):
+    def _get_connection(self):
+        """Open a database connection, statements are recorded for the slow query log."""
+        start = time.perf_counter()
+        connection = pymysql.connect(
+            self.host, self.username, self.password, self.database, cursorclass=Timed_cursor)
+        connection.statements = []
+        duration = time.perf_counter() - start
+        Metrics.db_connections.inc()
+        Metrics.db_connect_duration.observe(duration)
+        Metrics.add_timing('db_connect', duration)
+        return connection
+
+    def jsonize(self, results):
         """Convert result object to json."""
         json_data = []
         for result in results['results']:
@@ -50,6 +177,26 @@ class Query(abc.ABC):
             json_data.append(dict(zip(results['headers'], result)))
         return json_data
 
+    def columnize(self, results):
+        """Convert result object to a dict of NumPy arrays, one per column."""
+        columns = list(zip(*results['results']))
+        if len(columns) == 0:
+            columns = [()] * len(results['headers'])
+        return {h: self._column_array(c) for h, c in zip(results['headers'], columns)}
+
+    def _column_array(self, values):
+        """
+        Convert the values of a column to a NumPy array.
+
+        Integer columns become int arrays, numeric columns (DECIMAL, FLOAT, possibly NULL)
+        become float arrays with NaN for NULL, other columns become object arrays.
+        """
+        if all(type(v) is int for v in values):
+            return np.array(values, dtype=np.int64)
+        if all(v is None or isinstance(v, (int, float, Decimal)) for v in values):
+            return np.array([np.nan if v is None else float(v) for v in values], dtype=float)
+        return np.array(values, dtype=object)
+
 
 class SPLUnits_query(Query):
     """Get a list of the SPL units of a list of audiograms"""
@@ -74,6 +221,74 @@ class SPLUnits_query(Query):
         return {'headers': row_headers, 'results': all_results}
 
 
+class Content_hash_query(Query):
+    """
+    Get a hash of the data points of a list of audiograms.
+
+    The hash changes whenever a data point of the audiogram is added, removed or edited,
+    or the SPL reference of a data point is edited (conversion factors, display label),
+    and is used to find out if a cached plot is up-to-date.
+
+    @param list of ids
+    """
+
+    select = """
+                select
+                   audiogram_experiment_id,
+                   concat(count(*), '-', sum(crc32(concat_ws(',',
+                      point.id,
+                      testtone_frequency_in_khz,
+                      sound_pressure_level_in_decibel,
+                      sound_pressure_level_reference_id,
+                      sound_pressure_level_reference_method,
+                      testtone_duration_in_millisecond,
+                      spl.spl_reference_value,
+                      spl.spl_reference_unit,
+                      spl.conversion_factor_airborne_sound_in_decibel,
+                      spl.conversion_factor_waterborne_sound_in_decibel,
+                      spl.spl_reference_display_label)))) as content_hash
+                from
+                   audiogram_data_point point
+                left join
+                   sound_pressure_level_reference spl
+                on
+                   spl.id=point.sound_pressure_level_reference_id
+                """
+
+    def _run(self, param=None):
+        with self.connection as cursor:
+            cursor.execute(
+                self.select + """
+                where
+                   audiogram_experiment_id in %(list)s
+                group by
+                   audiogram_experiment_id
+            """,
+                {'list': param})
+            row_headers = [x[0] for x in cursor.description]
+            all_results = cursor.fetchall()
+        return {'headers': row_headers, 'results': all_results}
+
+
+class All_content_hashes_query(Content_hash_query):
+    """
+    Get the hash of the data points of every audiogram.
+
+    Used to update the similarity index: only audiograms with a new hash are interpolated again.
+    """
+
+    def _run(self, param=None):
+        with self.connection as cursor:
+            cursor.execute(
+                self.select + """
+                group by
+                   audiogram_experiment_id
+            """)
+            row_headers = [x[0] for x in cursor.description]
+            all_results = cursor.fetchall()
+        return {'headers': row_headers, 'results': all_results}
+
+
 class All_experiments_query(Query):
     """List all experiment ids."""
 
@@ -91,6 +306,129 @@ class All_experiments_query(Query):
         return {'headers': row_headers, 'results': all_results}
 
 
+class Experiment_taxa_query(Query):
+    """
+    Get the measurement type and the taxa of the animals of every experiment.
+
+    One row per experiment and taxon, used to restrict similarity searches and aggregates by clade.
+    """
+
+    def _run(self, param=None):
+        with self.connection as cursor:
+            cursor.execute(
+                """
+            select distinct
+                exp.id, exp.measurement_type, i.taxon_id
+            from
+                audiogram_experiment exp
+                join test_animal as t on t.audiogram_experiment_id=exp.id
+                join individual_animal as i on i.id=t.individual_animal_id
+            """)
+            row_headers = [x[0] for x in cursor.description]
+            all_results = cursor.fetchall()
+        return {'headers': row_headers, 'results': all_results}
+
+
+class Ping_query(Query):
+    """Check that the database answers, used by the readiness check."""
+
+    def _run(self, param=None):
+        with self.connection as cursor:
+            cursor.execute("select 1 as ok")
+            row_headers = [x[0] for x in cursor.description]
+            all_results = cursor.fetchall()
+        return {'headers': row_headers, 'results': all_results}
+
+
+class Index_query(Query):
+    """List the columns of all indexes in the database, used to check that the migrations are applied."""
+
+    def _run(self, param=None):
+        with self.connection as cursor:
+            cursor.execute(
+                """
+                select
+                   table_name, index_name, column_name
+                from
+                   information_schema.statistics
+                where
+                   table_schema = database()
+                order by
+                   table_name, index_name, seq_in_index
+                """
+            )
+            row_headers = [x[0].lower() for x in cursor.description]
+            all_results = cursor.fetchall()
+        return {'headers': row_headers, 'results': all_results}
+
+
+class Data_version_query(Query):
+    """
+    Get a version of the data that changes whenever taxa, publications, facilities, experiments, animals,
+    data points or SPL references change.
+
+    Used to rebuild what the API keeps in memory, e.g. the search index.
+    Reads the data points, the API calls it at most every DATA_VERSION_TTL seconds.
+    """
+
+    def _run(self, param=None):
+        with self.connection as cursor:
+            cursor.execute(
+                """
+                select concat_ws(';',
+                   (select concat(count(*), '-', coalesce(sum(crc32(concat_ws(',',
+                       ott_id, parent, `rank`, unique_name, vernacular_name_english, lft, rgt))), 0)) from taxon),
+                   (select concat(count(*), '-', coalesce(sum(crc32(concat_ws(',',
+                       id, citation_short))), 0)) from publication),
+                   (select concat(count(*), '-', coalesce(sum(crc32(concat_ws(',',
+                       id, name))), 0)) from facility),
+                   (select concat(count(*), '-', coalesce(sum(crc32(concat_ws(',',
+                       id, medium, measurement_method_id, measurement_type))), 0)) from audiogram_experiment),
+                   (select concat(count(*), '-', coalesce(sum(crc32(concat_ws(',',
+                       id, audiogram_experiment_id, individual_animal_id))), 0)) from test_animal),
+                   (select concat(count(*), '-', coalesce(sum(crc32(concat_ws(',',
+                       id, taxon_id))), 0)) from individual_animal),
+                   (select concat(count(*), '-', coalesce(sum(crc32(concat_ws(',',
+                       id, audiogram_experiment_id, testtone_frequency_in_khz, sound_pressure_level_in_decibel,
+                       sound_pressure_level_reference_id))), 0)) from audiogram_data_point),
+                   (select concat(count(*), '-', coalesce(sum(crc32(concat_ws(',',
+                       id, spl_reference_value, spl_reference_unit, conversion_factor_airborne_sound_in_decibel,
+                       conversion_factor_waterborne_sound_in_decibel, spl_reference_display_label))), 0))
+                       from sound_pressure_level_reference)
+                ) as version
+                """
+            )
+            row_headers = [x[0] for x in cursor.description]
+            all_results = cursor.fetchall()
+        return {'headers': row_headers, 'results': all_results}
+
+
+class Search_entries_query(Query):
+    """Get the names indexed by the text search, see Search_index: taxa, English names, publications, facilities."""
+
+    def _run(self, param=None):
+        with self.connection as cursor:
+            cursor.execute(
+                """
+                select 'taxon' as kind, ott_id as id, unique_name as text, `rank` as detail
+                from taxon
+                union all
+                select 'vernacular', ott_id, vernacular_name_english, unique_name
+                from taxon
+                where vernacular_name_english is not null and vernacular_name_english != ''
+                union all
+                select 'publication', id, citation_short, null
+                from publication
+                union all
+                select 'facility', id, name, null
+                from facility
+                """
+            )
+            row_headers = [x[0] for x in cursor.description]
+            all_results = cursor.fetchall()
+        return {'headers': row_headers, 'results': all_results}
+
+
 class List_query(Query):
     """
     Get a complete list of short audiogram descriptions.
@@ -666,10 +1004,90 @@ class Browse_query(Query):
     @param dict - order_by and/or filter
     """
 
+    FILTERS = [
+        # experiments selected in memory, e.g. by their metrics, not a request parameter
+        ('ids', "exp.id in %(ids)s", True, None),
+        ('species', "taxon.ott_id in %(species)s", True, None),
+        ('taxon', "taxon.ott_id in %(taxon)s", True, None),
+        # expanded to the sub-methods before the query, see _expand_methods
+        ('method', "exp.measurement_method_id in %(method)s", True, None),
+        ('publication', "audiogram_publication.publication_id in %(publication)s", True, None),
+        ('facility', "facility.id in %(facility)s", True, 'facility'),
+        ('year_from', "exp.year_of_experiment_start >= %(year_from)s", False, None),
+        ('year_to', "exp.year_of_experiment_end <= %(year_to)s", False, None),
+        ('medium', "exp.medium in %(medium)s", True, None),
+        ('sex', "i.sex in %(sex)s", True, None),
+        ('liberty', "t.liberty_status in %(liberty)s", True, None),
+        ('lifestage', "t.life_stage in %(lifestage)s", True, None),
+        ('captivity_from', "t.captivity_duration_in_month >= %(captivity_from)s", False, None),
+        ('captivity_to', "t.captivity_duration_in_month <= %(captivity_to)s", False, None),
+        ('sedated', "exp.sedated in %(sedated)s", True, None),
+        ('age_from', "t.age_min_in_month >= %(age_from)s", False, None),
+        ('age_to', "t.age_max_in_month <= %(age_to)s", False, None),
+        ('position', "exp.position_of_animal in %(position)s", True, None),
+        ('distance_from', "exp.distance_to_sound_source_in_meter >= %(distance_from)s", False, None),
+        ('distance_to', "exp.distance_to_sound_source_in_meter <= %(distance_to)s", False, None),
+        ('threshold_from', "exp.threshold_determination_method >= %(threshold_from)s", False, None),
+        ('threshold_to', "exp.threshold_determination_method <= %(threshold_to)s", False, None),
+        ('tone', "exp.testtone_form_method_id in %(tone)s", True, None),
+        ('staircase', "exp.testtone_presentation_staircase in %(staircase)s", True, None),
+        ('form', "exp.testtone_presentation_sound_form in %(form)s", True, None),
+        ('constants', "exp.testtone_presentation_method_constants in %(constants)s", True, None),
+        ('measurement_type', "exp.measurement_type in %(measurement_type)s", True, None)
+    ]
+    """
+    Filters: (parameter, condition, comma-separated list or single value, table joined for the condition).
+
+    A filter is applied if the parameter has a value, the value is passed to the condition as %(parameter)s.
+    """
+
+    JOINS = {
+        'facility': "left join facility on facility.id=exp.facility_id",
+        'tone': "left join method tone on tone.id=exp.testtone_form_method_id"
+    }
+    """Joins of the tables that are only needed by filters or facets, by name."""
+
+    ORDER_BY = ['citation_short', 'measurement_method', 'vernacular_name_english', 'species_name']
+    """Columns the results can be ordered by, other values order by species_name."""
+
     def _str2tuple(self, val):
         return tuple(val.split(','))
 
     def _run(self, param=None):
+        with self.connection as cursor:
+            methods = None
+            if self._check_key_in_param(param, 'method'):
+                methods = self._expand_methods(cursor, self._str2tuple(param['method']))
+            query, values = self.build(param, methods)
+
+            # Execute the query, pass the GET parameter values,
+            # relying on the database API to do proper escaping
+            cursor.execute(query, values)
+            row_headers = [x[0] for x in cursor.description]
+            all_results = cursor.fetchall()
+
+        return {'headers': row_headers, 'results': all_results}
+
+    def _expand_methods(self, cursor, methods):
+        """
+        Add the sub-methods to a list of method ids.
+
+        A parent method, e.g. behavioral, matches the experiments of its sub-methods.
+        Expanding the list before the query lets the filter use the index on the experiment's method.
+        """
+        cursor.execute("select id from method where parent_method_id in %(method)s", {'method': methods})
+        return tuple(methods) + tuple(str(row[0]) for row in cursor.fetchall())
+
+    def build(self, param=None, methods=None):
+        """
+        Build the SQL statement for the given parameters, without running it.
+
+        Only the tables needed by the filters that are set are joined.
+
+        @param methods: the method filter with its sub-methods, see _expand_methods, default: the method filter
+        @return: tuple (query, values), values are passed to cursor.execute for escaping
+        """
+        joins, conditions, values = self._filters(param, methods)
         query = """
             select
                 exp.id,
@@ -677,228 +1095,145 @@ class Browse_query(Query):
                 vernacular_name_english,
                 unique_name as species_name,
                 concat(m2.denomination, ": ", m1.denomination) as measurement_method
-            from
-                audiogram_experiment exp
-                left join method m1 on m1.id=exp.measurement_method_id
-                left join method m2 on m2.id=m1.parent_method_id,
-                audiogram_publication,
-                publication,
-                test_animal as t,
-                individual_animal as i,
-                taxon, facility
-            where
-                audiogram_publication.audiogram_experiment_id=exp.id
-                and publication.id=audiogram_publication.publication_id
-                and t.audiogram_experiment_id=exp.id
-                and i.id=t.individual_animal_id
-                and taxon.ott_id=i.taxon_id
                 """
-
-        ### add subquery for each parameter that has a value ###
-
-        species = None
-        if self._check_key_in_param(param, 'species'):
-            species = self._str2tuple(param['species'])
-            query += "and taxon.ott_id in %(species)s\n"
-
-        taxon = None
-        if self._check_key_in_param(param, 'taxon'):
-            taxon = self._str2tuple(param['taxon'])
-            query += "and taxon.ott_id in %(taxon)s\n"
-
-        method = None
-        if self._check_key_in_param(param, 'method'):
-            method = self._str2tuple(param['method'])
-            query += "and (exp.measurement_method_id in %(method)s or m2.id in %(method)s)\n"
-
-        publication = None
-        if self._check_key_in_param(param, 'publication'):
-            publication = self._str2tuple(param['publication'])
-            query += "and audiogram_publication.publication_id in %(publication)s\n"
-
-        facility = None
-        if self._check_key_in_param(param, 'facility'):
-            facility = self._str2tuple(param['facility'])
-            query += "and exp.facility_id = facility.id and facility.id in %(facility)s\n"
-
-        year_from = None
-        if self._check_key_in_param(param, 'year_from'):
-            year_from = param['year_from']
-            query += "and exp.year_of_experiment_start >= %(year_from)s\n"
-
-        year_to = None
-        if self._check_key_in_param(param, 'year_to'):
-            year_to = param['year_to']
-            query += "and exp.year_of_experiment_end <= %(year_to)s\n"
-
-        medium = None
-        if self._check_key_in_param(param, 'medium'):
-            medium = self._str2tuple(param['medium'])
-            query += "and exp.medium in %(medium)s\n"
-
-        sex = None
-        if self._check_key_in_param(param, 'sex'):
-            sex = self._str2tuple(param['sex'])
-            query += "and i.sex in %(sex)s\n"
-
-        liberty = None
-        if self._check_key_in_param(param, 'liberty'):
-            liberty = self._str2tuple(param['liberty'])
-            query += "and t.liberty_status in %(liberty)s\n"
-
-        lifestage = None
-        if self._check_key_in_param(param, 'lifestage'):
-            lifestage = self._str2tuple(param['lifestage'])
-            query += "and t.life_stage in %(lifestage)s\n"
-
-        captivity_from = None
-        if self._check_key_in_param(param, 'captivity_from'):
-            captivity_from = param['captivity_from']
-            query += "and t.captivity_duration_in_month >= %(captivity_from)s\n"
-
-        captivity_to = None
-        if self._check_key_in_param(param, 'captivity_to'):
-            captivity_to = param['captivity_to']
-            query += "and t.captivity_duration_in_month <= %(captivity_to)s\n"
-
-        sedated = None
-        if self._check_key_in_param(param, 'sedated'):
-            sedated = self._str2tuple(param['sedated'])
-            query += "and exp.sedated in %(sedated)s\n"
-
-        age_from = None
-        if self._check_key_in_param(param, 'age_from'):
-            age_from = param['age_from']
-            query += "and t.age_min_in_month >= %(age_from)s\n"
-
-        age_to = None
-        if self._check_key_in_param(param, 'age_to'):
-            age_to = param['age_to']
-            query += "and t.age_max_in_month <= %(age_to)s\n"
-
-        position = None
-        if self._check_key_in_param(param, 'position'):
-            position = self._str2tuple(param['position'])
-            query += "and exp.position_of_animal in %(position)s\n"
-
-        distance_from = None
-        if self._check_key_in_param(param, 'distance_from'):
-            distance_from = param['distance_from']
-            query += "and exp.distance_to_sound_source_in_meter >= %(distance_from)s\n"
-
-        distance_to = None
-        if self._check_key_in_param(param, 'distance_to'):
-            distance_to = param['distance_to']
-            query += "and exp.distance_to_sound_source_in_meter <= %(distance_to)s\n"
-
-        threshold_from = None
-        if self._check_key_in_param(param, 'threshold_from'):
-            threshold_from = param['threshold_from']
-            query += "and exp.threshold_determination_method >= %(threshold_from)s\n"
-
-        threshold_to = None
-        if self._check_key_in_param(param, 'threshold_to'):
-            threshold_to = param['threshold_to']
-            query += "and exp.threshold_determination_method <= %(threshold_to)s\n"
-
-        tone = None
-        if self._check_key_in_param(param, 'tone'):
-            tone = self._str2tuple(param['tone'])
-            query += "and exp.testtone_form_method_id in %(tone)s\n"
-
-        staircase = None
-        if self._check_key_in_param(param, 'staircase'):
-            staircase = self._str2tuple(param['staircase'])
-            query += "and exp.testtone_presentation_staircase in %(staircase)s\n"
-
-        form = None
-        if self._check_key_in_param(param, 'form'):
-            form = self._str2tuple(param['form'])
-            query += "and exp.testtone_presentation_sound_form in %(form)s\n"
-
-        constants = None
-        if self._check_key_in_param(param, 'constants'):
-            constants = self._str2tuple(param['constants'])
-            query += "and exp.testtone_presentation_method_constants in %(constants)s\n"
-
-        measurement_type = None
-        if self._check_key_in_param(param, 'measurement_type'):
-            measurement_type = self._str2tuple(param['measurement_type'])
-            query += "and exp.measurement_type in %(measurement_type)s\n"
-
+        query += self._from_where(joins, conditions)
         query += "group by exp.id\n"
 
         # set the order of the results, depending on the parameters #
 
         if self._check_key_in_param(param, 'order_by'):
-            if param['order_by'] == 'citation_short':
-                query += "order by citation_short"
-            elif param['order_by'] == 'measurement_method':
-                query += "order by measurement_method"
-            elif param['order_by'] == 'vernacular_name_english':
-                query += "order by vernacular_name_english"
-            elif param['order_by'] == 'species_name':
-                query += "order by species_name"
-            else:
-                query += "order by species_name"
+            order_by = param['order_by'] if param['order_by'] in Browse_query.ORDER_BY else 'species_name'
+            query += "order by %s" % order_by
         else:
             query += "order by vernacular_name_english"
 
-        # logging.warning(param)
-        logging.warning(query)
+        logging.debug(query)
+
+        return query, values
+
+    def _filters(self, param, methods=None):
+        """
+        Apply the filters of the parameters.
+
+        @return: tuple (list of joins, list of conditions, values of all filters)
+        """
+        joins = []
+        conditions = []
+        values = {}
+        for name, condition, is_list, join in Browse_query.FILTERS:
+            values[name] = None
+            if not self._check_key_in_param(param, name):
+                continue
+            values[name] = self._str2tuple(param[name]) if is_list else param[name]
+            conditions.append(condition)
+            if join is not None and join not in joins:
+                joins.append(join)
+        if methods is not None and values['method'] is not None:
+            values['method'] = methods
+        return joins, conditions, values
+
+    def _from_where(self, joins, conditions):
+        """From and where clause of the experiments matching the conditions."""
+        query = """
+            from
+                audiogram_experiment exp
+                left join method m1 on m1.id=exp.measurement_method_id
+                left join method m2 on m2.id=m1.parent_method_id
+                join audiogram_publication on audiogram_publication.audiogram_experiment_id=exp.id
+                join publication on publication.id=audiogram_publication.publication_id
+                join test_animal as t on t.audiogram_experiment_id=exp.id
+                join individual_animal as i on i.id=t.individual_animal_id
+                join taxon on taxon.ott_id=i.taxon_id
+                """
+        query += "".join("%s\n" % Browse_query.JOINS[join] for join in joins)
+        if len(conditions) > 0:
+            query += "where\n" + "".join("%s%s\n" % ("and " if n > 0 else "", c) for n, c in enumerate(conditions))
+        return query
 
-        # Execute the query, pass the GET parameter values,
-        # relying on the database API to do proper escaping
+    def _check_key_in_param(self, param, key):
+        return (key in param and param[key] is not None and param[key] != 'null' and param[key] != '' and param[key] != 'undefined')
 
-        with self.connection as cursor:
-            cursor.execute(
-                query,
-                {
-                    'species': species,
-                    'taxon': taxon,
-                    'method': method,
-                    'publication': publication,
-                    'facility': facility,
-                    'year_from': year_from,
-                    'year_to': year_to,
-                    'medium': medium,
-                    'sex': sex,
-                    'liberty': liberty,
-                    'lifestage': lifestage,
-                    'captivity_from': captivity_from,
-                    'captivity_to': captivity_to,
-                    'sedated': sedated,
-                    'age_from': age_from,
-                    'age_to': age_to,
-                    'position': position,
-                    'distance_from': distance_from,
-                    'distance_to': distance_to,
-                    'threshold_from': threshold_from,
-                    'threshold_to': threshold_to,
-                    'tone': tone,
-                    'staircase': staircase,
-                    'form': form,
-                    'constants': constants,
-                    'measurement_type': measurement_type
-                })
-            row_headers = [x[0] for x in cursor.description]
-            all_results = cursor.fetchall()
 
-        # logging.warning(all_results)
+class Browse_facets_query(Browse_query):
+    """
+    Count the experiments matching the browse filters, per value of the requested facets.
 
-        return {'headers': row_headers, 'results': all_results}
+    The filtered experiments are read once with the columns of all facets, and counted in memory:
+    one query for all facets. An experiment counts once per value, even with several animals or publications.
 
-    def _check_key_in_param(self, param, key):
-        return (key in param and param[key] is not None and param[key] != 'null' and param[key] != '' and param[key] != 'undefined')
+    @param dict - browse filters, and 'facets': list of facet names, see FACETS
+    """
+
+    FACETS = {
+        'species': ("taxon.ott_id", "taxon.unique_name", None),
+        'method': ("exp.measurement_method_id", "concat(m2.denomination, \": \", m1.denomination)", None),
+        'publication': ("audiogram_publication.publication_id", "publication.citation_short", None),
+        'facility': ("exp.facility_id", "facility.name", 'facility'),
+        'medium': ("exp.medium", None, None),
+        'sex': ("i.sex", None, None),
+        'liberty': ("t.liberty_status", None, None),
+        'lifestage': ("t.life_stage", None, None),
+        'sedated': ("exp.sedated", None, None),
+        'position': ("exp.position_of_animal", None, None),
+        'tone': ("exp.testtone_form_method_id", "tone.denomination", 'tone'),
+        'staircase': ("exp.testtone_presentation_staircase", None, None),
+        'form': ("exp.testtone_presentation_sound_form", None, None),
+        'constants': ("exp.testtone_presentation_method_constants", None, None),
+        'measurement_type': ("exp.measurement_type", None, None)
+    }
+    """Facets: (value column, label column or None, join needed or None), by name of the matching filter."""
+
+    def _run(self, param=None):
+        with self.connection as cursor:
+            methods = None
+            if self._check_key_in_param(param, 'method'):
+                methods = self._expand_methods(cursor, self._str2tuple(param['method']))
+            query, values = self.build(param, methods)
+            cursor.execute(query, values)
+            rows = cursor.fetchall()
+        return {'headers': ['facet', 'value', 'label', 'count'], 'results': self.count(param['facets'], rows)}
+
+    def build(self, param=None, methods=None):
+        """
+        Build the SQL statement: distinct experiment id and facet values.
+
+        @return: tuple (query, values), values are passed to cursor.execute for escaping
+        """
+        joins, conditions, values = self._filters(param, methods)
+        columns = ["exp.id"]
+        for name in param['facets']:
+            column, label, join = Browse_facets_query.FACETS[name]
+            columns += [column, label or "null"]
+            if join is not None and join not in joins:
+                joins.append(join)
+        query = "select distinct\n" + ",\n".join(columns) + self._from_where(joins, conditions)
+        logging.debug(query)
+        return query, values
+
+    def count(self, facets, rows):
+        """
+        Count the experiments per facet value.
+
+        @param rows: tuples (experiment id, value and label of each facet)
+        @return: list of tuples (facet, value, label, count), by facet, most frequent values first
+        """
+        results = []
+        for n, name in enumerate(facets):
+            experiments = collections.defaultdict(set)
+            labels = {}
+            for row in rows:
+                value = row[1 + 2 * n]
+                experiments[value].add(row[0])
+                labels[value] = row[2 + 2 * n]
+            counts = sorted(experiments.items(), key=lambda item: (-len(item[1]), str(item[0])))
+            results += [(name, value, labels[value], len(ids)) for value, ids in counts]
+        return results
 
 
 class Data_query(Query):
     """Get all data points for a given experiment, converted to modern units."""
 
-    def _run(self, param=None):
-        with self.connection as cursor:
-            cursor.execute(
-                """
+    select = """
             select
                 testtone_duration_in_millisecond,
                 testtone_frequency_in_khz,
@@ -916,13 +1251,23 @@ class Data_query(Query):
                 sound_pressure_level_reference spl
             on
                 spl.id=point.sound_pressure_level_reference_id
+            """
+    """Columns of a data point, the where clause is added by the query."""
+
+    def _run(self, param=None):
+        with self.connection as cursor:
+            cursor.execute(
+                self.select + """
             where
                 audiogram_experiment_id=%(id)s
                 """,
                 {'id': param})
             row_headers = [x[0] for x in cursor.description]
             all_results = cursor.fetchall()
+        return {'headers': row_headers, 'results': self.convert(all_results)}
 
+    def convert(self, all_results):
+        """Convert data points to modern units."""
         converter = SPL_converter()
         all_converted = []
         for r in all_results:
@@ -942,7 +1287,46 @@ class Data_query(Query):
             c = tuple(l)
             #logging.warning("tuple" + str(c))
             all_converted.append(c)
-        return {'headers': row_headers, 'results': all_converted}
+        return all_converted
+
+
+class Data_multiple_query(Data_query):
+    """
+    Get all data points for a list of experiments in one query, converted to modern units.
+
+    @param list of ids
+    Data points are ordered by experiment id.
+    """
+
+    def _run(self, param=None):
+        with self.connection as cursor:
+            cursor.execute(
+                self.select + """
+            where
+                audiogram_experiment_id in %(list)s
+            order by
+                audiogram_experiment_id, point.id
+                """,
+                {'list': param})
+            row_headers = [x[0] for x in cursor.description]
+            all_results = cursor.fetchall()
+        return {'headers': row_headers, 'results': self.convert(all_results)}
+
+
+class All_data_query(Data_query):
+    """
+    Get the data points of all experiments, converted to modern units.
+
+    Used to compute the metrics of all audiograms at once, see Audiogram_metrics.
+    Data points are not ordered.
+    """
+
+    def _run(self, param=None):
+        with self.connection as cursor:
+            cursor.execute(self.select)
+            row_headers = [x[0] for x in cursor.description]
+            all_results = cursor.fetchall()
+        return {'headers': row_headers, 'results': self.convert(all_results)}
 
 
 class Publication_query(Query):
@@ -0,0 +1,103 @@
+"""
+Profiling of single API requests, on demand.
+
+A profiled request runs under cProfile, and the time spent in each phase
+(DB connect, query execution, jsonize, serialise, Celery enqueue) is collected, see Metrics.timed.
+The phases are returned in the Server-Timing header of the response, the profile is saved
+to a file that can be read with pstats, snakeviz etc.
+
+Created on 18.10.2026
+@author: agent for Museum fuer Naturkunde Berlin
+"""
+import cProfile
+import io
+import os
+import pstats
+import re
+import time
+import uuid
+import Metrics
+
+
+PHASES = [
+    ('db_connect', "DB connect"),
+    ('db_execute', "Query execute"),
+    ('jsonize', "Jsonize"),
+    ('columnize', "Columnize"),
+    ('serialise', "Serialise"),
+    ('enqueue', "Celery enqueue")
+]
+"""Phases reported in the Server-Timing header, in order."""
+
+
+class Request_profiler:
+
+    def __init__(self, directory, keep=50):
+        """
+        @param directory: where profiles are saved
+        @param keep: number of profiles kept, older ones are deleted
+        """
+        self.directory = directory
+        self.keep = keep
+        self.id = uuid.uuid4().hex
+        self.profile = None
+        self.start_time = None
+        self.phases = {}
+        self.total = None
+
+    def start(self):
+        """Start profiling the current thread."""
+        Metrics.start_timings()
+        self.profile = cProfile.Profile()
+        try:
+            self.profile.enable()
+        except ValueError:
+            # another profiler is active, only the timings are collected
+            self.profile = None
+        self.start_time = time.perf_counter()
+        return self
+
+    def stop(self):
+        """Stop profiling, return the Server-Timing header value."""
+        if self.total is not None:
+            return self.server_timing()
+        self.total = time.perf_counter() - self.start_time
+        if self.profile is not None:
+            self.profile.disable()
+        self.phases = Metrics.stop_timings()
+        return self.server_timing()
+
+    def server_timing(self):
+        """Server-Timing header value, durations in ms."""
+        metrics = ['%s;dur=%.2f;desc="%s"' % (phase, 1000 * self.phases[phase], desc)
+                   for phase, desc in PHASES if phase in self.phases]
+        metrics.append('total;dur=%.2f;desc="Total"' % (1000 * self.total))
+        return ", ".join(metrics)
+
+    def save(self):
+        """Save the profile, return its id or None if there is no profile."""
+        if self.profile is None:
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        self.profile.dump_stats(Request_profiler.path(self.directory, self.id))
+        # keep the newest profiles only
+        files = sorted((os.path.join(self.directory, f) for f in os.listdir(self.directory) if f.endswith('.prof')),
+                       key=os.path.getmtime)
+        for f in files[:-self.keep]:
+            os.remove(f)
+        return self.id
+
+    @staticmethod
+    def path(directory, profile_id):
+        """Path of the profile file, None if the id is not valid."""
+        if not re.fullmatch(r'[0-9a-f]{32}', profile_id):
+            return None
+        return os.path.join(directory, profile_id + ".prof")
+
+    @staticmethod
+    def report(path, limit=50):
+        """Text report of a saved profile, functions sorted by cumulative time."""
+        out = io.StringIO()
+        stats = pstats.Stats(path, stream=out)
+        stats.strip_dirs().sort_stats('cumulative').print_stats(limit)
+        return out.getvalue()
@@ -5,6 +5,30 @@ Created on 05.05.2020
 @author: Alvaro.Ortiz for Museum fuer Naturkunde Berlin
 """
 import logging
+import numpy as np
+
+
+CONVERTED_UNITS = (1, 4)
+"""SPL references of converted data points: re 1 μPa in water, re 20 μPa in air, see Query.Data_query.convert."""
+
+
+def converted_units(columns):
+    """
+    SPL reference of each audiogram, after conversion.
+
+    @param columns: dict of NumPy arrays, converted data points, see Query.run_columns of Data_query
+    @return: tuple (sorted array of audiogram ids, array of SPL reference ids: 1 or 4, see CONVERTED_UNITS,
+       or 0 if the data points of the audiogram are not all in the same converted unit, e.g. without SPL reference)
+    """
+    exp = np.asarray(columns['audiogram_experiment_id'], dtype=np.int64)
+    # no SPL reference is 0
+    ref = np.nan_to_num(np.asarray(columns['sound_pressure_level_reference_id'], dtype=float)).astype(np.int64)
+    ids, group = np.unique(exp, return_inverse=True)
+    low = np.full(len(ids), np.iinfo(np.int64).max)
+    high = np.full(len(ids), np.iinfo(np.int64).min)
+    np.minimum.at(low, group, ref)
+    np.maximum.at(high, group, ref)
+    return ids, np.where((low == high) & np.isin(low, CONVERTED_UNITS), low, 0)
 
 
 class SPL_converter:
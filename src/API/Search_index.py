@@ -0,0 +1,136 @@
+"""
+In-memory text search over taxon names, English vernacular names, short citations and facility names.
+
+Names are normalised to lowercase ASCII (accents removed with Unidecode) and indexed twice:
+* the names, and every later word start of a name, in sorted lists: prefix search with bisect,
+  e.g. "bottle" and "dolph" find "bottlenose dolphin"
+* trigrams of each word of the name, in an inverted index: fuzzy search for misspellings, e.g. "dolfin"
+
+The index is built from Search_entries_query, and rebuilt by the API when the data version changes.
+
+Created on 18.10.2026
+@author: agent for Museum fuer Naturkunde Berlin
+"""
+import bisect
+import collections
+import re
+from unidecode import unidecode
+
+
+MIN_SIMILARITY = 0.3
+"""Minimum trigram similarity of fuzzy matches, between 0 and 1."""
+
+
+def word_trigrams(word):
+    """Set of trigrams of a word, padded with spaces."""
+    padded = "  " + word + " "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def normalise(text):
+    """Lowercase ASCII, words separated by a single space."""
+    return " ".join(re.findall(r'[a-z0-9]+', unidecode(text or "").lower()))
+
+
+class Search_index:
+
+    def __init__(self, entries, version=None):
+        """
+        @param entries: list of dicts with kind, id, text and detail, see Search_entries_query
+        @param version: data version the index was built from
+        """
+        self.version = version
+        self.entries = []
+        names = []
+        words = []
+        # distinct words of all names: number by word, number of trigrams and entries by number
+        vocabulary = {}
+        self.word_sizes = []
+        self.word_entries = []
+        # word numbers by trigram
+        self.postings = collections.defaultdict(list)
+        for entry in entries:
+            name = normalise(entry['text'])
+            if name == "":
+                continue
+            n = len(self.entries)
+            self.entries.append(entry)
+            names.append((name, n))
+            # every later word start: what follows each space
+            words += [(name[i + 1:], n) for i, c in enumerate(name) if c == " "]
+            for word in set(name.split(" ")):
+                if word not in vocabulary:
+                    vocabulary[word] = len(self.word_sizes)
+                    grams = word_trigrams(word)
+                    for gram in grams:
+                        self.postings[gram].append(vocabulary[word])
+                    self.word_sizes.append(len(grams))
+                    self.word_entries.append([])
+                self.word_entries[vocabulary[word]].append(n)
+        self.prefix_keys = []
+        for keys in (sorted(names), sorted(words)):
+            self.prefix_keys.append(([key for key, n in keys], [n for key, n in keys]))
+
+    def search(self, q, limit=20, kinds=None):
+        """
+        Find the entries matching a query.
+
+        Prefix matches come first: names starting with the query, then names with a later word
+        starting with it, alphabetically. Fuzzy matches follow, most similar first.
+
+        @param q: query string, as typed
+        @param limit: maximum number of results
+        @param kinds: set of kinds to search, default: all
+        @return: list of dicts: kind, id, text, detail, match (prefix | fuzzy), score between 0 and 1
+        """
+        query = normalise(q)
+        if query == "":
+            return []
+        found = set()
+        results = []
+        # prefix matches, the sorted keys starting with the query are contiguous:
+        # names first, then names with a later word starting with the query, alphabetically
+        for keys, entries in self.prefix_keys:
+            i = bisect.bisect_left(keys, query)
+            while i < len(keys) and len(results) < limit and keys[i].startswith(query):
+                n = entries[i]
+                if n not in found and (kinds is None or self.entries[n]['kind'] in kinds):
+                    found.add(n)
+                    results.append((n, 'prefix', 1.0))
+                i += 1
+        # fuzzy matches, if there are not enough prefix matches: the similarity of each query word
+        # of 3 letters or more to the most similar word of a name, averaged.
+        # Words less similar than MIN_SIMILARITY do not count.
+        query_words = [word for word in query.split(" ") if len(word) >= 3]
+        if len(results) < limit and len(query_words) > 0:
+            similar = [self._similar_words(word) for word in query_words]
+            if len(similar) == 1:
+                # one word: the entries of the most similar words, until the limit
+                fuzzy = [(-similarity, n) for w, similarity in similar[0].items() for n in self.word_entries[w]]
+            else:
+                best = collections.defaultdict(lambda: [0.0] * len(similar))
+                for i, words in enumerate(similar):
+                    for w, similarity in words.items():
+                        for n in self.word_entries[w]:
+                            best[n][i] = max(best[n][i], similarity)
+                fuzzy = [(-sum(scores) / len(scores), n) for n, scores in best.items()]
+            for score, n in sorted(fuzzy):
+                if len(results) >= limit or -score < MIN_SIMILARITY:
+                    break
+                if n not in found and (kinds is None or self.entries[n]['kind'] in kinds):
+                    found.add(n)
+                    results.append((n, 'fuzzy', -score))
+        return [dict(self.entries[n], match=match, score=round(score, 3)) for n, match, score in results]
+
+    def _similar_words(self, word):
+        """Trigram similarity to a word of the words of the names, if at least MIN_SIMILARITY, by word number."""
+        grams = word_trigrams(word)
+        shared = collections.Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+        resp = {}
+        for w, count in shared.items():
+            similarity = count / (len(grams) + self.word_sizes[w] - count)
+            if similarity >= MIN_SIMILARITY:
+                resp[w] = similarity
+        return resp
@@ -0,0 +1,160 @@
+"""
+Nearest neighbours of audiograms: the audiograms with the most similar thresholds.
+
+The converted thresholds of all audiograms are interpolated on a common log frequency grid
+(see Threshold_matrix.interpolate) and kept in one matrix. The distance between two audiograms
+is the root mean square difference of their thresholds at the grid frequencies tested in both,
+computed for all audiograms at once with three matrix-vector products.
+
+Thresholds in water and in air are in different units (dB re 1 μPa and dB re 20 μPa), searches
+are restricted to one unit. Audiograms whose data points are not all in one converted unit,
+e.g. without SPL reference, are never selected (see SPL_converter.converted_units).
+
+The index is kept in memory by the API. When the data version changes, the new index reuses the rows
+of the audiograms whose data points did not change (same content hash), only the others are interpolated.
+
+Created on 18.10.2026
+@author: agent for Museum fuer Naturkunde Berlin
+"""
+import numpy as np
+from SPL_converter import converted_units
+from Threshold_matrix import interpolate, log_grid, DEFAULT_GRID
+
+
+MIN_OVERLAP = 5
+"""Minimum number of grid frequencies tested in both audiograms, for their distance to count."""
+UNITS = {'water': 1, 'air': 4}
+"""Converted SPL reference of each medium, see SPL_converter.CONVERTED_UNITS."""
+
+
+class Similarity_index:
+
+    def __init__(self, hashes, experiments, load, version=None, previous=None):
+        """
+        @param hashes: dict, content hash of the data points by audiogram id, see All_content_hashes_query
+        @param experiments: list of dicts with id, measurement_type and taxon_id, see Experiment_taxa_query
+        @param load: function returning the converted data points of a list of ids, as columns
+        @param version: data version the index was built from
+        @param previous: index of an earlier data version, its rows are reused if the content hash is the same
+        """
+        self.version = version
+        self.grid = log_grid(*DEFAULT_GRID)
+        self.ids = np.array(sorted(hashes), dtype=np.int64)
+        self.hashes = hashes
+        thresholds = np.full((len(self.ids), len(self.grid)), np.nan)
+        units = np.zeros(len(self.ids), dtype=np.int64)
+        changed = np.ones(len(self.ids), dtype=bool)
+        if previous is not None and len(previous.ids) > 0:
+            # rows of the previous index with the same content hash
+            at = np.minimum(np.searchsorted(previous.ids, self.ids), len(previous.ids) - 1)
+            same = (previous.ids[at] == self.ids) & np.array(
+                [previous.hashes.get(id) == hashes[id] for id in self.ids.tolist()], dtype=bool)
+            thresholds[same] = previous.thresholds[at[same]]
+            units[same] = previous.unit[at[same]]
+            changed = ~same
+        if changed.any():
+            columns = load(self.ids[changed].tolist())
+            found, matrix = interpolate(columns, self.grid)
+            rows = np.searchsorted(self.ids, found)
+            keep = np.isin(found, self.ids[changed])
+            thresholds[rows[keep]] = matrix[keep]
+            found, unit = converted_units(columns)
+            rows = np.searchsorted(self.ids, found)
+            keep = np.isin(found, self.ids[changed])
+            units[rows[keep]] = unit[keep]
+        self.thresholds = thresholds
+        self.unit = units
+        """SPL reference of the thresholds of each audiogram: 1 or 4, 0 if not converted, see converted_units."""
+        self.updated = int(changed.sum())
+        """Number of audiograms interpolated for this index, the others were reused."""
+
+        # precomputed terms of the distance, see distances
+        self.tested = (~np.isnan(thresholds)).astype(float)
+        self.filled = np.nan_to_num(thresholds)
+        self.squared = self.filled ** 2
+
+        self.index = {id: i for i, id in enumerate(self.ids.tolist())}
+        """Position of each audiogram by id."""
+        self.measurement_type = np.full(len(self.ids), None, dtype=object)
+        pairs = []
+        for row in experiments:
+            i = self.index.get(row['id'])
+            if i is not None:
+                self.measurement_type[i] = row['measurement_type']
+                pairs.append((i, row['taxon_id']))
+        self.taxon_rows = np.array([i for i, taxon in pairs], dtype=np.int64)
+        self.taxa = np.array([-1 if taxon is None else taxon for i, taxon in pairs], dtype=np.int64)
+        """Taxa of the animals, the audiograms at taxon_rows: several rows for several species."""
+
+    def __contains__(self, id):
+        return id in self.index
+
+    def vector(self, id):
+        """Thresholds of an audiogram on the grid, NaN if not tested."""
+        return self.thresholds[self.index[id]]
+
+    def distances(self, vector):
+        """
+        Distances of all audiograms to thresholds on the grid.
+
+        With t the thresholds on the grid (0 if not tested) and w whether they were tested,
+        the sum over the grid of w1 * w2 * (t1 - t2)^2 is t1^2 . w2 - 2 t1 . (w2 t2) + w1 . (w2 t2^2):
+        matrix-vector products over the precomputed matrices.
+
+        @param vector: array of thresholds on the grid, NaN if not tested
+        @return: tuple (array of root mean square differences in dB, infinite if there are less than
+           MIN_OVERLAP common frequencies, array of the number of common frequencies), in the order of ids
+        """
+        tested = (~np.isnan(vector)).astype(float)
+        filled = np.nan_to_num(vector)
+        overlap = self.tested @ tested
+        sums = self.squared @ tested - 2 * (self.filled @ filled) + self.tested @ (filled ** 2)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            distances = np.sqrt(np.maximum(sums, 0) / overlap)
+        distances[overlap < MIN_OVERLAP] = np.inf
+        return distances, overlap.astype(np.int64)
+
+    def select(self, unit=None, taxa=None, measurement_type=None):
+        """
+        Audiograms in a converted unit, of taxa and of a measurement type.
+
+        Audiograms not in a converted unit are never selected.
+
+        @param unit: SPL reference 1 (water) or 4 (air), see UNITS, default: both
+        @param taxa: collection of ott_ids, default: all
+        @param measurement_type: e.g. auditory threshold, default: all
+        @return: boolean array, in the order of ids
+        """
+        selected = self.unit != 0
+        if unit is not None:
+            selected &= self.unit == unit
+        if measurement_type is not None:
+            selected &= self.measurement_type == measurement_type
+        if taxa is not None:
+            of_taxa = np.zeros(len(self.ids), dtype=bool)
+            of_taxa[self.taxon_rows[np.isin(self.taxa, np.fromiter(taxa, dtype=np.int64))]] = True
+            selected &= of_taxa
+        return selected
+
+    def nearest(self, vector, k=10, selected=None, exclude=None):
+        """
+        The k audiograms closest to thresholds on the grid.
+
+        @param vector: array of thresholds on the grid, NaN if not tested
+        @param selected: boolean array, the audiograms to search, see select. Default: all
+        @param exclude: id of an audiogram not to return, e.g. the audiogram searched for
+        @return: list of tuples (id, distance in dB, number of common frequencies), closest first
+        """
+        distances, overlap = self.distances(vector)
+        if selected is not None:
+            distances[~selected] = np.inf
+        if exclude in self.index:
+            distances[self.index[exclude]] = np.inf
+        k = min(k, len(distances))
+        if k <= 0:
+            return []
+        closest = np.argpartition(distances, k - 1)[:k]
+        closest = closest[np.lexsort((self.ids[closest], distances[closest]))]
+        closest = closest[np.isfinite(distances[closest])]
+        return [(id, d, n) for id, d, n in zip(self.ids[closest].tolist(), distances[closest].tolist(),
+                                               overlap[closest].tolist())]
@@ -0,0 +1,126 @@
+"""
+The taxonomy in memory, as a nested set in parallel arrays.
+
+Nodes are stored in nested set order (by lft): the subtree of a node is the contiguous range of nodes
+from the node to the last node with lft < its rgt. ott_id, parent, lft, rgt, rank and depth are NumPy arrays,
+names are lists of interned strings.
+
+The tree is built from Taxonomy_query, and rebuilt by the API when the data version changes.
+
+Created on 18.10.2026
+@author: agent for Museum fuer Naturkunde Berlin
+"""
+import sys
+import numpy as np
+
+
+class Taxonomy_tree:
+
+    def __init__(self, rows, version=None):
+        """
+        @param rows: list of dicts, the taxa, see Taxonomy_query
+        @param version: data version the tree was built from
+        """
+        self.version = version
+        self.columns = list(rows[0].keys()) if len(rows) > 0 else []
+        by_lft = sorted(range(len(rows)), key=lambda k: rows[k]['lft'])
+        self.order = np.argsort(np.array(by_lft, dtype=np.int64))
+        """Positions of the nodes in the order of the rows, i.e. by unique_name."""
+        rows = [rows[k] for k in by_lft]
+        self.ott_id = np.array([row['ott_id'] for row in rows], dtype=np.int64)
+        self.parent = np.array([-1 if row['parent'] is None else row['parent'] for row in rows], dtype=np.int64)
+        self.lft = np.array([row['lft'] for row in rows], dtype=np.int64)
+        self.rgt = np.array([row['rgt'] for row in rows], dtype=np.int64)
+        self.ranks = sorted({row['rank'] or '' for row in rows})
+        """Names of the ranks, the rank array holds their position."""
+        self.rank = np.array([self.ranks.index(row['rank'] or '') for row in rows], dtype=np.int8)
+        # other columns, e.g. names
+        self.names = {c: [sys.intern(row[c]) if isinstance(row[c], str) else row[c] for row in rows]
+                      for c in self.columns if c not in ('ott_id', 'parent', 'lft', 'rgt', 'rank')}
+        self.index = {ott_id: i for i, ott_id in enumerate(self.ott_id.tolist())}
+        """Position of each node by ott_id."""
+        self.depth = self._depths()
+
+    def _depths(self):
+        """Depth of each node, roots have depth 0."""
+        depth = np.zeros(len(self.lft), dtype=np.int32)
+        stack = []
+        for i, (lft, rgt) in enumerate(zip(self.lft.tolist(), self.rgt.tolist())):
+            while len(stack) > 0 and stack[-1] < lft:
+                stack.pop()
+            depth[i] = len(stack)
+            stack.append(rgt)
+        return depth
+
+    def __contains__(self, ott_id):
+        return ott_id in self.index
+
+    def roots(self):
+        """ott_ids of the nodes without parent in the tree."""
+        return self.ott_id[self.depth == 0].tolist()
+
+    def node(self, i):
+        """Node at a position, as a dict with the columns of Taxonomy_query."""
+        resp = {}
+        for c in self.columns:
+            if c == 'rank':
+                resp[c] = self.ranks[self.rank[i]] or None
+            elif c == 'parent':
+                resp[c] = None if self.parent[i] == -1 else int(self.parent[i])
+            elif c in self.names:
+                resp[c] = self.names[c][i]
+            else:
+                resp[c] = int(getattr(self, c)[i])
+        return resp
+
+    def nodes(self):
+        """All nodes, in the order of Taxonomy_query."""
+        return [self.node(i) for i in self.order.tolist()]
+
+    def subtree(self, ott_id, depth=None):
+        """
+        Nodes of the subtree of a taxon, in nested set order, with their depth below the taxon.
+
+        @param depth: maximum depth below the taxon, default: all
+        @return: list of dicts
+        """
+        positions = self._subtree(ott_id, depth)
+        top = self.depth[self.index[ott_id]]
+        return [dict(self.node(i), depth=int(self.depth[i] - top)) for i in positions.tolist()]
+
+    def subtree_ids(self, ott_id, depth=None):
+        """ott_ids of the nodes of the subtree of a taxon, the taxon included, in nested set order."""
+        return self.ott_id[self._subtree(ott_id, depth)].tolist()
+
+    def ancestors(self, ott_id):
+        """Nodes from the root of the tree down to the parent of a taxon."""
+        resp = []
+        i = self.index[ott_id]
+        while int(self.parent[i]) in self.index:
+            i = self.index[int(self.parent[i])]
+            resp.append(self.node(i))
+        return resp[::-1]
+
+    def tree(self, ott_id, depth=None):
+        """Subtree of a taxon as nested dicts, the children of each node in 'children'."""
+        root = None
+        stack = []
+        for i in self._subtree(ott_id, depth).tolist():
+            node = dict(self.node(i), children=[])
+            while len(stack) > 0 and self.rgt[stack[-1][0]] < self.lft[i]:
+                stack.pop()
+            if len(stack) == 0:
+                root = node
+            else:
+                stack[-1][1]['children'].append(node)
+            stack.append((i, node))
+        return root
+
+    def _subtree(self, ott_id, depth=None):
+        """Positions of the nodes of a subtree, in nested set order."""
+        i = self.index[ott_id]
+        end = int(np.searchsorted(self.lft, self.rgt[i]))
+        positions = np.arange(i, end)
+        if depth is not None:
+            positions = positions[self.depth[i:end] - self.depth[i] <= depth]
+        return positions
@@ -0,0 +1,110 @@
+"""
+Thresholds of many audiograms on a common frequency grid, for comparing them.
+
+The converted thresholds of each audiogram are interpolated linearly on a log frequency scale
+at the frequencies of a log-spaced grid. Grid frequencies outside the tested frequencies of an
+audiogram are missing (NaN). All audiograms are interpolated in a single np.interp call.
+
+The vector of each audiogram is cached, by grid and content hash of its data points.
+
+Created on 18.10.2026
+@author: agent for Museum fuer Naturkunde Berlin
+"""
+import collections
+import threading
+import numpy as np
+
+
+DEFAULT_GRID = (0.1, 200, 64)
+"""Lowest and highest frequency in kHz, number of frequencies."""
+MAX_GRID_POINTS = 1000
+"""Maximum number of frequencies of a grid."""
+CACHE_SIZE = 10000
+"""Number of interpolated vectors kept."""
+
+
+def log_grid(low, high, points):
+    """Log-spaced frequencies from low to high kHz, both included."""
+    if not (0 < low < high) or not (2 <= points <= MAX_GRID_POINTS):
+        raise ValueError("Invalid grid: %s, %s, %s" % (low, high, points))
+    return np.logspace(np.log10(low), np.log10(high), int(points))
+
+
+def interpolate(columns, grid):
+    """
+    Interpolate the thresholds of audiograms on a grid.
+
+    Thresholds measured several times at the same frequency are averaged.
+
+    @param columns: dict of NumPy arrays, converted data points, see Query.run_columns of Data_query
+    @param grid: array of frequencies in kHz, increasing
+    @return: tuple (sorted array of audiogram ids, matrix of thresholds: one row per audiogram, NaN if missing)
+    """
+    exp = np.asarray(columns['audiogram_experiment_id'], dtype=np.int64)
+    freq = np.asarray(columns['testtone_frequency_in_khz'], dtype=float)
+    spl = np.asarray(columns['sound_pressure_level_in_decibel'], dtype=float)
+    valid = ~np.isnan(freq) & ~np.isnan(spl) & (freq > 0)
+    exp, freq, spl = exp[valid], freq[valid], spl[valid]
+    ids, group = np.unique(exp, return_inverse=True)
+    if len(ids) == 0:
+        return ids, np.empty((0, len(grid)))
+
+    # one axis for all audiograms: the log frequencies of each audiogram are shifted
+    # past those of the previous one, so np.interp never mixes two audiograms inside a curve
+    logf = np.log10(freq)
+    loggrid = np.log10(grid)
+    shift = np.ceil(max(logf.max(), loggrid.max()) - min(logf.min(), loggrid.min())) + 1
+    keys, points = np.unique(group * shift + logf, return_inverse=True)
+    values = np.bincount(points, weights=spl) / np.bincount(points)
+    at = (np.arange(len(ids))[:, None] * shift + loggrid[None, :]).ravel()
+    matrix = np.interp(at, keys, values).reshape(len(ids), len(grid))
+
+    # missing outside the tested frequencies of each audiogram
+    low = np.full(len(ids), np.inf)
+    high = np.full(len(ids), -np.inf)
+    np.minimum.at(low, group, logf)
+    np.maximum.at(high, group, logf)
+    matrix[(loggrid[None, :] < low[:, None]) | (loggrid[None, :] > high[:, None])] = np.nan
+    return ids, matrix
+
+
+class Threshold_matrix:
+
+    def __init__(self, size=CACHE_SIZE):
+        """@param size: number of interpolated vectors kept, the least recently used are dropped"""
+        self.size = size
+        self._cache = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def matrix(self, ids, grid, versions, load):
+        """
+        Thresholds of audiograms on a grid.
+
+        @param ids: list of audiogram ids
+        @param grid: array of frequencies in kHz, see log_grid
+        @param versions: dict, content hash of the data points by audiogram id, see Plot_cache.content_hashes
+        @param load: function returning the converted data points of a list of ids, as columns
+        @return: matrix of thresholds, one row per id in the order of ids, NaN if missing
+        """
+        grid_key = tuple(grid.tolist())
+        keys = {id: (id, versions.get(id), grid_key) for id in ids}
+        vectors = {}
+        with self._lock:
+            for id, key in keys.items():
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    vectors[id] = self._cache[key]
+        missing = sorted(set(ids) - set(vectors))
+        if len(missing) > 0:
+            found, matrix = interpolate(load(missing), grid)
+            for id, vector in zip(found.tolist(), matrix):
+                vectors[id] = vector
+            with self._lock:
+                for id in missing:
+                    # audiograms without data points are cached as missing
+                    self._cache[keys[id]] = vectors.setdefault(id, np.full(len(grid), np.nan))
+                while len(self._cache) > self.size:
+                    self._cache.popitem(last=False)
+        if len(ids) == 0:
+            return np.empty((0, len(grid)))
+        return np.vstack([vectors[id] for id in ids])
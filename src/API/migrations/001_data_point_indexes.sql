@@ -0,0 +1,3 @@
+-- Data points are always read by audiogram: Data_query, Data_multiple_query, Data_points_query,
+-- Content_hash_query, Download_query. The second column makes SPLUnits_query index-only.
+create index idx_data_point_experiment on audiogram_data_point (audiogram_experiment_id, sound_pressure_level_reference_id);
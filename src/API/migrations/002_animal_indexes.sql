@@ -0,0 +1,5 @@
+-- Experiment -> animal -> taxon joins of Browse_query, List_query, Caption_query, Animal_query, Species_query.
+-- Both directions are covering: browse starts at the experiment, the clade queries start at the taxon.
+create index idx_test_animal_experiment on test_animal (audiogram_experiment_id, individual_animal_id);
+create index idx_test_animal_animal on test_animal (individual_animal_id, audiogram_experiment_id);
+create index idx_individual_animal_taxon on individual_animal (taxon_id, id);
@@ -0,0 +1,6 @@
+-- Clade queries (Birds_query, Mammals_query...) look up the clade by name,
+-- then scan its nested set range for species.
+create index idx_taxon_unique_name on taxon (unique_name);
+create index idx_taxon_nested_set on taxon (lft, rgt, `rank`, ott_id);
+-- All_taxa_query and Summary_query filter species and subspecies.
+create index idx_taxon_rank on taxon (`rank`, ott_id);
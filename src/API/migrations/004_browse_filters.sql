@@ -0,0 +1,12 @@
+-- Publication joins, in both directions: by experiment, and the publication filter of Browse_query.
+create index idx_audiogram_publication_experiment on audiogram_publication (audiogram_experiment_id, publication_id);
+create index idx_audiogram_publication_publication on audiogram_publication (publication_id, audiogram_experiment_id);
+-- Browse_query filters on the experiment.
+create index idx_experiment_medium_method on audiogram_experiment (medium, measurement_method_id);
+create index idx_experiment_method on audiogram_experiment (measurement_method_id);
+create index idx_experiment_facility on audiogram_experiment (facility_id);
+create index idx_experiment_years on audiogram_experiment (year_of_experiment_start, year_of_experiment_end);
+create index idx_experiment_tone on audiogram_experiment (testtone_form_method_id);
+-- Method filter of Browse_query: the sub-methods of the methods filtered on are listed before the query,
+-- "select id from method where parent_method_id in ...", see Browse_query._expand_methods.
+create index idx_method_parent on method (parent_method_id);
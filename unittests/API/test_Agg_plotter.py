@@ -0,0 +1,68 @@
+"""
+Tests of Agg_plotter: images of single audiograms and overlays.
+
+Created on 18.10.2026
+
+@author: agent for Museum fuer Naturkunde Berlin
+"""
+
+import unittest
+import os
+import tempfile
+from API.Agg_plotter import Agg_plotter
+from API.Plotter import columns_from_layers
+
+
+def _points(freqs, spls, label="re 1 μPa"):
+    return [
+        {
+            "testtone_frequency_in_khz": f,
+            "sound_pressure_level_in_decibel": s,
+            "audiogram_experiment_id": 201,
+            "spl_reference_display_label": label
+        } for f, s in zip(freqs, spls)]
+
+
+class test_Agg_plotter(unittest.TestCase):
+    def setUp(self):
+        """Plots are saved in ./static, run each test in a temporary directory."""
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        os.mkdir("static")
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def test_1(self):
+        """Points are sorted by frequency"""
+        freq, spl = Agg_plotter()._to_arrays(columns_from_layers([_points([128.0, 1.0, 16.0], [92.0, 60.0, 70.0])]))
+        self.assertEqual([1.0, 16.0, 128.0], freq.tolist())
+        self.assertEqual([60.0, 70.0, 92.0], spl.tolist())
+
+    def test_2(self):
+        """Single audiogram is saved as png"""
+        data_points = columns_from_layers([_points([1.0, 16.0, 128.0], [60.0, 70.0, 92.0])])
+        url = Agg_plotter().plot(data_points, "http://localhost/api/v1/plot?id=1")
+        path = "." + url
+        self.assertTrue(os.path.exists(path))
+        with open(path, 'rb') as f:
+            self.assertEqual(b'\x89PNG', f.read(4))
+
+    def test_3(self):
+        """Overlays are saved as png, template is reused"""
+        data_points_array = columns_from_layers([
+            _points([1.0, 16.0], [60.0, 70.0]),
+            _points([2.0, 32.0], [50.0, 80.0])])
+        plotter = Agg_plotter()
+        url = plotter.plotlayers(data_points_array, "http://localhost/api/v1/plotlayers?ids=1,2")
+        self.assertTrue(os.path.exists("." + url))
+        # data lines are removed from the template after saving
+        fig, ax = plotter._get_template('layers')
+        self.assertEqual(0, len(ax.lines))
+        self.assertIsNone(ax.get_legend())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+"""
+Tests of Aggregate_audiogram: quantiles, consensus audiograms and bootstrap intervals.
+
+Created on 19.10.2026
+
+@author: agent for Museum fuer Naturkunde Berlin
+"""
+
+import unittest
+import multiprocessing
+import warnings
+from unittest import mock
+import numpy as np
+from API import Aggregate_audiogram
+from API.Aggregate_audiogram import quantiles, aggregate, bootstrap
+
+THRESHOLDS = np.array([
+    [60, 50, np.nan],
+    [70, 40, np.nan],
+    [80, np.nan, np.nan],
+    [90, 60, np.nan]
+])
+
+
+class test_Aggregate_audiogram(unittest.TestCase):
+
+    def test_1(self):
+        """Median and percentiles per frequency, ignoring missing thresholds"""
+        values = aggregate(THRESHOLDS, (25, 75))
+        self.assertEqual([4, 3, 0], values['audiograms'].tolist())
+        np.testing.assert_allclose([75, 50, np.nan], values['median'])
+        np.testing.assert_allclose([67.5, 45, np.nan], values['percentile_25'])
+        np.testing.assert_allclose([82.5, 55, np.nan], values['percentile_75'])
+        # the same as NumPy
+        random = np.random.default_rng(1).normal(60, 10, (50, 20))
+        random[random > 70] = np.nan
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            expected = np.nanpercentile(random, [10, 50, 95], axis=0)
+        np.testing.assert_allclose(expected, quantiles(random, (0.1, 0.5, 0.95)))
+
+    def test_2(self):
+        """Bootstrap interval of the median, the same with a process pool"""
+        # batches of 7 resamples
+        with mock.patch.object(Aggregate_audiogram, 'CHUNK_VALUES', 7 * THRESHOLDS.size):
+            low, high = bootstrap(THRESHOLDS, 200)
+            with multiprocessing.get_context('spawn').Pool(2) as pool:
+                pooled = bootstrap(THRESHOLDS, 200, pool=pool, processes=2)
+        self.assertTrue((low[:2] <= [75, 50]).all() and ([75, 50] <= high[:2]).all())
+        self.assertTrue(np.isnan(low[2]) and np.isnan(high[2]))
+        np.testing.assert_array_equal(low, pooled[0])
+        np.testing.assert_array_equal(high, pooled[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+"""
+Tests of Audiogram_metrics: metrics of each audiogram and range filters.
+
+Created on 18.10.2026
+
+@author: agent for Museum fuer Naturkunde Berlin
+"""
+
+import math
+import unittest
+import numpy as np
+from API.Audiogram_metrics import Audiogram_metrics, compute
+
+
+def columns(points, references=None):
+    """
+    Columns of Data_query for a list of (experiment id, frequency, threshold).
+
+    @param references: SPL reference of the data points by experiment id, default: re 1 μPa (1)
+    """
+    exp, freq, spl = zip(*points)
+    ref = [(references or {}).get(e, 1) for e in exp]
+    return {'audiogram_experiment_id': np.array(exp), 'testtone_frequency_in_khz': np.array(freq, dtype=float),
+            'sound_pressure_level_in_decibel': np.array(spl, dtype=float),
+            'sound_pressure_level_reference_id': np.array(ref, dtype=float)}
+
+
+POINTS = [
+    # U-shaped curve, crossing lowest + 20 dB (60) between 1 and 10 kHz and between 10 and 100 kHz
+    (7, 10, 40), (7, 1, 80), (7, 100, 70),
+    # flat curve, never crosses, with a missing threshold
+    (3, 2, 50), (3, 4, 50), (3, 8, None), (3, 16, 55)
+]
+
+
+class test_Audiogram_metrics(unittest.TestCase):
+
+    def test_1(self):
+        """Metrics of each audiogram, hearing range interpolated on a log frequency scale"""
+        ids, values = compute(columns(POINTS))
+        self.assertEqual([3, 7], ids.tolist())
+        self.assertEqual([2, 1], values['min_frequency_in_khz'].tolist())
+        self.assertEqual([16, 100], values['max_frequency_in_khz'].tolist())
+        self.assertEqual([2, 10], values['best_frequency_in_khz'].tolist())
+        self.assertEqual([50, 40], values['lowest_threshold_in_decibel'].tolist())
+        self.assertEqual(2, values['hearing_range_low_in_khz'][0])
+        self.assertEqual(16, values['hearing_range_high_in_khz'][0])
+        # 60 dB is half way from 80 to 40 dB, and two thirds of the way from 40 to 70 dB
+        self.assertAlmostEqual(math.sqrt(10), values['hearing_range_low_in_khz'][1])
+        self.assertAlmostEqual(10 ** (1 + 2 / 3), values['hearing_range_high_in_khz'][1])
+
+    def test_2(self):
+        """Audiograms are selected by ranges of their metrics"""
+        metrics = Audiogram_metrics(columns(POINTS + [(9, 0.5, 90), (9, 50, 60)]))
+        self.assertEqual([3, 7, 9], metrics.select({}).tolist())
+        self.assertEqual([7, 9], metrics.select({'max_frequency_in_khz': (50, None)}).tolist())
+        self.assertEqual([7], metrics.select({'max_frequency_in_khz': (50, None),
+                                              'lowest_threshold_in_decibel': (None, 50)}).tolist())
+        self.assertEqual([], metrics.select({'best_frequency_in_khz': (200, 300)}).tolist())
+        self.assertEqual(40, metrics.get(7)['lowest_threshold_in_decibel'])
+        self.assertIsNone(metrics.get(1)['best_frequency_in_khz'])
+
+    def test_3(self):
+        """Audiograms in units that are not converted have no metrics from their thresholds"""
+        points = POINTS + [(9, 0.5, 90), (9, 50, 60)]
+        # 3 has no SPL reference, 9 is in a unit that is not converted
+        metrics = Audiogram_metrics(columns(points, {3: None, 9: 7}))
+        self.assertEqual({
+            'min_frequency_in_khz': 0.5, 'max_frequency_in_khz': 50, 'best_frequency_in_khz': None,
+            'lowest_threshold_in_decibel': None, 'hearing_range_low_in_khz': None, 'hearing_range_high_in_khz': None
+        }, metrics.get(9))
+        self.assertEqual(40, metrics.get(7)['lowest_threshold_in_decibel'])
+        self.assertEqual([7], metrics.select({'lowest_threshold_in_decibel': (None, 100)}).tolist())
+        self.assertEqual([3, 7, 9], metrics.select({'max_frequency_in_khz': (10, None)}).tolist())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+"""
+Tests of Metrics: counters, gauges, histograms and their text format.
+
+Created on 18.10.2026
+
+@author: agent for Museum fuer Naturkunde Berlin
+"""
+
+import unittest
+from API.Metrics import Counter, Gauge, Histogram, expose
+
+
+class test_Metrics(unittest.TestCase):
+
+    def setUp(self):
+        # test metrics are not added to the registry of /metrics
+        self.registry = []
+
+    def test_1(self):
+        """Counters and gauges by label, in the text format"""
+        counter = Counter('test_requests_total', "Requests.", registry=self.registry)
+        counter.inc(route="/api/v1/plot", status=200)
+        counter.inc(2, route="/api/v1/plot", status=200)
+        counter.inc(route='say "hi"\n', status=500)
+        gauge = Gauge('test_in_flight', "In flight.", registry=self.registry)
+        gauge.inc()
+        gauge.inc()
+        gauge.dec()
+        lines = expose(self.registry).split("\n")
+        self.assertIn("# TYPE test_requests_total counter", lines)
+        self.assertIn('test_requests_total{route="/api/v1/plot",status="200"} 3', lines)
+        self.assertIn('test_requests_total{route="say \\"hi\\"\\n",status="500"} 1', lines)
+        self.assertIn("test_in_flight 1", lines)
+
+    def test_2(self):
+        """Histogram buckets are cumulative"""
+        histogram = Histogram('test_duration_seconds', "Duration.", (0.1, 1), registry=self.registry)
+        for value in (0.05, 0.5, 0.5, 3):
+            histogram.observe(value, query="Browse_query")
+        lines = expose(self.registry).split("\n")
+        self.assertIn('test_duration_seconds_bucket{query="Browse_query",le="0.1"} 1', lines)
+        self.assertIn('test_duration_seconds_bucket{query="Browse_query",le="1"} 3', lines)
+        self.assertIn('test_duration_seconds_bucket{query="Browse_query",le="+Inf"} 4', lines)
+        self.assertIn('test_duration_seconds_sum{query="Browse_query"} 4.05', lines)
+        self.assertIn('test_duration_seconds_count{query="Browse_query"} 4', lines)
+
+    def test_3(self):
+        """Gauges can be read on exposition"""
+        Gauge('test_pool', "Pool.", collect=lambda: [({'state': 'in_use'}, 2)], registry=self.registry)
+        self.assertIn('test_pool{state="in_use"} 2', expose(self.registry).split("\n"))
+        self.assertNotIn('test_pool', expose())
+
+
+if __name__ == "__main__":
+    unittest.main()
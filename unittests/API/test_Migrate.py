@@ -0,0 +1,71 @@
+"""
+Tests of Migrate: ordering of the migrations and the check of their indexes.
+
+Created on 18.10.2026
+
+@author: agent for Museum fuer Naturkunde Berlin
+"""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+import pymysql
+from API import Migrate
+
+
+class test_Migrate(unittest.TestCase):
+
+    def test_1(self):
+        """Migrations are ordered by version, comments are skipped"""
+        with tempfile.TemporaryDirectory() as tmp:
+            for name, sql in (("010_later.sql", "create index idx_b on b (x);"),
+                              ("002_first.sql", "-- comment; with a semicolon\ncreate index idx_a on a (x, `rank`);\n"),
+                              ("notes.txt", "")):
+                with open(os.path.join(tmp, name), "w") as f:
+                    f.write(sql)
+            self.assertEqual([2, 10], [m[0] for m in Migrate.migrations(tmp)])
+            self.assertEqual([('a', 'idx_a', ('x', 'rank')), ('b', 'idx_b', ('x',))], Migrate.required_indexes(tmp))
+
+    def test_2(self):
+        """The shipped migrations create indexes"""
+        indexes = Migrate.required_indexes()
+        self.assertIn(('audiogram_data_point', 'idx_data_point_experiment',
+                       ('audiogram_experiment_id', 'sound_pressure_level_reference_id')), indexes)
+        self.assertEqual(len(indexes), len({index for table, index, columns in indexes}))
+
+    def test_3(self):
+        """An index is present if an index of the table starts with its columns"""
+        rows = [{'table_name': 'audiogram_data_point', 'index_name': 'by_hand', 'column_name': c}
+                for c in ('audiogram_experiment_id', 'sound_pressure_level_reference_id', 'frequency')]
+        with mock.patch.object(Migrate, 'Index_query') as query:
+            query.return_value.run.return_value = rows
+            missing = Migrate.missing_indexes(None)
+        self.assertNotIn('idx_data_point_experiment', [index for table, index, columns in missing])
+        self.assertIn('idx_taxon_unique_name', [index for table, index, columns in missing])
+
+    def test_4(self):
+        """Existing indexes are skipped, whatever error class the pymysql version raises"""
+        connection = mock.MagicMock()
+        cursor = connection.cursor.return_value.__enter__.return_value
+        cursor.fetchall.return_value = []
+        errors = {
+            "create index idx_a on a (x)": pymysql.err.InternalError(1061, "Duplicate key name 'idx_a'"),
+            "create index idx_b on b (x)": pymysql.err.OperationalError(1061, "Duplicate key name 'idx_b'")
+        }
+
+        def execute(statement, args=None):
+            if statement in errors:
+                raise errors[statement]
+        cursor.execute.side_effect = execute
+        with tempfile.TemporaryDirectory() as tmp:
+            with open(os.path.join(tmp, "001_indexes.sql"), "w") as f:
+                f.write("create index idx_a on a (x);\ncreate index idx_b on b (x);\n")
+            self.assertEqual([1], Migrate.migrate(connection, tmp))
+            errors["create index idx_b on b (x)"] = pymysql.err.OperationalError(1072, "Key column 'x' doesn't exist")
+            with self.assertRaises(pymysql.err.OperationalError):
+                Migrate.migrate(connection, tmp)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+"""
+Tests of Plot_spec: Vega-Lite specifications of audiogram plots.
+
+Created on 18.10.2026
+
+@author: agent for Museum fuer Naturkunde Berlin
+"""
+
+import unittest
+from decimal import Decimal
+from API.Plot_spec import Plot_spec
+
+
+def _points(experiment_id, freqs, spls):
+    return [
+        {
+            "testtone_frequency_in_khz": Decimal(f),
+            "sound_pressure_level_in_decibel": Decimal(s),
+            "audiogram_experiment_id": experiment_id,
+            "spl_reference_display_label": "re 1 μPa"
+        } for f, s in zip(freqs, spls)]
+
+
+class test_Plot_spec(unittest.TestCase):
+    def test_1(self):
+        """Single audiogram: black line, axes as in Plotter.plot"""
+        spec = Plot_spec().build([_points(1, [1, 16, 128], [60, 70, 92])])
+        self.assertEqual(3, len(spec['data']['values']))
+        self.assertEqual(128.0, spec['data']['values'][2]['testtone_frequency_in_khz'])
+        self.assertEqual('log', spec['encoding']['x']['scale']['type'])
+        self.assertEqual([0.05, 200], spec['encoding']['x']['scale']['domain'])
+        self.assertEqual([-50, 160], spec['encoding']['y']['scale']['domain'])
+        self.assertEqual("Threshold (dB re 1 μPa)", spec['encoding']['y']['title'])
+        self.assertNotIn('color', spec['encoding'])
+
+    def test_2(self):
+        """Overlays: one colour per layer, from the Plotter palette"""
+        spec = Plot_spec().build([_points(1, [1, 16], [60, 70]), _points(3, [2, 32], [50, 80])])
+        self.assertEqual([0.1, 200], spec['encoding']['x']['scale']['domain'])
+        self.assertEqual(['A', 'B'], spec['encoding']['color']['scale']['domain'])
+        self.assertEqual(['#000000', '#E69F00'], spec['encoding']['color']['scale']['range'])
+        self.assertEqual('B', spec['data']['values'][3]['label'])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -9,7 +9,13 @@ Created on 06.05.2020
 import unittest
 import pandas as pd
 import json
-from API.Plotter import Plotter
+import os
+import tempfile
+import threading
+from unittest import mock
+from PIL import Image
+import numpy as np
+from API.Plotter import Plotter, layer_label
 
 
 class test_Plotter(unittest.TestCase):
@@ -56,6 +62,101 @@ class test_Plotter(unittest.TestCase):
         self.assertEqual(4, len(panda))
         self.assertEqual(128.0, panda["testtone_frequency_in_khz"][0])
 
+    def test_2(self):
+        """Image variants are downscaled from the master image and cached"""
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                os.mkdir("static")
+                plotter = Plotter()
+                master = plotter._path("abcd1234")
+                Image.new("RGB", (1500, 1500), "white").save(master)
+                # master image itself
+                self.assertEqual("/static/audiogram_abcd1234.png", plotter._variant(master))
+                self.assertEqual("/static/audiogram_abcd1234.png", plotter._variant(master, 'full', 300))
+                # thumbnail: 1 in at 100 dpi
+                url = plotter._variant(master, 'thumbnail', 100)
+                self.assertEqual("/static/audiogram_abcd1234_thumbnail_100.png", url)
+                with Image.open("." + url) as img:
+                    self.assertEqual((100, 100), img.size)
+                # full size at low resolution
+                url = plotter._variant(master, None, 72)
+                with Image.open("." + url) as img:
+                    self.assertEqual((360, 360), img.size)
+                with self.assertRaises(Exception):
+                    plotter._variant(master, 'huge', 300)
+            finally:
+                os.chdir(cwd)
+
+    def test_3(self):
+        """Cached plots are found by URL and content hash"""
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                os.mkdir("static")
+                plotter = Plotter()
+                url = "http://localhost/api/v1/plot?id=1"
+                self.assertIsNone(plotter.cached(url, "1:12-123456"))
+                Image.new("RGB", (1500, 1500), "white").save(plotter._path(plotter.cache_key(url + "1:12-123456")))
+                self.assertIsNotNone(plotter.cached(url, "1:12-123456"))
+                # variants of a cached master image are derived on the spot
+                self.assertTrue(os.path.exists("." + plotter.cached(url, "1:12-123456", 'small', 72)))
+                # data has changed
+                self.assertIsNone(plotter.cached(url, "1:13-654321"))
+            finally:
+                os.chdir(cwd)
+
+    def test_4(self):
+        """Overlays of any number of audiograms, one label per audiogram in order of id"""
+        self.assertEqual(["A", "Z", "AA", "AB", "ZZ", "AAA"], [layer_label(i) for i in (0, 25, 26, 27, 701, 702)])
+        ids = np.repeat(np.arange(100, 40, -1), 2)
+        columns = {
+            'testtone_frequency_in_khz': np.tile([1.0, 10.0], 60),
+            'sound_pressure_level_in_decibel': np.arange(120, dtype=float),
+            'audiogram_experiment_id': ids,
+            'spl_reference_display_label': np.array(["re 1 μPa"] * 120, dtype=object)}
+        panda = Plotter()._columns_to_panda(columns, layers=True)
+        self.assertEqual(60, len(panda['label'].cat.categories))
+        # audiogram 41 is the first layer
+        self.assertEqual("A", panda['label'][119])
+        self.assertEqual("BH", panda['label'][0])
+
+    def test_5(self):
+        """The same variant derived by two threads at once"""
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                os.mkdir("static")
+                plotter = Plotter()
+                master = plotter._path("abcd1234")
+                Image.new("RGB", (1500, 1500), "white").save(master)
+                # both threads draw before either moves its file in place
+                barrier = threading.Barrier(2, timeout=10)
+                downscale = plotter._downscale
+
+                def draw(*args):
+                    barrier.wait()
+                    downscale(*args)
+                    barrier.wait()
+                urls = []
+                with mock.patch.object(plotter, '_downscale', draw):
+                    threads = [threading.Thread(target=lambda: urls.append(plotter._variant(master, 'small', 72)))
+                               for i in range(2)]
+                    for thread in threads:
+                        thread.start()
+                    for thread in threads:
+                        thread.join()
+                self.assertEqual(["/static/audiogram_abcd1234_small_72.png"] * 2, urls)
+                with Image.open("." + urls[0]) as img:
+                    self.assertEqual((144, 144), img.size)
+                self.assertEqual(["audiogram_abcd1234.png", "audiogram_abcd1234_small_72.png"],
+                                 sorted(os.listdir("static")))
+            finally:
+                os.chdir(cwd)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,120 @@
+"""
+Tests of Prerender: plot jobs of all audiograms and overlays, and rendering them.
+
+Created on 19.10.2026
+
+@author: agent for Museum fuer Naturkunde Berlin
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+from API import Prerender
+
+
+class Stub_plotter:
+    """Plots nothing, records the plots requested. Audiogram 2 is cached."""
+
+    def __init__(self):
+        self.plotted = []
+
+    def cached(self, url, version, size, dpi):
+        return "/static/cached.png" if url == "/api/v1/plot?id=2" else None
+
+    def plot(self, data_points, url, size, dpi, version):
+        self.plotted.append(('plot', url, version))
+
+    def plotlayers(self, data_points, url, size, dpi, version):
+        self.plotted.append(('plotlayers', url, version))
+
+
+def data_columns(ids):
+    """Data points of the audiograms with an id below 10, the others have none."""
+    found = [id for id in ids if id < 10]
+    return {'audiogram_experiment_id': np.repeat(found, 2)}
+
+
+class Stub_pool:
+    """Runs the jobs in this process, as multiprocessing.Pool would in its processes."""
+
+    def __init__(self, processes, initializer=None, initargs=()):
+        self.processes = processes
+        initializer(*initargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def imap_unordered(self, function, jobs):
+        return map(function, jobs)
+
+
+class test_Prerender(unittest.TestCase):
+
+    def setUp(self):
+        self.plotter = Stub_plotter()
+        experiments = mock.Mock()
+        experiments.return_value.run.return_value = [{'id': 3}, {'id': 1}, {'id': 2}]
+        self.data = mock.Mock()
+        self.data.return_value.run_columns.side_effect = data_columns
+        self.hashes = mock.Mock(side_effect=lambda config, ids: {id: "h%d" % id for id in ids})
+        patches = [
+            mock.patch.object(Prerender, '_config', None),
+            mock.patch.object(Prerender, 'All_experiments_query', experiments),
+            mock.patch.object(Prerender, 'Data_multiple_query', self.data),
+            mock.patch.object(Prerender, 'content_hashes', self.hashes),
+            mock.patch.object(Prerender, 'get_plotter', lambda config: self.plotter)
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_1(self):
+        """One plot per audiogram and one per overlay, versions from one content hash query"""
+        jobs = Prerender.jobs([[12, 1]], 'thumbnail', 100)
+        self.assertEqual([
+            ('plot', [1], "1:h1", 'thumbnail', 100),
+            ('plot', [2], "2:h2", 'thumbnail', 100),
+            ('plot', [3], "3:h3", 'thumbnail', 100),
+            ('plotlayers', [1, 12], "1:h1;12:h12", 'thumbnail', 100)], jobs)
+        self.hashes.assert_called_once_with(None, [1, 2, 3, 12])
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "overlays.txt")
+            with open(path, "w") as f:
+                f.write("# dolphins\n3,1\n\n2, 4  # seals\n")
+            self.assertEqual([[3, 1], [2, 4]], Prerender.read_overlays(path))
+
+    def test_2(self):
+        """Plots are rendered, skipped if cached, empty without data points"""
+        self.assertEqual('rendered', Prerender.render(('plot', [1], "1:h1", None, None))[1])
+        self.assertEqual('skipped', Prerender.render(('plot', [2], "2:h2", None, None))[1])
+        self.assertEqual('empty', Prerender.render(('plotlayers', [1, 12], "", None, None))[1])
+        self.assertEqual('rendered', Prerender.render(('plotlayers', [1, 3], "v", None, None))[1])
+        self.assertEqual([('plot', "/api/v1/plot?id=1", "1:h1"), ('plotlayers', "/api/v1/plotlayers?ids=1,3", "v")],
+                         self.plotter.plotted)
+        self.data.return_value.run_columns.side_effect = Exception("database down")
+        self.assertEqual('database down', Prerender.render(('plot', [1], "", None, None))[1])
+
+    def test_3(self):
+        """Every job is handed to the pool, each process reads the configuration"""
+        argv = ['Prerender.py', '--processes', '3', '--config', 'api.ini']
+        rendered = []
+
+        def render(job):
+            rendered.append(job)
+            return job, 'failed to draw' if job[1] == [3] else 'rendered'
+        with mock.patch.object(sys, 'argv', argv), mock.patch.object(Prerender, 'render', render), \
+                mock.patch.object(Prerender.multiprocessing, 'Pool', Stub_pool), \
+                mock.patch.object(Prerender, 'load_config') as load_config, mock.patch('builtins.print'):
+            Prerender.main()
+        self.assertEqual([[1], [2], [3]], [job[1] for job in rendered])
+        self.assertEqual([mock.call('api.ini')] * 2, load_config.call_args_list)
+
+
+if __name__ == "__main__":
+    unittest.main()
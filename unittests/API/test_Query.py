@@ -8,9 +8,15 @@ Created on 30.01.2020
 
 import unittest
 import configparser
+import math
+from decimal import Decimal
 from API.Query import *  # noqa: F403
 import logging
 
+NO_DATABASE = configparser.ConfigParser()
+NO_DATABASE.read_dict({'DEFAULT': {'DB_HOST': "", 'DB_USERNAME': "", 'DB_PASSWORD': "", 'DB_DATABASE': ""}})
+"""Configuration of queries that are only built, never run."""
+
 
 class test_Query(unittest.TestCase):
     configPath = "/src/API/api.ini"
@@ -149,6 +155,78 @@ class test_Query(unittest.TestCase):
         resp = List_query(self.test_config).run(ids)  # noqa: F405
         self.assertEqual(3, len(resp))
 
+    def test_13(self):
+        """Slow queries are logged with their SQL and parameters"""
+        self.test_config['DEFAULT']['SLOW_QUERY_SECONDS'] = "0"
+        Slow_query_log.clear()  # noqa: F405
+        Data_query(self.test_config).run(1)  # noqa: F405
+        entry = Slow_query_log.entries()[0]  # noqa: F405
+        self.assertEqual("Data_query", entry['query'])
+        self.assertEqual(12, entry['rows'])
+        self.assertIn("audiogram_experiment_id=1", entry['statements'][0]['sql'])
+
+    def test_14(self):
+        """Browse by parent method finds the experiments of its sub-methods"""
+        methods = All_measurement_methods_query(self.test_config).run()  # noqa: F405
+        parents = Parent_measurement_methods_query(self.test_config).run()  # noqa: F405
+        for parent in parents:
+            by_parent = Browse_query(self.test_config).run({'method': str(parent['method_id'])})  # noqa: F405
+            prefix = parent['method_name'] + ": "
+            expected = [m for m in methods if m['method_name'].startswith(prefix)]
+            self.assertEqual(len(expected) > 0, len(by_parent) > 0)
+            for audiogram in by_parent:
+                self.assertTrue(audiogram['measurement_method'].startswith(prefix))
+
+    def test_17(self):
+        """Each audiogram is counted once per facet"""
+        audiograms = Browse_query(self.test_config).run({})  # noqa: F405
+        facets = Browse_facets_query(self.test_config).run({'facets': ['medium']})  # noqa: F405
+        self.assertEqual(len(audiograms), sum(f['count'] for f in facets))
+
+
+class test_Query_without_database(unittest.TestCase):
+    """Tests without a database."""
+
+    def test_1(self):
+        """Results by column, as NumPy arrays"""
+        results = {
+            'headers': ['audiogram_experiment_id', 'sound_pressure_level_in_decibel', 'spl_reference_display_label'],
+            'results': [(1, Decimal('92.5'), "re 1 μPa"), (1, None, "re 1 μPa")]}
+        # no connection is needed to convert results
+        columns = Data_query(NO_DATABASE).columnize(results)  # noqa: F405
+        self.assertEqual([1, 1], columns['audiogram_experiment_id'].tolist())
+        self.assertEqual(92.5, columns['sound_pressure_level_in_decibel'][0])
+        self.assertTrue(math.isnan(columns['sound_pressure_level_in_decibel'][1]))
+        self.assertEqual("re 1 μPa", columns['spl_reference_display_label'][1])
+
+    def test_2(self):
+        """Browse joins the facility table only when filtering by facility"""
+        query = Browse_query(NO_DATABASE)  # noqa: F405
+        sql, values = query.build({'medium': "water", 'method': "1"}, ("1", "7"))
+        self.assertNotIn("facility", sql)
+        self.assertEqual(("1", "7"), values['method'])
+        self.assertEqual(("water",), values['medium'])
+        self.assertIsNone(values['facility'])
+        sql, values = query.build({'facility': "2,3", 'order_by': "unknown"})
+        self.assertIn("join facility on facility.id=exp.facility_id", sql)
+        self.assertIn("where\nfacility.id in %(facility)s", sql)
+        self.assertTrue(sql.endswith("order by species_name"))
+        # only the filter set has a value
+        self.assertEqual({'facility': ("2", "3")}, {name: value for name, value in values.items() if value is not None})
+
+    def test_3(self):
+        """Facets are read in one query and counted per experiment"""
+        query = Browse_facets_query(NO_DATABASE)  # noqa: F405
+        sql, values = query.build({'medium': "water", 'facets': ['sex', 'facility']})
+        self.assertEqual(1, sql.count("select"))
+        self.assertIn("left join facility", sql)
+        self.assertEqual(("water",), values['medium'])
+        rows = [(1, 'female', None, 2, 'Zoo'), (1, 'male', None, 2, 'Zoo'), (2, 'male', None, 3, 'Lab'),
+                (3, 'male', None, 2, 'Zoo')]
+        self.assertEqual([('sex', 'male', None, 3), ('sex', 'female', None, 1),
+                          ('facility', 2, 'Zoo', 2), ('facility', 3, 'Lab', 1)],
+                         query.count(['sex', 'facility'], rows))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,43 @@
+"""
+Tests of Request_profiler: phases, Server-Timing header and saved profiles.
+
+Created on 18.10.2026
+
+@author: agent for Museum fuer Naturkunde Berlin
+"""
+
+import os
+import tempfile
+import time
+import unittest
+# the Metrics module the profiler reads the timings from
+from API.Request_profiler import Request_profiler, Metrics
+
+
+class test_Request_profiler(unittest.TestCase):
+
+    def test_1(self):
+        """Phases are reported in the Server-Timing header, the profile is saved"""
+        with tempfile.TemporaryDirectory() as tmp:
+            profiler = Request_profiler(tmp).start()
+            Metrics.add_timing('db_connect', 0.002)
+            with Metrics.timed('db_execute'):
+                time.sleep(0.01)
+            header = profiler.stop()
+            self.assertTrue(header.startswith('db_connect;dur=2.00;desc="DB connect", db_execute;dur='))
+            self.assertIn('total;dur=', header)
+            self.assertNotIn('enqueue', header)
+            profile_id = profiler.save()
+            path = Request_profiler.path(tmp, profile_id)
+            self.assertTrue(os.path.exists(path))
+            self.assertIn("cumulative", Request_profiler.report(path, 5))
+
+    def test_2(self):
+        """Timings are only collected in profiled requests, profile ids are checked"""
+        Metrics.add_timing('db_connect', 1)
+        self.assertEqual({}, Metrics.stop_timings())
+        self.assertIsNone(Request_profiler.path("/tmp", "../../etc/passwd"))
+
+
+if __name__ == "__main__":
+    unittest.main()
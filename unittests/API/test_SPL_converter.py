@@ -7,7 +7,8 @@ Created on 06.05.2020
 """
 
 import unittest
-from API.SPL_converter import SPL_converter
+import numpy as np
+from API.SPL_converter import SPL_converter, converted_units
 
 
 class test_SPL_converter(unittest.TestCase):
@@ -25,6 +26,18 @@ class test_SPL_converter(unittest.TestCase):
         compat = SPL_converter().check(single)
         self.assertTrue(compat)
 
+    def test_2(self):
+        """Converted unit of each audiogram, 0 if not converted or mixed"""
+        columns = {
+            'audiogram_experiment_id': np.array([5, 2, 2, 3, 3, 4, 4]),
+            'sound_pressure_level_reference_id': np.array([4, 1, 1, 1, np.nan, 1, 4])
+        }
+        ids, units = converted_units(columns)
+        self.assertEqual([2, 3, 4, 5], ids.tolist())
+        self.assertEqual([1, 0, 0, 4], units.tolist())
+        columns['sound_pressure_level_reference_id'] = np.array([7] * 7)
+        self.assertEqual([0, 0, 0, 0], converted_units(columns)[1].tolist())
+
 
 if __name__ == "__main__":
     unittest.main()
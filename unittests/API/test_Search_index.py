@@ -0,0 +1,49 @@
+"""
+Tests of Search_index: prefix and fuzzy search over names and citations.
+
+Created on 18.10.2026
+
+@author: agent for Museum fuer Naturkunde Berlin
+"""
+
+import unittest
+from API.Search_index import Search_index, normalise
+
+ENTRIES = [
+    {'kind': 'taxon', 'id': 1, 'text': "Tursiops truncatus", 'detail': "species"},
+    {'kind': 'vernacular', 'id': 1, 'text': "Bottlenose dolphin", 'detail': "Tursiops truncatus"},
+    {'kind': 'vernacular', 'id': 2, 'text': "Harbour porpoise", 'detail': "Phocoena phocoena"},
+    {'kind': 'taxon', 'id': 3, 'text': "Delphinidae", 'detail': "family"},
+    {'kind': 'publication', 'id': 7, 'text': "Kastelein et al. 2002", 'detail': None},
+    {'kind': 'facility', 'id': 4, 'text': "Zoo Duisburg, Delfinarium", 'detail': None},
+    {'kind': 'publication', 'id': 8, 'text': "Möhl 1968", 'detail': None},
+    {'kind': 'facility', 'id': 5, 'text': None, 'detail': None}
+]
+
+
+class test_Search_index(unittest.TestCase):
+
+    def test_1(self):
+        """Prefix of any word, case and accent insensitive, name starts first"""
+        index = Search_index(ENTRIES)
+        self.assertEqual("mohl 1968", normalise("Möhl 1968"))
+        self.assertEqual([(1, 'Bottlenose dolphin')],
+                         [(r['id'], r['text']) for r in index.search("DOLPH") if r['match'] == 'prefix'])
+        self.assertEqual(['Delphinidae', 'Zoo Duisburg, Delfinarium'],
+                         [r['text'] for r in index.search("del") if r['match'] == 'prefix'])
+        self.assertEqual(8, index.search("möhl")[0]['id'])
+        self.assertEqual([], index.search(" ,"))
+
+    def test_2(self):
+        """Fuzzy matches follow prefix matches, kinds and limit are applied"""
+        index = Search_index(ENTRIES)
+        results = index.search("dolfin")
+        self.assertEqual('fuzzy', results[0]['match'])
+        self.assertEqual("Bottlenose dolphin", results[0]['text'])
+        self.assertLess(results[0]['score'], 1)
+        self.assertEqual(['taxon'], [r['kind'] for r in index.search("tursiops", kinds={'taxon'})])
+        self.assertEqual(1, len(index.search("d", limit=1)))
+
+
+if __name__ == "__main__":
+    unittest.main()
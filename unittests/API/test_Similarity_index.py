@@ -0,0 +1,86 @@
+"""
+Tests of Similarity_index: nearest audiograms by unit and taxa, incremental rebuilds.
+
+Created on 18.10.2026
+
+@author: agent for Museum fuer Naturkunde Berlin
+"""
+
+import unittest
+import numpy as np
+from API.Similarity_index import Similarity_index
+
+FREQUENCIES = [0.5, 1, 2, 4, 8, 16, 32, 64]
+CURVES = {
+    1: [90, 80, 70, 60, 60, 70, 80, 90],
+    2: [92, 82, 72, 62, 62, 72, 82, 92],
+    3: [100, 90, 80, 70, 70, 80, 90, 100],
+    4: [91, 81, 71, 61, 61, 71, 81, 91],
+    6: [90, 80, 70, 60, 60, 70, 80, 90]
+}
+"""Audiogram 2 is 2 dB above 1, 3 is 10 dB above 1, 4 is 1 dB above 1 but measured in air,
+6 is the same as 1 but without SPL reference."""
+REFERENCES = {1: 1, 2: 1, 3: 1, 4: 4, 6: None}
+EXPERIMENTS = [
+    {'id': 1, 'measurement_type': 'auditory threshold', 'taxon_id': 10},
+    {'id': 2, 'measurement_type': 'auditory threshold', 'taxon_id': 20},
+    {'id': 3, 'measurement_type': 'auditory threshold', 'taxon_id': 10},
+    {'id': 4, 'measurement_type': 'auditory threshold', 'taxon_id': 10},
+    {'id': 6, 'measurement_type': 'auditory threshold', 'taxon_id': 10}
+]
+
+
+def columns(ids):
+    return {
+        'audiogram_experiment_id': np.repeat(ids, len(FREQUENCIES)),
+        'testtone_frequency_in_khz': np.tile(FREQUENCIES, len(ids)),
+        'sound_pressure_level_in_decibel': np.concatenate([CURVES[id] for id in ids]).astype(float),
+        'sound_pressure_level_reference_id': np.repeat(
+            [np.nan if REFERENCES[id] is None else REFERENCES[id] for id in ids], len(FREQUENCIES))
+    }
+
+
+class test_Similarity_index(unittest.TestCase):
+
+    def test_1(self):
+        """Nearest audiograms, by unit and taxa, never audiograms whose unit is not converted"""
+        index = Similarity_index({id: 'h' for id in CURVES}, EXPERIMENTS, columns)
+        nearest = index.nearest(index.vector(1), 10, index.select(1), exclude=1)
+        self.assertEqual([2, 3], [id for id, distance, n in nearest])
+        self.assertAlmostEqual(2, nearest[0][1])
+        self.assertAlmostEqual(10, nearest[1][1])
+        self.assertEqual(1, len(index.nearest(index.vector(1), 1)))
+        nearest = index.nearest(index.vector(1), 10, index.select(taxa=[10]))
+        self.assertEqual([1, 4, 3], [id for id, distance, n in nearest])
+        self.assertEqual([1, 1, 1, 4, 0], index.unit.tolist())
+        # a curve measured at other frequencies
+        curve = np.interp(np.log10(index.grid), np.log10([0.5, 64]), [95, 95])
+        curve[np.log10(index.grid) > np.log10(32)] = np.nan
+        distances, overlap = index.distances(curve)
+        self.assertTrue((overlap == overlap[0]).all())
+        self.assertGreater(overlap[0], 5)
+
+    def test_2(self):
+        """Only changed audiograms are interpolated again"""
+        loaded = []
+
+        def load(ids):
+            loaded.append(ids)
+            return columns(ids)
+        first = Similarity_index({1: 'a', 2: 'a', 3: 'a'}, EXPERIMENTS, load)
+        CURVES[5] = CURVES[3]
+        REFERENCES[5] = 4
+        try:
+            second = Similarity_index({1: 'a', 2: 'b', 5: 'a'}, EXPERIMENTS, load, previous=first)
+        finally:
+            del CURVES[5], REFERENCES[5]
+        self.assertEqual([[1, 2, 3], [2, 5]], loaded)
+        self.assertEqual(2, second.updated)
+        np.testing.assert_array_equal(first.vector(1), second.vector(1))
+        np.testing.assert_allclose(first.vector(3), second.vector(5))
+        self.assertEqual([1, 1, 4], second.unit.tolist())
+        self.assertNotIn(3, second)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+"""
+Tests of Taxonomy_tree: nodes, subtrees and ancestors of the nested set.
+
+Created on 18.10.2026
+
+@author: agent for Museum fuer Naturkunde Berlin
+"""
+
+import unittest
+from API.Taxonomy_tree import Taxonomy_tree
+
+# Mammalia > Cetacea > (Delphinidae > Tursiops truncatus, Phocoenidae > Phocoena phocoena), ordered by unique_name
+ROWS = [
+    {'ott_id': 2, 'parent': 1, 'rank': "order", 'unique_name': "Cetacea", 'lft': 2, 'rgt': 11},
+    {'ott_id': 3, 'parent': 2, 'rank': "family", 'unique_name': "Delphinidae", 'lft': 3, 'rgt': 6},
+    {'ott_id': 1, 'parent': None, 'rank': "class", 'unique_name': "Mammalia", 'lft': 1, 'rgt': 12},
+    {'ott_id': 6, 'parent': 5, 'rank': "species", 'unique_name': "Phocoena phocoena", 'lft': 8, 'rgt': 9},
+    {'ott_id': 5, 'parent': 2, 'rank': "family", 'unique_name': "Phocoenidae", 'lft': 7, 'rgt': 10},
+    {'ott_id': 4, 'parent': 3, 'rank': "species", 'unique_name': "Tursiops truncatus", 'lft': 4, 'rgt': 5}
+]
+
+
+class test_Taxonomy_tree(unittest.TestCase):
+
+    def test_1(self):
+        """Nodes are returned as by Taxonomy_query, subtrees with their depth and as ott_ids"""
+        tree = Taxonomy_tree(ROWS)
+        self.assertEqual(ROWS, tree.nodes())
+        self.assertEqual([(2, 0), (3, 1), (4, 2), (5, 1), (6, 2)],
+                         [(n['ott_id'], n['depth']) for n in tree.subtree(2)])
+        self.assertEqual([3, 5], [n['ott_id'] for n in tree.subtree(2, depth=1)][1:])
+        self.assertEqual([4], [n['ott_id'] for n in tree.subtree(4)])
+        self.assertEqual([2, 3, 4, 5, 6], tree.subtree_ids(2))
+        self.assertEqual([3, 4], tree.subtree_ids(3, depth=1))
+
+    def test_2(self):
+        """Ancestors from the root, nested tree with a depth limit"""
+        tree = Taxonomy_tree(ROWS)
+        self.assertEqual(["Mammalia", "Cetacea", "Phocoenidae"], [n['unique_name'] for n in tree.ancestors(6)])
+        self.assertEqual([], tree.ancestors(1))
+        root = tree.tree(1, depth=2)
+        self.assertEqual("Mammalia", root['unique_name'])
+        self.assertEqual(["Delphinidae", "Phocoenidae"],
+                         [n['unique_name'] for n in root['children'][0]['children']])
+        self.assertEqual([], root['children'][0]['children'][0]['children'])
+        self.assertNotIn(7, tree)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+"""
+Tests of Threshold_matrix: interpolation on the log frequency grid and caching.
+
+Created on 18.10.2026
+
+@author: agent for Museum fuer Naturkunde Berlin
+"""
+
+import unittest
+import numpy as np
+from API.Threshold_matrix import Threshold_matrix, interpolate, log_grid
+
+COLUMNS = {
+    'audiogram_experiment_id': np.array([2, 2, 2, 2, 5, 5]),
+    'testtone_frequency_in_khz': np.array([1, 100, 10, 10, 0.1, 1000]),
+    'sound_pressure_level_in_decibel': np.array([80, 60, 30, 50, 90, 90])
+}
+"""Audiogram 2 from 1 to 100 kHz, measured twice at 10 kHz, audiogram 5 flat from 0.1 to 1000 kHz."""
+
+
+class test_Threshold_matrix(unittest.TestCase):
+
+    def test_1(self):
+        """Interpolation on a log frequency scale, missing outside the tested frequencies"""
+        grid = log_grid(0.1, 1000, 9)
+        self.assertAlmostEqual(np.sqrt(10), grid[3])
+        ids, matrix = interpolate(COLUMNS, grid)
+        self.assertEqual([2, 5], ids.tolist())
+        expected = [np.nan, np.nan, 80, 60, 40, 50, 60, np.nan, np.nan]
+        np.testing.assert_allclose(expected, matrix[0])
+        np.testing.assert_allclose([90] * 9, matrix[1])
+        with self.assertRaises(ValueError):
+            log_grid(10, 1, 5)
+
+    def test_2(self):
+        """Vectors are cached by audiogram, version and grid"""
+        loaded = []
+
+        def load(ids):
+            loaded.append(ids)
+            return COLUMNS
+        matrix = Threshold_matrix(size=10)
+        grid = log_grid(1, 100, 3)
+        m = matrix.matrix([5, 2, 7], grid, {2: 'a', 5: 'b'}, load)
+        np.testing.assert_allclose([[90, 90, 90], [80, 40, 60]], m[:2])
+        self.assertTrue(np.isnan(m[2]).all())
+        matrix.matrix([2, 7], grid, {2: 'a'}, load)
+        matrix.matrix([2], grid, {2: 'changed'}, load)
+        self.assertEqual([[2, 5, 7], [2]], loaded)
+
+
+if __name__ == "__main__":
+    unittest.main()
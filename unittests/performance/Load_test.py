@@ -0,0 +1,310 @@
+"""
+Load test: replay realistic API traffic against a running instance.
+
+Sends a weighted mix of requests to the API, or replays the requests of an access log,
+from several concurrent clients. Plots are requested like the frontend does:
+/api/v1/plot, then /status is polled until the image is ready.
+Reports throughput, error rate and p50/p95/p99 latency per endpoint.
+
+Audiogram and taxon ids are read from the instance, so this works with any database,
+e.g. a synthetic one (see Synthetic_db). Only the instance under test is contacted.
+
+Usage:
+    python Load_test.py --url http://localhost:9082 --concurrency 8 --duration 60
+    python Load_test.py --mix browse=5,plot=1 --requests 500 --json results.json
+    python Load_test.py --log access.log --concurrency 4
+
+Created on 18.10.2026
+
+@author: agent for Museum fuer Naturkunde Berlin
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+import requests
+
+
+MIX = {
+    'browse': 20,
+    'list': 10,
+    'audiogram': 20,
+    'experiment': 15,
+    'download': 5,
+    'plot': 20,
+    'taxonomy': 10
+}
+"""Default share of each scenario in the traffic."""
+
+LOG_REQUEST = re.compile(r'"(GET|HEAD) (\S+) HTTP/[0-9.]+"')
+"""Request line of a common or combined log format entry."""
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of a list of numbers, None if the list is empty."""
+    if len(values) == 0:
+        return None
+    ordered = sorted(values)
+    rank = max(1, int(-(-p * len(ordered) // 100)))
+    return ordered[rank - 1]
+
+
+def endpoint_name(path):
+    """Name of the endpoint of a request path, e.g. 'browse' for /api/v1/browse?taxon=1."""
+    path = urlsplit(path).path
+    if path.startswith('/status'):
+        return 'status'
+    return path.rstrip('/').split('/')[-1] or '/'
+
+
+def read_log(path):
+    """
+    Read the requested paths from an access log, in common or combined log format.
+
+    @return: list of paths with query string, e.g. /api/v1/audiogram?id=1
+    """
+    paths = []
+    with open(path) as f:
+        for line in f:
+            match = LOG_REQUEST.search(line)
+            if match:
+                paths.append(match.group(2))
+    return paths
+
+
+class Recorder:
+    """Collects latencies and errors per endpoint, from several threads."""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.scenarios = set()
+        """Timings of a sequence of requests, not counted in the total."""
+        self._lock = threading.Lock()
+        self.start = time.perf_counter()
+        self.end = None
+
+    def add(self, endpoint, seconds, error, request=True):
+        with self._lock:
+            if not request:
+                self.scenarios.add(endpoint)
+            self.latencies.setdefault(endpoint, []).append(seconds * 1000)
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + (1 if error else 0)
+
+    def report(self):
+        """
+        Summary per endpoint, and for all requests.
+
+        @return: list of dict with endpoint, requests, errors, error_rate, throughput (req/s)
+        and p50, p95, p99, max (ms)
+        """
+        elapsed = (self.end or time.perf_counter()) - self.start
+        rows = []
+        everything = []
+        for endpoint in sorted(self.latencies):
+            latencies = self.latencies[endpoint]
+            if endpoint not in self.scenarios:
+                everything += latencies
+            rows.append(self._row(endpoint, latencies, self.errors[endpoint], elapsed))
+        errors = sum(e for endpoint, e in self.errors.items() if endpoint not in self.scenarios)
+        rows.append(self._row('total', everything, errors, elapsed))
+        return rows
+
+    def _row(self, endpoint, latencies, errors, elapsed):
+        return {
+            'endpoint': endpoint,
+            'requests': len(latencies),
+            'errors': errors,
+            'error_rate': errors / len(latencies) if latencies else 0,
+            'throughput': len(latencies) / elapsed if elapsed > 0 else 0,
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+            'max': max(latencies) if latencies else None
+        }
+
+
+class Load_test:
+    """Sends the requests of the scenarios, and records their latency."""
+
+    def __init__(self, url, recorder, timeout=30, poll_interval=0.25, plot_timeout=60, seed=None):
+        """
+        @param url: base URL of the API instance, e.g. http://localhost:9082
+        @param recorder: Recorder
+        @param timeout: seconds to wait for a response
+        @param poll_interval: seconds between two /status requests
+        @param plot_timeout: seconds to wait for a plot, before counting it as an error
+        """
+        self.url = url.rstrip('/')
+        self.recorder = recorder
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.plot_timeout = plot_timeout
+        self.rnd = random.Random(seed)
+        self.ids = []
+        self.taxa = []
+        self._local = threading.local()
+
+    def discover(self):
+        """Read the audiogram and taxon ids of the instance, these are not recorded."""
+        session = self._session()
+        self.ids = [a['id'] for a in session.get(self.url + "/api/v1/browse", timeout=self.timeout).json()]
+        self.taxa = [t['ott_id'] for t in session.get(self.url + "/api/v1/all_species", timeout=self.timeout).json()]
+        if len(self.ids) == 0:
+            raise Exception("The instance has no audiograms.")
+
+    def get(self, path, params=None, endpoint=None):
+        """
+        Send a GET request and record its latency.
+
+        @return: requests.Response, None if the request failed
+        """
+        endpoint = endpoint or endpoint_name(path)
+        start = time.perf_counter()
+        try:
+            response = self._session().get(self.url + path, params=params, timeout=self.timeout)
+            # read the whole body, as a client does
+            response.content
+        except requests.RequestException:
+            self.recorder.add(endpoint, time.perf_counter() - start, True)
+            return None
+        self.recorder.add(endpoint, time.perf_counter() - start, response.status_code >= 400)
+        return response
+
+    def run(self, scenario):
+        """Run a scenario by name, see MIX."""
+        getattr(self, '_' + scenario)()
+
+    def replay(self, path):
+        """Replay a request from an access log."""
+        self.get(path)
+
+    def _browse(self):
+        params = self.rnd.choice([
+            {},
+            {'taxon': self.rnd.choice(self.taxa)} if self.taxa else {},
+            {'medium': self.rnd.choice(['water', 'air'])},
+            {'order_by': self.rnd.choice(['citation_short', 'species_name', 'measurement_method'])}])
+        self.get("/api/v1/browse", params)
+
+    def _list(self):
+        ids = self.rnd.sample(self.ids, min(len(self.ids), self.rnd.randint(1, 5)))
+        self.get("/api/v1/list", {'ids': ",".join(str(id) for id in ids)})
+
+    def _audiogram(self):
+        self.get("/api/v1/audiogram", {'id': self.rnd.choice(self.ids)})
+
+    def _experiment(self):
+        self.get("/api/v1/experiment", {'id': self.rnd.choice(self.ids)})
+
+    def _download(self):
+        self.get("/api/v1/download", {'id': self.rnd.choice(self.ids)})
+
+    def _taxonomy(self):
+        self.get("/api/v1/taxonomy")
+
+    def _plot(self):
+        """Request a plot and poll its status until the image is ready, as the frontend does."""
+        start = time.perf_counter()
+        response = self.get("/api/v1/plot", {'id': self.rnd.choice(self.ids)})
+        ok = response is not None and response.status_code < 400
+        if ok and response.status_code == 202:
+            location = urlsplit(response.json()['Location'])
+            status_path = location.path + ("?" + location.query if location.query else "")
+            ok = False
+            while time.perf_counter() - start < self.plot_timeout:
+                time.sleep(self.poll_interval)
+                status = self.get(status_path, endpoint='status')
+                if status is None or status.status_code >= 400:
+                    break
+                state = status.json().get('state')
+                if state in ('SUCCESS', 'FAILURE'):
+                    ok = state == 'SUCCESS'
+                    break
+        # time until the image URL is known
+        self.recorder.add('plot (image ready)', time.perf_counter() - start, not ok, request=False)
+
+    def _session(self):
+        """One HTTP session per thread, connections are kept alive as in a browser."""
+        if not hasattr(self._local, 'session'):
+            self._local.session = requests.Session()
+        return self._local.session
+
+
+def parse_mix(value):
+    """Parse a traffic mix like 'browse=5,plot=1'."""
+    mix = {}
+    for part in value.split(','):
+        name, weight = part.split('=')
+        if name not in MIX:
+            raise argparse.ArgumentTypeError("unknown scenario %s, choose from %s" % (name, ", ".join(MIX)))
+        mix[name] = float(weight)
+    return mix
+
+
+def print_report(rows):
+    print("%-22s %8s %7s %7s %9s %9s %9s %9s %9s" % (
+        "endpoint", "requests", "errors", "err %", "req/s", "p50 ms", "p95 ms", "p99 ms", "max ms"))
+    for r in rows:
+        print("%-22s %8d %7d %7.1f %9.1f %9.1f %9.1f %9.1f %9.1f" % (
+            r['endpoint'], r['requests'], r['errors'], 100 * r['error_rate'], r['throughput'],
+            r['p50'] or 0, r['p95'] or 0, r['p99'] or 0, r['max'] or 0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay API traffic against a running instance.")
+    parser.add_argument('--url', default="http://localhost:9082", help="base URL of the instance under test")
+    parser.add_argument('--concurrency', type=int, default=4, help="number of concurrent clients")
+    parser.add_argument('--requests', type=int, default=1000, help="number of scenarios to run")
+    parser.add_argument('--duration', type=float, help="run for this many seconds, instead of a number of requests")
+    parser.add_argument('--mix', type=parse_mix, default=MIX, help="traffic mix, e.g. browse=5,plot=1")
+    parser.add_argument('--log', help="replay the requests of this access log, instead of the mix")
+    parser.add_argument('--timeout', type=float, default=30, help="seconds to wait for a response")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help="write the report to this file")
+    args = parser.parse_args()
+
+    recorder = Recorder()
+    test = Load_test(args.url, recorder, timeout=args.timeout, seed=args.seed)
+    if args.log:
+        paths = read_log(args.log)
+        jobs = iter([(test.replay, p) for p in paths])
+    else:
+        test.discover()
+        names = sorted(args.mix)
+        weights = [args.mix[n] for n in names]
+        count = range(args.requests) if args.duration is None else iter(int, 1)
+        jobs = ((test.run, test.rnd.choices(names, weights)[0]) for i in count)
+
+    lock = threading.Lock()
+    deadline = None if args.duration is None else time.perf_counter() + args.duration
+
+    def client():
+        while deadline is None or time.perf_counter() < deadline:
+            with lock:
+                job = next(jobs, None)
+            if job is None:
+                return
+            job[0](job[1])
+
+    recorder.start = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        for future in [pool.submit(client) for i in range(args.concurrency)]:
+            future.result()
+    recorder.end = time.perf_counter()
+
+    rows = recorder.report()
+    print_report(rows)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'url': args.url, 'concurrency': args.concurrency,
+                       'seconds': recorder.end - recorder.start, 'endpoints': rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,590 @@
+"""
+Synthetic audiogram database, for testing queries and endpoints at scale.
+
+Fills the complete schema used by the API queries with random, but realistic data:
+a taxonomic tree stored as nested sets, publications, facilities, methods,
+SPL references, animals, experiments and data points.
+The same seed and scale always produce the same database.
+
+Scale 1 has about 300 audiograms with 6,000 data points, scale 160 has about 1M data points.
+
+Usage (from /src):
+    PYTHONPATH=.:API python ../unittests/performance/Synthetic_db.py --scale 10 --database synthdb
+    PYTHONPATH=.:API python ../unittests/performance/Synthetic_db.py --scale 1 --database testdb --replace
+
+Run the benchmarks against the synthetic database with BENCH_DATABASE=synthdb, see conftest.db_config.
+
+Created on 18.10.2026
+
+@author: agent for Museum fuer Naturkunde Berlin
+"""
+
+import argparse
+import configparser
+import itertools
+import math
+import random
+import time
+import pymysql
+from API.SPL_converter import SPL_converter
+
+
+SCHEMA = [
+    """
+    create table if not exists taxon (
+        ott_id int not null primary key,
+        parent int,
+        `rank` varchar(32),
+        unique_name varchar(255) not null,
+        vernacular_name_english varchar(255),
+        vernacular_name_german varchar(255),
+        lft int not null,
+        rgt int not null
+    ) default charset=utf8mb4
+    """,
+    """
+    create table if not exists facility (
+        id int not null primary key,
+        name varchar(255) not null
+    ) default charset=utf8mb4
+    """,
+    """
+    create table if not exists publication (
+        id int not null primary key,
+        citation_short varchar(255),
+        citation_long text,
+        DOI varchar(255)
+    ) default charset=utf8mb4
+    """,
+    """
+    create table if not exists method (
+        id int not null primary key,
+        denomination varchar(255) not null,
+        parent_method_id int
+    ) default charset=utf8mb4
+    """,
+    """
+    create table if not exists sound_pressure_level_reference (
+        id int not null primary key,
+        spl_reference_value double,
+        spl_reference_unit varchar(64),
+        spl_reference_significance varchar(255),
+        conversion_factor_airborne_sound_in_decibel varchar(8),
+        conversion_factor_waterborne_sound_in_decibel varchar(8),
+        spl_reference_display_label varchar(64)
+    ) default charset=utf8mb4
+    """,
+    """
+    create table if not exists audiogram_experiment (
+        id int not null primary key,
+        facility_id int,
+        measurement_method_id int,
+        testtone_form_method_id int,
+        latitude_in_decimal_degree decimal(9,6),
+        longitude_in_decimal_degree decimal(9,6),
+        position_of_animal varchar(255),
+        distance_to_sound_source_in_meter decimal(8,2),
+        test_environment_description text,
+        medium varchar(16),
+        position_first_electrode varchar(255),
+        position_second_electrode varchar(255),
+        position_third_electrode varchar(255),
+        year_of_experiment_start int,
+        year_of_experiment_end int,
+        background_noise_in_decibel decimal(6,1),
+        calibration varchar(255),
+        threshold_determination_method varchar(64),
+        testtone_presentation_staircase varchar(16),
+        testtone_presentation_method_constants varchar(16),
+        testtone_presentation_sound_form varchar(64),
+        sedated varchar(16),
+        sedation_details text,
+        number_of_measurements int,
+        measurement_type varchar(64)
+    ) default charset=utf8mb4
+    """,
+    """
+    create table if not exists audiogram_publication (
+        audiogram_experiment_id int not null,
+        publication_id int not null,
+        primary key (audiogram_experiment_id, publication_id)
+    ) default charset=utf8mb4
+    """,
+    """
+    create table if not exists individual_animal (
+        id int not null primary key,
+        taxon_id int not null,
+        individual_name varchar(255),
+        sex varchar(16)
+    ) default charset=utf8mb4
+    """,
+    """
+    create table if not exists test_animal (
+        id int not null primary key,
+        audiogram_experiment_id int not null,
+        individual_animal_id int not null,
+        life_stage varchar(32),
+        age_min_in_month decimal(6,1),
+        age_max_in_month decimal(6,1),
+        liberty_status varchar(32),
+        captivity_duration_in_month int,
+        biological_season varchar(64)
+    ) default charset=utf8mb4
+    """,
+    """
+    create table if not exists audiogram_data_point (
+        id int not null primary key,
+        audiogram_experiment_id int not null,
+        testtone_frequency_in_khz decimal(10,3),
+        sound_pressure_level_in_decibel decimal(6,1),
+        sound_pressure_level_reference_id int,
+        sound_pressure_level_reference_method varchar(64),
+        testtone_duration_in_millisecond decimal(8,1)
+    ) default charset=utf8mb4
+    """
+]
+"""Tables read by the API queries, inferred from Query.py. Column order of audiogram_data_point matters."""
+
+TAXONOMY = (
+    "Animalia", "kingdom", "animals", [
+        ("Chordata", "phylum", "chordates", [
+            ("Mammalia", "class", "mammals", [
+                ("Cetacea", "order", "whales", [
+                    ("Delphinidae", "family", "oceanic dolphins", 'cetacean'),
+                    ("Monodontidae", "family", "narwhal and beluga", 'cetacean'),
+                    ("Phocoenidae", "family", "porpoises", 'cetacean'),
+                    ("Ziphiidae", "family", "beaked whales", 'cetacean')]),
+                ("Carnivora", "order", "carnivores", [
+                    ("Odobenidae", "family", "walruses", 'seal'),
+                    ("Otariidae", "family", "eared seals", 'seal'),
+                    ("Phocidae", "family", "true seals", 'seal'),
+                    ("Mustelidae", "family", "mustelids", 'mammal')]),
+                ("Sirenia", "order", "sea cows", [
+                    ("Trichechidae", "family", "manatees", 'sirenian')]),
+                ("Rodentia", "order", "rodents", [
+                    ("Muridae", "family", "mice and rats", 'mammal')]),
+                ("Chiroptera", "order", "bats", [
+                    ("Vespertilionidae", "family", "vesper bats", 'bat')])]),
+            ("Aves", "class", "birds", [
+                ("Passeriformes", "order", "perching birds", [
+                    ("Fringillidae", "family", "finches", 'bird'),
+                    ("Paridae", "family", "tits", 'bird')]),
+                ("Strigiformes", "order", "owls", [
+                    ("Strigidae", "family", "true owls", 'bird')]),
+                ("Sphenisciformes", "order", "penguins", [
+                    ("Spheniscidae", "family", "penguins", 'bird')])]),
+            ("Reptilia", "class", "reptiles", [
+                ("Testudines", "order", "turtles", [
+                    ("Cheloniidae", "family", "sea turtles", 'turtle')]),
+                ("Squamata", "order", "scaled reptiles", [
+                    ("Gekkonidae", "family", "geckos", 'reptile')])]),
+            ("Actinopteri", "class", "ray-finned fishes", [
+                ("Cypriniformes", "order", "carps", [
+                    ("Cyprinidae", "family", "carps", 'fish')]),
+                ("Perciformes", "order", "perch-like fishes", [
+                    ("Sciaenidae", "family", "drums", 'fish'),
+                    ("Gobiidae", "family", "gobies", 'fish')]),
+                ("Gadiformes", "order", "cods", [
+                    ("Gadidae", "family", "cods", 'fish')])])])])
+"""Backbone of the taxonomic tree: (name, rank, vernacular name, children or hearing group)."""
+
+GROUPS = {
+    # group: (weight, lowest and highest frequency range in kHz, best threshold range in dB, share in water)
+    'cetacean': (30, (0.1, 2), (80, 180), (40, 70), 1.0),
+    'seal': (20, (0.05, 0.2), (30, 80), (50, 80), 0.6),
+    'sirenian': (2, (0.2, 0.5), (20, 50), (50, 65), 1.0),
+    'mammal': (6, (0.05, 0.5), (30, 90), (-10, 20), 0.0),
+    'bat': (4, (1, 5), (100, 150), (-10, 20), 0.0),
+    'bird': (12, (0.05, 0.3), (6, 12), (0, 25), 0.0),
+    'turtle': (3, (0.05, 0.1), (0.8, 2), (70, 100), 0.5),
+    'reptile': (2, (0.05, 0.2), (2, 5), (20, 50), 0.0),
+    'fish': (21, (0.02, 0.1), (0.8, 4), (70, 110), 1.0),
+}
+"""Hearing characteristics and share of audiograms of each hearing group."""
+
+MEASUREMENT_METHODS = {
+    'behavioral': ["go/no-go", "two-alternative forced choice", "conditioned response", "staircase"],
+    'electrophysiological': ["ABR", "AEP", "ASSR", "cochlear microphonics"]
+}
+"""Parent and child measurement methods."""
+TONE_METHODS = ["cosine-gated tone bursts", "pure tone", "frequency-modulated tone", "click"]
+"""Test tone forms."""
+
+UNITS_WATER = ((1, 0.85), (2, 0.06), (3, 0.04), (6, 0.05))
+"""SPL reference ids of waterborne audiograms, with frequency."""
+UNITS_AIR = ((4, 0.9), (5, 0.1))
+"""SPL reference ids of airborne audiograms, with frequency."""
+DISPLAY_LABELS = {1: "re 1 μPa", 2: "re 1 μbar", 3: "re 1 mPa", 4: "re 20 μPa",
+                  5: "re 0.0002 dyne/cm<sup>2</sup>", 6: "re 1 dyne/cm<sup>2</sup>", 7: "re 0.0002 μbar"}
+"""Display labels of the SPL references."""
+
+SYLLABLES = ["ba", "ce", "del", "phi", "mo", "no", "ra", "ta", "lu", "ser", "chel", "go", "ca",
+             "tri", "pho", "cae", "sten", "lag", "ori", "pse", "gram", "xo", "ni", "us"]
+"""Syllables of made-up Latin names."""
+SURNAMES = ["Au", "Kastelein", "Johnson", "Nachtigall", "Popper", "Fay", "Dooling", "Heffner",
+            "Schusterman", "Reichmuth", "Mooney", "Szymanski", "Wolski", "Southall", "Finneran"]
+"""Authors of made-up publications."""
+
+EXPERIMENT_COLUMNS = [
+    'id', 'facility_id', 'measurement_method_id', 'testtone_form_method_id',
+    'latitude_in_decimal_degree', 'longitude_in_decimal_degree', 'position_of_animal',
+    'distance_to_sound_source_in_meter', 'test_environment_description', 'medium',
+    'position_first_electrode', 'position_second_electrode', 'position_third_electrode',
+    'year_of_experiment_start', 'year_of_experiment_end', 'background_noise_in_decibel',
+    'calibration', 'threshold_determination_method', 'testtone_presentation_staircase',
+    'testtone_presentation_method_constants', 'testtone_presentation_sound_form',
+    'sedated', 'sedation_details', 'number_of_measurements', 'measurement_type']
+"""Columns of audiogram_experiment, in the order of Synthetic_db._experiments."""
+
+EXPERIMENTS = 300
+"""Audiograms at scale 1."""
+BATCH = 5000
+"""Rows per bulk insert."""
+
+
+class Synthetic_db:
+    """Generates the rows of all tables, see SCHEMA."""
+
+    def __init__(self, scale=1.0, seed=42):
+        """
+        @param scale: float, scale factor, the number of audiograms is proportional to it
+        @param seed: int, random seed
+        """
+        self.scale = scale
+        self.seed = seed
+        self.rnd = random.Random(seed)
+        self.experiments = max(1, int(round(EXPERIMENTS * scale)))
+        # grows slower than the number of audiograms, as in the real data
+        self.species = max(len(GROUPS), int(round(60 * math.sqrt(scale))))
+        self.publications = max(1, self.experiments // 3)
+        self.facilities = max(1, int(round(20 * math.sqrt(scale))))
+        self._names = set()
+
+    def tables(self):
+        """
+        Generate all tables.
+
+        Data points are generated lazily, as they are inserted.
+
+        @return: dict, table name: (list of column names, iterable of row tuples)
+        """
+        taxa, species = self._taxa()
+        methods = self._methods()
+        experiments, groups = self._experiments(methods)
+        animals, test_animals = self._animals(species, experiments, groups)
+        return {
+            'taxon': (['ott_id', 'parent', 'rank', 'unique_name', 'vernacular_name_english',
+                       'vernacular_name_german', 'lft', 'rgt'], taxa),
+            'facility': (['id', 'name'], self._facilities()),
+            'publication': (['id', 'citation_short', 'citation_long', 'DOI'], self._publications()),
+            'method': (['id', 'denomination', 'parent_method_id'], methods),
+            'sound_pressure_level_reference': (
+                ['id', 'spl_reference_value', 'spl_reference_unit', 'spl_reference_significance',
+                 'conversion_factor_airborne_sound_in_decibel', 'conversion_factor_waterborne_sound_in_decibel',
+                 'spl_reference_display_label'], self._spl_references()),
+            'audiogram_experiment': (EXPERIMENT_COLUMNS, experiments),
+            'audiogram_publication': (['audiogram_experiment_id', 'publication_id'],
+                                      self._audiogram_publications()),
+            'individual_animal': (['id', 'taxon_id', 'individual_name', 'sex'], animals),
+            'test_animal': (['id', 'audiogram_experiment_id', 'individual_animal_id', 'life_stage',
+                             'age_min_in_month', 'age_max_in_month', 'liberty_status',
+                             'captivity_duration_in_month', 'biological_season'], test_animals),
+            'audiogram_data_point': (['id', 'audiogram_experiment_id', 'testtone_frequency_in_khz',
+                                      'sound_pressure_level_in_decibel', 'sound_pressure_level_reference_id',
+                                      'sound_pressure_level_reference_method', 'testtone_duration_in_millisecond'],
+                                     self._data_points(experiments, groups))
+        }
+
+    def create(self, connection, replace=False):
+        """Create the tables, if they do not exist. Existing tables are dropped if replace is set."""
+        with connection.cursor() as cursor:
+            for ddl in SCHEMA:
+                if replace:
+                    cursor.execute("drop table if exists %s" % ddl.split()[5])
+                cursor.execute(ddl)
+        connection.commit()
+
+    def load(self, connection, batch=BATCH):
+        """
+        Insert all rows with bulk inserts.
+
+        @return: dict, table name: number of rows inserted
+        """
+        counts = {}
+        with connection.cursor() as cursor:
+            cursor.execute("set unique_checks=0, foreign_key_checks=0")
+            for table, (columns, rows) in self.tables().items():
+                statement = "insert into %s (%s) values (%s)" % (
+                    table, ",".join("`%s`" % c for c in columns), ",".join(["%s"] * len(columns)))
+                rows = iter(rows)
+                counts[table] = 0
+                # pymysql turns executemany into multi-row inserts
+                for chunk in iter(lambda: list(itertools.islice(rows, batch)), []):
+                    cursor.executemany(statement, chunk)
+                    counts[table] += len(chunk)
+                connection.commit()
+            cursor.execute("set unique_checks=1, foreign_key_checks=1")
+        return counts
+
+    def _taxa(self):
+        """
+        Taxonomic tree: the backbone, with generated genera, species and subspecies in each family.
+
+        @return: tuple (list of taxon rows, list of (ott_id, hearing group) of species and subspecies)
+        """
+        families = []
+
+        def collect(node):
+            name, rank, vernacular, children = node
+            if isinstance(children, str):
+                families.append((name, children))
+            else:
+                for c in children:
+                    collect(c)
+        collect(TAXONOMY)
+
+        # spread species over families by the share of audiograms of their hearing group
+        weights = [GROUPS[group][0] / sum(1 for f in families if f[1] == group) for name, group in families]
+        genera = {name: [] for name, group in families}
+        for i in range(self.species):
+            family = self.rnd.choices(families, weights)[0][0]
+            if len(genera[family]) == 0 or self.rnd.random() < 0.4:
+                genera[family].append([])
+            genera[family][-1].append(i)
+
+        ott_ids = itertools.count(1000)
+        rows = []
+        species = []
+        counter = itertools.count(1)
+
+        def add(name, rank, vernacular, parent, children, group):
+            """Add a node and its subtree, numbering nested sets in depth first order."""
+            ott_id = next(ott_ids)
+            lft = next(counter)
+            index = len(rows)
+            rows.append(None)
+            if rank in ('species', 'subspecies'):
+                species.append((ott_id, group))
+            if isinstance(children, str):
+                # family: generated genera
+                for members in genera[name]:
+                    genus = self._latin(capitalize=True)
+                    add(genus, 'genus', None, ott_id, [('species', genus)] * len(members), children)
+            else:
+                for child in children:
+                    if child[0] == 'species':
+                        epithet = "%s %s" % (child[1], self._latin())
+                        subspecies = [('subspecies', epithet)] if self.rnd.random() < 0.1 else []
+                        add(epithet, 'species', self._vernacular(), ott_id, subspecies, group)
+                    elif child[0] == 'subspecies':
+                        add("%s %s" % (child[1], self._latin()), 'subspecies', self._vernacular(), ott_id, [], group)
+                    else:
+                        add(*child[:3], ott_id, child[3], group)
+            rgt = next(counter)
+            rows[index] = (ott_id, parent, rank, name, vernacular, None, lft, rgt)
+        add(*TAXONOMY[:3], None, TAXONOMY[3], None)
+        return rows, species
+
+    def _latin(self, capitalize=False):
+        """A new made-up Latin name."""
+        while True:
+            name = "".join(self.rnd.choices(SYLLABLES, k=self.rnd.randint(2, 4)))
+            name = name + self.rnd.choice(["us", "a", "is", "ensis", "i"])
+            if name not in self._names:
+                self._names.add(name)
+                return name.capitalize() if capitalize else name
+
+    def _vernacular(self):
+        return "%s %s" % (self.rnd.choice(["common", "lesser", "greater", "spotted", "northern", "southern"]),
+                          self._latin())
+
+    def _facilities(self):
+        return [(i + 1, "%s %s" % (self.rnd.choice(["Marine Research Station", "Zoo", "Aquarium", "University of"]),
+                                   self._latin(capitalize=True)))
+                for i in range(self.facilities)]
+
+    def _publications(self):
+        rows = []
+        for i in range(self.publications):
+            authors = self.rnd.sample(SURNAMES, self.rnd.randint(1, 4))
+            year = self.rnd.randint(1960, 2020)
+            if len(authors) == 1:
+                short = "%s, %d" % (authors[0], year)
+            elif len(authors) == 2:
+                short = "%s & %s, %d" % (authors[0], authors[1], year)
+            else:
+                short = "%s et al., %d" % (authors[0], year)
+            doi = "10.1121/synthetic.%d" % (i + 1)
+            long = "%s (%d). Hearing of %s. The Journal of the Acoustical Society of America, %d, %d-%d. doi:%s" % (
+                ", ".join(authors), year, self._latin(), self.rnd.randint(1, 150),
+                self.rnd.randint(1, 900), self.rnd.randint(901, 1800), doi)
+            rows.append((i + 1, short, long, doi))
+        return rows
+
+    def _methods(self):
+        rows = []
+        for parent, children in MEASUREMENT_METHODS.items():
+            parent_id = len(rows) + 1
+            rows.append((parent_id, parent, None))
+            rows += [(parent_id + i + 1, child, parent_id) for i, child in enumerate(children)]
+        rows += [(len(rows) + i + 1, tone, None) for i, tone in enumerate(TONE_METHODS)]
+        return rows
+
+    def _spl_references(self):
+        rows = []
+        for r in SPL_converter().sound_pressure_level_reference:
+            rows.append((r['id'], r['spl_reference_value'], r['spl_reference_unit'], r['spl_reference_significance'],
+                         r.get('conversion_factor_airborne_sound_in_decibel'),
+                         r.get('conversion_factor_waterborne_sound_in_decibel'),
+                         DISPLAY_LABELS[r['id']]))
+        return rows
+
+    def _experiments(self, methods):
+        """
+        @return: tuple (list of experiment rows, list of hearing group of each experiment)
+        """
+        measurement = [m[0] for m in methods if m[2] is not None]
+        tone = [m[0] for m in methods if m[1] in TONE_METHODS]
+        names = list(GROUPS)
+        weights = [GROUPS[g][0] for g in names]
+        rows = []
+        groups = []
+        for i in range(self.experiments):
+            group = self.rnd.choices(names, weights)[0]
+            water = self.rnd.random() < GROUPS[group][4]
+            method = self.rnd.choice(measurement)
+            electro = method > len(MEASUREMENT_METHODS['behavioral']) + 1
+            start = self.rnd.randint(1960, 2019)
+            rows.append((
+                i + 1, self.rnd.randint(1, self.facilities), method, self.rnd.choice(tone),
+                round(self.rnd.uniform(-60, 70), 6), round(self.rnd.uniform(-180, 180), 6),
+                self.rnd.choice(["underwater", "head above water", "in air", "stationed"]),
+                round(self.rnd.uniform(0.5, 10), 2), "pool" if water else "sound-attenuating booth",
+                "water" if water else "air",
+                "vertex" if electro else None, "behind the ear" if electro else None,
+                "dorsal" if electro and self.rnd.random() < 0.5 else None,
+                start, start + self.rnd.choice([0, 0, 0, 1, 2]),
+                round(self.rnd.uniform(30, 90), 1) if self.rnd.random() < 0.5 else None,
+                self.rnd.choice(["between 6-10", "daily", "before each session", None]),
+                self.rnd.choice(["50", "70.7", "75", "50-50"]),
+                self.rnd.choice(["yes", "no"]), self.rnd.choice(["yes", "no", None]),
+                self.rnd.choice(["tone", "click", "noise band"]),
+                "yes" if electro and self.rnd.random() < 0.5 else "no", None,
+                self.rnd.randint(1, 6),
+                self.rnd.choice(["hearing threshold", "hearing threshold", "masked hearing threshold"])))
+            groups.append(group)
+        return rows, groups
+
+    def _audiogram_publications(self):
+        rows = []
+        for i in range(self.experiments):
+            # experiments of one publication have neighbouring ids
+            publications = {min(self.publications, i // 3 + 1)}
+            if self.rnd.random() < 0.05:
+                publications.add(self.rnd.randint(1, self.publications))
+            rows += [(i + 1, p) for p in sorted(publications)]
+        return rows
+
+    def _animals(self, species, experiments, groups):
+        """
+        Animals are often tested in more than one experiment.
+
+        @return: tuple (list of individual_animal rows, list of test_animal rows)
+        """
+        by_group = {}
+        for ott_id, group in species:
+            by_group.setdefault(group, []).append(ott_id)
+        # some species are studied much more than others
+        popularity = {ott_id: self.rnd.paretovariate(1.2) for ott_id, group in species}
+        animals = []
+        test_animals = []
+        tested = {}
+        for experiment, group in zip(experiments, groups):
+            candidates = by_group.get(group) or [s[0] for s in species]
+            taxon = self.rnd.choices(candidates, [popularity[c] for c in candidates])[0]
+            for k in range(self.rnd.choice([1, 1, 1, 1, 2, 2, 3])):
+                if tested.get(taxon) and self.rnd.random() < 0.3:
+                    animal = self.rnd.choice(tested[taxon])
+                else:
+                    animal = len(animals) + 1
+                    animals.append((animal, taxon,
+                                    self.rnd.choice(["Yaka", "Kaimanu", "Sprouts", "Ned", "Luna", None, None]),
+                                    self.rnd.choice(["female", "male", "unknown"])))
+                    tested.setdefault(taxon, []).append(animal)
+                age = round(self.rnd.uniform(6, 400), 1)
+                liberty = self.rnd.choice(["captive", "captive", "wild", "stranded"])
+                test_animals.append((
+                    len(test_animals) + 1, experiment[0], animal,
+                    self.rnd.choice(["adult", "adult", "juvenile", "subadult"]),
+                    age, round(age + self.rnd.uniform(0, 24), 1), liberty,
+                    self.rnd.randint(1, 400) if liberty == "captive" else None, None))
+        return animals, test_animals
+
+    def _data_points(self, experiments, groups):
+        """
+        Generate U-shaped audiograms, in the units of the hearing group's medium.
+
+        Thresholds in deprecated units are stored unconverted, as in the real data.
+        """
+        rnd = random.Random(self.seed + 1)
+        point_id = itertools.count(1)
+        for experiment, group in zip(experiments, groups):
+            weight, low, high, best, water = GROUPS[group]
+            water = experiment[9] == "water"
+            units = UNITS_WATER if water else UNITS_AIR
+            unit = rnd.choices([u[0] for u in units], [u[1] for u in units])[0]
+            offset = self._conversion_factor(unit, water)
+            f_min, f_max = rnd.uniform(*low), rnd.uniform(*high)
+            f_best = math.exp(rnd.uniform(0.3, 0.7) * (math.log(f_max) - math.log(f_min)) + math.log(f_min))
+            threshold, slope = rnd.uniform(*best), rnd.uniform(8, 25)
+            points = min(60, max(3, int(rnd.lognormvariate(math.log(18), 0.5))))
+            duration = rnd.choice([None, 50, 100, 200, 500, 1000])
+            for k in range(points):
+                freq = math.exp(math.log(f_min) + (math.log(f_max) - math.log(f_min)) * k / max(points - 1, 1))
+                freq *= rnd.uniform(0.97, 1.03)
+                spl = threshold + slope * math.log2(freq / f_best) ** 2 / 4 + rnd.gauss(0, 3)
+                yield (next(point_id), experiment[0], round(freq, 3), round(spl - offset, 1),
+                       unit, "RMS" if rnd.random() < 0.8 else "peak-to-peak", duration)
+
+    def _conversion_factor(self, unit, water):
+        """The factor SPL_converter adds to values in this unit."""
+        for r in SPL_converter().sound_pressure_level_reference:
+            if r['id'] == unit:
+                factor = r.get('conversion_factor_waterborne_sound_in_decibel' if water
+                               else 'conversion_factor_airborne_sound_in_decibel')
+                return factor if isinstance(factor, (int, float)) else 0
+        return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill a database with synthetic audiograms.")
+    parser.add_argument('--scale', type=float, default=1.0, help="scale factor, 1 is about 300 audiograms")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database', default="synthdb", help="database to fill, created if it does not exist")
+    parser.add_argument('--replace', action='store_true', help="drop existing tables first")
+    parser.add_argument('--config', default="/src/API/api.ini", help="API configuration file with the DB settings")
+    args = parser.parse_args()
+
+    config = configparser.ConfigParser()
+    config.read(args.config)
+    connection = pymysql.connect(
+        host=config.get('DEFAULT', 'DB_HOST'),
+        user=config.get('DEFAULT', 'DB_USERNAME'),
+        password=config.get('DEFAULT', 'DB_PASSWORD'),
+        charset='utf8mb4')
+    with connection.cursor() as cursor:
+        cursor.execute("create database if not exists `%s` default character set utf8mb4" % args.database)
+    connection.select_db(args.database)
+
+    db = Synthetic_db(args.scale, args.seed)
+    start = time.perf_counter()
+    db.create(connection, args.replace)
+    counts = db.load(connection)
+    connection.close()
+    for table, count in counts.items():
+        print("%-32s %10d rows" % (table, count))
+    print("loaded in %.1f s" % (time.perf_counter() - start))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark: per-plot latency and memory of the plotnine and Agg plotters.
+
+Usage (from /src):
+    PYTHONPATH=.:API python ../unittests/performance/bench_Plotter.py [--runs 20] [--points 30] [--layers 4]
+
+Created on 18.10.2026
+
+@author: agent for Museum fuer Naturkunde Berlin
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+from API.Plotter import Plotter, columns_from_layers
+from API.Agg_plotter import Agg_plotter
+
+
+def make_audiogram(points, experiment_id, rnd):
+    """Random U-shaped audiogram, log-spaced frequencies between 0.1 and 150 kHz."""
+    resp = []
+    for k in range(points):
+        freq = 0.1 * (1500 ** (k / max(points - 1, 1)))
+        resp.append({
+            "testtone_frequency_in_khz": round(freq, 3),
+            "sound_pressure_level_in_decibel": round(40 + 0.3 * (k - points / 2) ** 2 + rnd.uniform(-5, 5), 1),
+            "audiogram_experiment_id": experiment_id,
+            "spl_reference_display_label": "re 1 μPa"
+        })
+    return resp
+
+
+def measure(fn, runs):
+    """Return latencies in ms and peak traced memory in KiB of runs calls to fn."""
+    fn(0)  # warm-up: imports, font cache, figure template
+    latencies = []
+    tracemalloc.start()
+    for i in range(runs):
+        start = time.perf_counter()
+        fn(i + 1)
+        latencies.append((time.perf_counter() - start) * 1000)
+    peak = tracemalloc.get_traced_memory()[1] / 1024
+    tracemalloc.stop()
+    return latencies, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--points', type=int, default=30)
+    parser.add_argument('--layers', type=int, default=4)
+    args = parser.parse_args()
+
+    rnd = random.Random(42)
+    single = columns_from_layers([make_audiogram(args.points, 1, rnd)])
+    layers = columns_from_layers([make_audiogram(args.points, i, rnd) for i in range(args.layers)])
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        os.mkdir("static")
+        try:
+            print("%-10s %-8s %10s %10s %10s %12s" % ("backend", "plot", "mean ms", "p50 ms", "max ms", "peak KiB"))
+            for name, plotter in (("plotnine", Plotter()), ("agg", Agg_plotter())):
+                for kind, fn in (
+                        ("single", lambda i: plotter.plot(single, "bench-single-%d" % i)),
+                        ("layers", lambda i: plotter.plotlayers(layers, "bench-layers-%s-%d" % (name, i)))):
+                    latencies, peak = measure(fn, args.runs)
+                    print("%-10s %-8s %10.1f %10.1f %10.1f %12.0f" % (
+                        name, kind, statistics.mean(latencies), statistics.median(latencies),
+                        max(latencies), peak))
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
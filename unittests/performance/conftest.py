@@ -0,0 +1,89 @@
+"""
+Fixtures for the benchmark suite.
+
+Created on 18.10.2026
+
+@author: agent for Museum fuer Naturkunde Berlin
+"""
+
+import configparser
+import os
+import pymysql
+import pytest
+from API import Migrate
+from Synthetic_db import Synthetic_db
+
+
+configPath = "/src/API/api.ini"
+"""Path to configuration file, same as in the unit tests."""
+
+
+@pytest.fixture(scope="session")
+def db_config():
+    """
+    Configuration of the local test database.
+
+    The database is created when you do "make test" to run the tests.
+    Benchmarks that need it are skipped if it can not be reached.
+    """
+    config = configparser.ConfigParser()
+    config.read(os.environ.get('API_CONFIG', configPath))
+    config['DEFAULT']['DB_DATABASE'] = os.environ.get('BENCH_DATABASE', "testdb")
+    try:
+        pymysql.connect(
+            host=config.get('DEFAULT', 'DB_HOST'),
+            user=config.get('DEFAULT', 'DB_USERNAME'),
+            password=config.get('DEFAULT', 'DB_PASSWORD'),
+            database=config.get('DEFAULT', 'DB_DATABASE')).close()
+    except Exception as e:
+        pytest.skip("test database not available: %s" % e)
+    return config
+
+
+@pytest.fixture(scope="session")
+def synthetic_config():
+    """
+    Configuration of a synthetic database with the index migrations applied, see Synthetic_db.
+
+    PLAN_DATABASE (default synthplans) is created and filled at scale PLAN_SCALE (default 10)
+    if it has no audiograms yet, so that the query plans are those of a database larger than the test data.
+    Tests that need it are skipped if the database server can not be reached.
+    """
+    config = configparser.ConfigParser()
+    config.read(os.environ.get('API_CONFIG', configPath))
+    database = os.environ.get('PLAN_DATABASE', "synthplans")
+    try:
+        connection = pymysql.connect(
+            host=config.get('DEFAULT', 'DB_HOST'),
+            user=config.get('DEFAULT', 'DB_USERNAME'),
+            password=config.get('DEFAULT', 'DB_PASSWORD'),
+            charset='utf8mb4')
+    except Exception as e:
+        pytest.skip("database server not available: %s" % e)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("create database if not exists `%s` default character set utf8mb4" % database)
+        connection.select_db(database)
+        db = Synthetic_db(float(os.environ.get('PLAN_SCALE', 10)))
+        db.create(connection)
+        with connection.cursor() as cursor:
+            cursor.execute("select count(*) from audiogram_experiment")
+            if cursor.fetchone()[0] == 0:
+                db.load(connection)
+            # up-to-date statistics, for the row estimates of the plans
+            cursor.execute("analyze table %s" % ", ".join(db.tables()))
+        Migrate.migrate(connection)
+    finally:
+        connection.close()
+    config['DEFAULT']['DB_DATABASE'] = database
+    return config
+
+
+@pytest.fixture
+def static_dir(tmp_path):
+    """Run in an empty directory with a plot cache, so that plots are always rendered."""
+    cwd = os.getcwd()
+    os.chdir(str(tmp_path))
+    os.mkdir("static")
+    yield tmp_path
+    os.chdir(cwd)
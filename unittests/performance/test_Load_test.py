@@ -0,0 +1,94 @@
+"""
+Tests of Load_test: request mix, log replay and latency report.
+
+Created on 18.10.2026
+
+@author: agent for Museum fuer Naturkunde Berlin
+"""
+
+import json
+import os
+import tempfile
+import threading
+import unittest
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from Load_test import Load_test, Recorder, endpoint_name, percentile, read_log
+
+
+class Fake_API(BaseHTTPRequestHandler):
+    """Answers like the API: two audiograms, plots are ready at the first status request."""
+
+    def do_GET(self):
+        if self.path.startswith('/api/v1/browse'):
+            body = [{'id': 1}, {'id': 2}]
+        elif self.path.startswith('/api/v1/all_species'):
+            body = [{'ott_id': 1000}]
+        elif self.path.startswith('/api/v1/plot'):
+            return self._send(202, {'Location': '/status/abc'})
+        elif self.path.startswith('/status/abc'):
+            body = {'state': 'SUCCESS', 'result': '/static/abc.png'}
+        elif self.path.startswith('/api/v1/experiment'):
+            return self._send(500, {})
+        else:
+            body = []
+        self._send(200, body)
+
+    def _send(self, code, body):
+        data = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class test_Load_test(unittest.TestCase):
+
+    def test_1(self):
+        """Percentiles and endpoint names"""
+        values = list(range(1, 101))
+        self.assertEqual(50, percentile(values, 50))
+        self.assertEqual(99, percentile(values, 99))
+        self.assertEqual(7, percentile([7], 95))
+        self.assertIsNone(percentile([], 50))
+        self.assertEqual('browse', endpoint_name('/api/v1/browse?taxon=1'))
+        self.assertEqual('status', endpoint_name('/status/6e1ec9a6'))
+
+    def test_2(self):
+        """Requests are read from an access log"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "access.log")
+            with open(path, "w") as f:
+                f.write('10.0.0.1 - - [18/Oct/2026:10:00:00 +0000] "GET /api/v1/audiogram?id=1 HTTP/1.1" 200 512\n')
+                f.write('garbage\n')
+                f.write('10.0.0.1 - - [18/Oct/2026:10:00:01 +0000] "GET /status/abc HTTP/1.1" 200 80 "-" "Mozilla"\n')
+            self.assertEqual(['/api/v1/audiogram?id=1', '/status/abc'], read_log(path))
+
+    def test_3(self):
+        """Scenarios are recorded per endpoint, with errors"""
+        server = HTTPServer(('127.0.0.1', 0), Fake_API)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            recorder = Recorder()
+            test = Load_test("http://127.0.0.1:%d" % server.server_port, recorder, poll_interval=0, seed=1)
+            test.discover()
+            self.assertEqual([1, 2], test.ids)
+            for scenario in ['browse', 'plot', 'experiment', 'experiment']:
+                test.run(scenario)
+            rows = {r['endpoint']: r for r in recorder.report()}
+            self.assertEqual(1, rows['browse']['requests'])
+            self.assertEqual(1, rows['status']['requests'])
+            self.assertEqual(0, rows['plot (image ready)']['errors'])
+            self.assertEqual(1.0, rows['experiment']['error_rate'])
+            self.assertEqual(5, rows['total']['requests'])
+            self.assertEqual(2, rows['total']['errors'])
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+"""
+Tests of Synthetic_db: generated rows and their consistency.
+
+Created on 18.10.2026
+
+@author: agent for Museum fuer Naturkunde Berlin
+"""
+
+import unittest
+from Synthetic_db import Synthetic_db
+
+
+class test_Synthetic_db(unittest.TestCase):
+
+    def test_1(self):
+        """Same seed, same database"""
+        a = Synthetic_db(0.2, seed=1).tables()
+        b = Synthetic_db(0.2, seed=1).tables()
+        for table in a:
+            self.assertEqual(list(a[table][1]), list(b[table][1]), table)
+
+    def test_2(self):
+        """Taxa are valid nested sets, the clades of the clade queries exist"""
+        columns, taxa = Synthetic_db(1).tables()['taxon']
+        by_id = {t[0]: t for t in taxa}
+        bounds = sorted(b for t in taxa for b in t[6:8])
+        self.assertEqual(list(range(1, 2 * len(taxa) + 1)), bounds)
+        for t in taxa:
+            if t[1] is not None:
+                parent = by_id[t[1]]
+                self.assertTrue(parent[6] < t[6] < t[7] < parent[7])
+        names = {t[3] for t in taxa}
+        for clade in ['Aves', 'Mammalia', 'Reptilia', 'Actinopteri', 'Delphinidae', 'Phocidae']:
+            self.assertIn(clade, names)
+
+    def test_3(self):
+        """All references point to existing rows, sizes grow with the scale"""
+        tables = Synthetic_db(1).tables()
+        ids = {t: {r[0] for r in rows} for t, (columns, rows) in tables.items() if t != 'audiogram_data_point'}
+        points = list(tables['audiogram_data_point'][1])
+        self.assertTrue({p[1] for p in points} == ids['audiogram_experiment'])
+        self.assertTrue({p[4] for p in points} <= ids['sound_pressure_level_reference'])
+        self.assertTrue({a[1] for a in tables['individual_animal'][1]} <= ids['taxon'])
+        self.assertTrue({t[2] for t in tables['test_animal'][1]} <= ids['individual_animal'])
+        self.assertTrue({p[1] for p in tables['audiogram_publication'][1]} <= ids['publication'])
+        self.assertTrue(3000 < len(points) < 10000)
+        self.assertEqual(10 * len(ids['audiogram_experiment']),
+                         len(Synthetic_db(10).tables()['audiogram_experiment'][1]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,270 @@
+"""
+Micro-benchmarks of the API hot paths: queries, SPL conversion, csv export and plotting.
+
+Each benchmark runs at a realistic data size and at 100 times that size.
+Requires pytest-benchmark. Run from /src, results are written as JSON for comparing runs:
+    PYTHONPATH=.:API python -m pytest ../unittests/performance --benchmark-json=bench.json
+    PYTHONPATH=.:API python -m pytest ../unittests/performance --benchmark-autosave --benchmark-compare
+
+Benchmarks that execute queries need the local test database (see conftest.db_config).
+To measure the index migrations (see src/API/Migrate.py), run them on an unindexed database
+generated with Synthetic_db.py, with --benchmark-autosave, then migrate and run with --benchmark-compare.
+
+Created on 18.10.2026
+
+@author: agent for Museum fuer Naturkunde Berlin
+"""
+
+import configparser
+import itertools
+import random
+import pytest
+from decimal import Decimal
+from API.Query import Query, Browse_query, Data_query, Data_multiple_query, Content_hash_query, SPLUnits_query, \
+    List_query, Taxonomy_query, Mammals_query
+from API.SPL_converter import SPL_converter
+from API.API import json2csv
+from API.Plotter import Plotter, columns_from_layers
+from API.Agg_plotter import Agg_plotter
+from API.Search_index import Search_index
+from API.Audiogram_metrics import Audiogram_metrics
+from API.Threshold_matrix import interpolate, log_grid
+from API.Similarity_index import Similarity_index
+from API.Aggregate_audiogram import aggregate, bootstrap
+from Synthetic_db import Synthetic_db
+
+pytest.importorskip("pytest_benchmark")
+
+SCALES = {'realistic': 1, '100x': 100}
+"""Data size multipliers."""
+POINTS = 30
+"""Data points of a typical audiogram."""
+LAYERS = 4
+"""Audiograms in a typical overlay."""
+BROWSE_ROWS = 250
+"""Audiograms in a typical browse result."""
+
+BROWSE_PARAM = {
+    'taxon': "1000,2000,3000", 'method': "1,2", 'medium': "water",
+    'sex': "female,male", 'year_from': "1970", 'year_to': "2020",
+    'threshold_from': "10", 'order_by': "citation_short"}
+"""Browse parameters with several filters."""
+
+DATA_HEADERS = [
+    'testtone_duration_in_millisecond', 'testtone_frequency_in_khz', 'sound_pressure_level_in_decibel',
+    'sound_pressure_level_reference_id', 'sound_pressure_level_reference_method', 'audiogram_experiment_id',
+    'spl_reference_value', 'spl_reference_unit', 'spl_reference_significance',
+    'conversion_factor_airborne_sound_in_decibel', 'conversion_factor_waterborne_sound_in_decibel',
+    'spl_reference_display_label']
+"""Columns of Query.Data_query, in order."""
+
+NO_DATABASE = configparser.ConfigParser()
+NO_DATABASE.read_dict({'DEFAULT': {'DB_HOST': "", 'DB_USERNAME': "", 'DB_PASSWORD': "", 'DB_DATABASE': ""}})
+"""Configuration of queries that only build statements or convert results, never run."""
+
+
+def data_rows(points, experiments=1, seed=42):
+    """Database rows of Data_query, with a mix of current and historical SPL units."""
+    rnd = random.Random(seed)
+    rows = []
+    for e in range(experiments):
+        unit = (1, 2, 3, 6)[e % 4]
+        for k in range(points):
+            freq = 0.1 * (1500 ** (k / max(points - 1, 1)))
+            rows.append((
+                500, Decimal("%.3f" % freq),
+                Decimal("%.1f" % (40 + 0.3 * (k % POINTS - POINTS / 2) ** 2 + rnd.uniform(-5, 5))),
+                unit, "RMS", e + 1, Decimal(1), "μPa", "", None, None, "re 1 μPa"))
+    return rows
+
+
+def converted_columns(experiments):
+    """Data points of experiments converted to modern units, as columns, as from All_data_query.run_columns."""
+    rows = Data_query(NO_DATABASE).convert(data_rows(POINTS, experiments))
+    return Plain_query(NO_DATABASE).columnize({'headers': DATA_HEADERS, 'results': rows})
+
+
+def browse_rows(rows):
+    """Database rows of Browse_query."""
+    return [(i, i % 97, "Author et al., %d" % (1960 + i % 60), "species %d" % (i % 50),
+             "Genus species%d" % (i % 50), "behavioral: go/no-go") for i in range(rows)]
+
+
+def search_entries(scale):
+    """Rows of Search_entries_query for a synthetic database."""
+    tables = Synthetic_db(scale).tables()
+    entries = []
+    for ott_id, parent, rank, name, vernacular, german, lft, rgt in tables['taxon'][1]:
+        entries.append({'kind': 'taxon', 'id': ott_id, 'text': name, 'detail': rank})
+        if vernacular:
+            entries.append({'kind': 'vernacular', 'id': ott_id, 'text': vernacular, 'detail': name})
+    entries += [{'kind': 'publication', 'id': row[0], 'text': row[1], 'detail': None}
+                for row in tables['publication'][1]]
+    entries += [{'kind': 'facility', 'id': row[0], 'text': row[1], 'detail': None} for row in tables['facility'][1]]
+    return entries
+
+
+class Plain_query(Query):
+    """Query without database, to benchmark the base class methods."""
+
+    def _run(self, param=None):
+        return param
+
+
+@pytest.fixture(params=sorted(SCALES))
+def scale(request):
+    return SCALES[request.param]
+
+
+def test_jsonize(benchmark, scale):
+    results = {
+        'headers': ['id', 'publication_id', 'citation_short', 'vernacular_name_english',
+                    'species_name', 'measurement_method'],
+        'results': browse_rows(BROWSE_ROWS * scale)}
+    query = Plain_query(NO_DATABASE)
+    resp = benchmark(query.jsonize, results)
+    assert len(resp) == BROWSE_ROWS * scale
+
+
+def test_browse_build(benchmark):
+    sql, values = benchmark(Browse_query(NO_DATABASE).build, BROWSE_PARAM)
+    assert "%(taxon)s" in sql and values['taxon'] == ("1000", "2000", "3000")
+
+
+def test_browse_run(benchmark, db_config):
+    resp = benchmark(Browse_query(db_config).run, {})
+    assert len(resp) > 0
+
+
+def test_data_convert(benchmark, scale):
+    rows = data_rows(POINTS, scale)
+    query = Data_query(NO_DATABASE)
+    converted = benchmark(query.convert, rows)
+    assert len(converted) == len(rows)
+
+
+def test_data_run(benchmark, db_config):
+    resp = benchmark(Data_query(db_config).run, 1)
+    assert len(resp) > 0
+
+
+def test_data_multiple_run_columns(benchmark, db_config):
+    resp = benchmark(Data_multiple_query(db_config).run_columns, [1, 3, 221])
+    assert len(resp['audiogram_experiment_id']) > 0
+
+
+def test_list_run(benchmark, db_config):
+    resp = benchmark(List_query(db_config).run, (1, 3, 221))
+    assert len(resp) > 0
+
+
+def test_content_hash_run(benchmark, db_config):
+    resp = benchmark(Content_hash_query(db_config).run, (1, 3, 221))
+    assert len(resp) > 0
+
+
+def test_spl_units_run(benchmark, db_config):
+    resp = benchmark(SPLUnits_query(db_config).run, (1, 3, 221))
+    assert len(resp) > 0
+
+
+def test_clade_run(benchmark, db_config):
+    resp = benchmark(Mammals_query(db_config).run)
+    assert len(resp) > 0
+
+
+def test_taxonomy_run(benchmark, db_config):
+    resp = benchmark(Taxonomy_query(db_config).run)
+    assert len(resp) > 0
+
+
+def test_search(benchmark, scale):
+    index = Search_index(search_entries(scale))
+    typed = "bottlenose dolfin"
+
+    def keystrokes():
+        # one search per keystroke
+        return [index.search(typed[:n]) for n in range(1, len(typed) + 1)]
+    results = benchmark(keystrokes)
+    assert len(results) == len(typed)
+
+
+def test_columnize(benchmark, scale):
+    results = {'headers': DATA_HEADERS, 'results': data_rows(POINTS, LAYERS * scale)}
+    query = Plain_query(NO_DATABASE)
+    columns = benchmark(query.columnize, results)
+    assert len(columns['testtone_frequency_in_khz']) == POINTS * LAYERS * scale
+
+
+def test_metrics(benchmark, scale):
+    # all audiograms of the database
+    columns = converted_columns(BROWSE_ROWS * scale)
+    metrics = benchmark(Audiogram_metrics, columns)
+    assert len(metrics.ids) == BROWSE_ROWS * scale
+
+
+def test_matrix(benchmark, scale):
+    # thresholds of a browse result page on the default grid
+    results = {'headers': DATA_HEADERS, 'results': data_rows(POINTS, BROWSE_ROWS * scale)}
+    columns = Plain_query(NO_DATABASE).columnize(results)
+    ids, matrix = benchmark(interpolate, columns, log_grid(0.1, 200, 64))
+    assert matrix.shape == (BROWSE_ROWS * scale, 64)
+
+
+def test_similar(benchmark, scale):
+    # 10 nearest audiograms among all audiograms of the database
+    columns = converted_columns(BROWSE_ROWS * scale)
+    ids = sorted(set(columns['audiogram_experiment_id'].tolist()))
+    experiments = [{'id': id, 'measurement_type': 'auditory threshold', 'taxon_id': id % 50}
+                   for id in ids]
+    index = Similarity_index({id: '' for id in ids}, experiments, lambda missing: columns)
+    nearest = benchmark(index.nearest, index.vector(ids[0]), 10, index.select(1), ids[0])
+    assert len(nearest) == 10
+
+
+def test_aggregate(benchmark, scale):
+    # consensus audiogram of a clade with 50 audiograms per scale, 1000 bootstrap resamples
+    ids, thresholds = interpolate(converted_columns(50 * scale), log_grid(0.1, 200, 64))
+
+    def consensus():
+        return aggregate(thresholds), bootstrap(thresholds, 1000)
+
+    values, (low, high) = benchmark(consensus)
+    assert len(low) == 64
+
+
+def test_spl_check(benchmark, scale):
+    units = [{'sound_pressure_level_reference_id': (1, 2, 3, 6)[i % 4]} for i in range(LAYERS * scale)]
+    assert benchmark(SPL_converter().check, units)
+
+
+def test_spl_convert(benchmark, scale):
+    converter = SPL_converter()
+    values = [(float(r[2]), r[3]) for r in data_rows(POINTS, scale)]
+
+    def convert_all():
+        return [converter.convert(value, from_id) for value, from_id in values]
+
+    assert len(benchmark(convert_all)) == len(values)
+
+
+def test_json2csv(benchmark, scale):
+    rows = data_rows(POINTS * scale)
+    data_points = [dict(zip(DATA_HEADERS, r)) for r in rows]
+    csv = benchmark(json2csv, data_points)
+    assert csv.count("\n") == len(rows)
+
+
+@pytest.mark.parametrize("plotter", [Plotter, Agg_plotter], ids=["plotnine", "agg"])
+@pytest.mark.parametrize("kind", ["plot", "plotlayers"])
+def test_render(benchmark, scale, plotter, kind, static_dir):
+    layers = 1 if kind == 'plot' else LAYERS
+    rows = data_rows(POINTS * scale, layers)
+    data_points = columns_from_layers(
+        [[dict(zip(DATA_HEADERS, r)) for r in rows if r[5] == layer + 1] for layer in range(layers)])
+    render = getattr(plotter(), kind)
+    # a new url per round, so that every round renders
+    urls = ("bench-%s-%d" % (kind, i) for i in itertools.count())
+    # plotnine takes seconds per plot at 100x
+    img = benchmark.pedantic(lambda: render(data_points, next(urls)), rounds=5, warmup_rounds=1)
+    assert (static_dir / img.lstrip("/")).exists()
@@ -0,0 +1,206 @@
+"""
+Query plan regression tests: EXPLAIN every Query subclass, and the main Browse_query filter combinations.
+
+A change to the SQL in Query.py can turn an index lookup into a full table scan,
+or a join into a cartesian product. These tests run each query against a synthetic database
+(see conftest.synthetic_config), EXPLAIN the statements it executed and fail when the plan has
+full table scans, filesorts, temporary tables or joins without an index over a row budget.
+Queries that list a whole table are expected to scan it, those problems are listed in ALLOWED.
+
+Run from /src:
+    PYTHONPATH=.:API python -m pytest ../unittests/performance/test_query_plans.py
+Set PLAN_ROW_BUDGET to change the row budget (default 1000).
+
+Created on 18.10.2026
+
+@author: agent for Museum fuer Naturkunde Berlin
+"""
+
+import os
+import pytest
+from API.Query import Query
+
+
+ROW_BUDGET = int(os.environ.get('PLAN_ROW_BUDGET', 1000))
+"""Estimated rows above which a scan, filesort, temporary table or unindexed join is a problem."""
+
+QUERY_PARAMS = {
+    'SPLUnits_query': (1, 3, 221),
+    'Content_hash_query': (1, 3, 221),
+    'All_content_hashes_query': None,
+    'Experiment_taxa_query': None,
+    'All_experiments_query': None,
+    'Ping_query': None,
+    'List_query': (1, 3, 221),
+    'Summary_query': None,
+    'Data_points_query_convert': 1,
+    'Data_points_query': 1,
+    'Data_points_values_only_query': 1,
+    'Download_query': 1,
+    'Experiment_query': 1,
+    'Caption_query': 1,
+    'Animal_query': 1,
+    'Species_query': 1,
+    'All_taxa_query': None,
+    'All_taxa_vernacular_query': None,
+    'All_measurement_methods_query': None,
+    'Parent_measurement_methods_query': None,
+    'All_tone_methods_query': None,
+    'All_publications_query': None,
+    'All_facilities_query': None,
+    'Data_query': 1,
+    'Data_multiple_query': (1, 3, 221),
+    'Publication_query': 1,
+    'Birds_query': None,
+    'Mammals_query': None,
+    'Reptiles_query': None,
+    'Cetaceans_query': None,
+    'Fishes_query': None,
+    'Seals_query': None,
+    'Taxonomy_query': None,
+    'Data_version_query': None,
+    'All_data_query': None,
+    'Search_entries_query': None,
+    'Browse_facets_query': {'medium': 'water', 'facets': ['method', 'sex', 'facility', 'tone', 'publication']}
+}
+"""Representative parameter of each query, Browse_query is tested with BROWSE_FILTERS."""
+
+SKIPPED = {
+    'Index_query': "reads information_schema",
+    'Browse_query': "see BROWSE_FILTERS"
+}
+"""Queries without a plan test, with the reason."""
+
+BROWSE_FILTERS = {
+    'none': {},
+    'order_by': {'order_by': 'citation_short'},
+    'taxon': {'taxon': '1000,1001,1002'},
+    'method': {'method': '1,2'},
+    'publication': {'publication': '1,2,3'},
+    'facility': {'facility': '1,2'},
+    'years': {'year_from': '1980', 'year_to': '2000'},
+    'medium': {'medium': 'water'},
+    'animal': {'sex': 'female', 'lifestage': 'adult', 'liberty': 'captivity'},
+    'tone_and_medium': {'tone': '20', 'medium': 'air', 'order_by': 'species_name'},
+    'combined': {'taxon': '1000,1001', 'method': '1', 'publication': '1,2', 'facility': '1', 'medium': 'water',
+                 'year_from': '1970'}
+}
+"""Browse_query filter combinations, by name."""
+
+ALLOWED = {
+    # lists of a whole table, sorted
+    'All_experiments_query': {('exp', 'full scan')},
+    'All_taxa_query': {('taxon', 'temporary'), ('taxon', 'filesort')},
+    'All_taxa_vernacular_query': {('taxon', 'temporary'), ('taxon', 'filesort')},
+    'All_measurement_methods_query': {('exp', 'full scan'), ('exp', 'temporary'), ('exp', 'filesort')},
+    'All_tone_methods_query': {('exp', 'full scan'), ('exp', 'temporary'), ('exp', 'filesort')},
+    'All_publications_query': {('publication', 'full scan'), ('publication', 'filesort')},
+    'All_facilities_query': {('facility', 'full scan'), ('facility', 'filesort')},
+    'Taxonomy_query': {('taxon', 'full scan'), ('taxon', 'filesort')},
+    # all experiments by medium, then their species
+    'Summary_query': {('audiogram_experiment', 'temporary')},
+    # unfiltered browse lists all experiments, sorted
+    'Browse_query[none]': {('exp', 'full scan'), ('exp', 'temporary'), ('exp', 'filesort')},
+    'Browse_query[order_by]': {('exp', 'full scan'), ('exp', 'temporary'), ('exp', 'filesort')},
+    # read whole tables by design
+    'Data_version_query': {('taxon', 'full scan'), ('publication', 'full scan'), ('facility', 'full scan'),
+                           ('audiogram_experiment', 'full scan'), ('test_animal', 'full scan'),
+                           ('individual_animal', 'full scan'), ('audiogram_data_point', 'full scan')},
+    'All_data_query': {('point', 'full scan')},
+    'All_content_hashes_query': {('point', 'full scan')},
+    'Experiment_taxa_query': {('exp', 'full scan'), ('exp', 'temporary')},
+    'Search_entries_query': {('taxon', 'full scan'), ('publication', 'full scan'), ('facility', 'full scan')},
+    # facet values of all experiments in water
+    'Browse_facets_query': {('exp', 'full scan'), ('exp', 'temporary')}
+}
+"""Accepted problems by query: set of (table, problem)."""
+
+for _name in BROWSE_FILTERS:
+    # the result of every browse request is grouped and sorted
+    ALLOWED.setdefault('Browse_query[%s]' % _name, set()).update(
+        {('exp', 'temporary'), ('exp', 'filesort')})
+
+
+def all_queries(cls=Query):
+    """All Query subclasses of Query.py, by name."""
+    resp = {}
+    for sub in cls.__subclasses__():
+        if sub.__module__ == Query.__module__:
+            resp[sub.__name__] = sub
+        resp.update(all_queries(sub))
+    return resp
+
+
+def plan_problems(plan, budget=ROW_BUDGET):
+    """
+    Find the problems in an EXPLAIN plan.
+
+    @param plan: list of dicts, rows of the EXPLAIN output
+    @return: list of tuples (table, problem, estimated rows)
+    """
+    problems = []
+    for row in plan:
+        rows = row.get('rows') or 0
+        if rows <= budget:
+            continue
+        extra = row.get('Extra') or ""
+        table = row.get('table')
+        if row.get('type') == 'ALL':
+            problems.append((table, 'full scan', rows))
+        if 'Using temporary' in extra:
+            problems.append((table, 'temporary', rows))
+        if 'Using filesort' in extra:
+            problems.append((table, 'filesort', rows))
+        if 'Using join buffer' in extra:
+            problems.append((table, 'join buffer', rows))
+    return problems
+
+
+def explain(query, param):
+    """Run the query, return the EXPLAIN plans of the statements it executed."""
+    query.run(param)
+    plans = []
+    for statement in query.connection.statements:
+        plan = query._explain(statement['sql'])
+        assert not isinstance(plan, str), "EXPLAIN failed: %s" % plan
+        if plan is not None:
+            plans.append(plan)
+    return plans
+
+
+def check_plans(name, plans):
+    allowed = ALLOWED.get(name, set())
+    problems = [p for plan in plans for p in plan_problems(plan)
+                if (p[0], p[1]) not in allowed]
+    assert problems == [], "%s: %s" % (name, ", ".join("%s on %s (%d rows)" % (p[1], p[0], p[2])
+                                                       for p in problems))
+
+
+def test_all_queries_covered():
+    """A new query needs a parameter here, so that its plan is tested"""
+    missing = set(all_queries()) - set(QUERY_PARAMS) - set(SKIPPED)
+    assert missing == set()
+
+
+def test_plan_problems():
+    plan = [
+        {'table': 'exp', 'type': 'ALL', 'rows': 5000, 'Extra': "Using temporary; Using filesort"},
+        {'table': 'facility', 'type': 'ALL', 'rows': 2000, 'Extra': "Using join buffer (Block Nested Loop)"},
+        {'table': 'taxon', 'type': 'eq_ref', 'rows': 1, 'Extra': None},
+        {'table': 'method', 'type': 'ALL', 'rows': 10, 'Extra': "Using where"}
+    ]
+    assert plan_problems(plan, 1000) == [
+        ('exp', 'full scan', 5000), ('exp', 'temporary', 5000), ('exp', 'filesort', 5000),
+        ('facility', 'full scan', 2000), ('facility', 'join buffer', 2000)]
+
+
+@pytest.mark.parametrize('name', sorted(QUERY_PARAMS))
+def test_query_plan(name, synthetic_config):
+    query = all_queries()[name](synthetic_config)
+    check_plans(name, explain(query, QUERY_PARAMS[name]))
+
+
+@pytest.mark.parametrize('filters', sorted(BROWSE_FILTERS))
+def test_browse_plan(filters, synthetic_config):
+    query = all_queries()['Browse_query'](synthetic_config)
+    check_plans('Browse_query[%s]' % filters, explain(query, BROWSE_FILTERS[filters]))